@@ -0,0 +1,263 @@
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import repeat
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from Tool.feature_engineering import FEATURE_COLUMNS, feature_engineering
+from Tool.memory import peak_rss_mb
+from Tool.read_csv import read_stock_csv
+
+# 计算特征必需的原始列
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# 打分结果的列式文件结构
+OUTPUT_SCHEMA = pa.schema([('symbol', pa.string()), ('date', pa.timestamp('ns')), ('prediction', pa.float64())])
+
+
+def save_model(path, model, features, **metadata):
+    """
+    保存训练好的模型及其特征列表，供批量打分使用
+
+    参数:
+        path: 保存路径（.joblib）
+        model: 已训练的模型
+        features: 训练时使用的特征名列表，打分时按此顺序取列
+        **metadata: 其他需要一并保存的信息（如模型名、最佳参数、训练集截止日期）
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    joblib.dump({'model': model, 'features': list(features), 'metadata': metadata}, path)
+
+
+def load_model(path):
+    """
+    读取save_model保存的模型
+
+    返回:
+        dict: model、features和metadata
+    """
+    artifact = joblib.load(path)
+    if not isinstance(artifact, dict) or 'model' not in artifact or 'features' not in artifact:
+        raise ValueError(f"{path} 不是save_model保存的模型文件")
+    return artifact
+
+
+def _read_from_store(store, code):
+    """从BarStore读取一只代码（模块级函数，可以传给子进程）"""
+    return store.read([code]).get(code)
+
+
+def _feature_rows(read, features, compact, start):
+    """读取一只代码并计算特征，返回需要打分的行（特征矩阵）；数据不足或读取、计算出错时返回None和原因，
+    单只代码的问题不会中断全市场的打分"""
+    try:
+        return _feature_rows_or_raise(read, features, compact, start)
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def _feature_rows_or_raise(read, features, compact, start):
+    df = read()
+    if df is None or df.empty:
+        return None, "没有数据"
+    required = PRICE_COLUMNS + [name for name in features if name not in FEATURE_COLUMNS]
+    missing = [name for name in required if name not in df.columns]
+    if missing:
+        return None, f"缺少列 {missing}"
+    frame = feature_engineering(df, compact=compact, require_target=False)
+    rows = frame.loc[frame.index >= start, features] if start is not None else frame[features].iloc[-1:]
+    if rows.empty:
+        return None, "历史数据不足以计算特征"
+    return rows, None
+
+
+class BatchScorer:
+    """
+    全市场批量打分
+
+    代码按chunk_size分块处理：每块的数据读取和特征计算分发到进程池（特征计算主要是pandas运算，
+    受GIL限制，线程池无法并行），只保留需要打分的行，拼接成一个矩阵后调用一次model.predict，
+    结果作为一个行组追加写入Parquet文件。
+
+    chunk_size控制内存而不是吞吐量：同一时刻主进程中只有一块代码的打分矩阵，内存占用随chunk_size
+    而不是代码总数增长；吞吐量取决于max_workers
+    """
+
+    def __init__(self, model_path, chunk_size=100, max_workers=None, compact=True):
+        """
+        参数:
+            model_path: save_model保存的模型文件
+            chunk_size: 每块处理的代码数量
+            max_workers: 读取数据和计算特征的进程数，默认为CPU核心数，为1时在当前进程中计算
+            compact: 是否以紧凑模式（float32）计算特征，见feature_engineering
+        """
+        artifact = load_model(model_path)
+        self.model = artifact['model']
+        self.features = artifact['features']
+        self.metadata = artifact['metadata']
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.compact = compact
+
+    @staticmethod
+    def _sources(sources):
+        """统一为 [(代码, 读取函数)]：支持{代码: CSV路径}、CSV路径列表或BarStore，读取函数可以传给子进程"""
+        if hasattr(sources, 'codes') and hasattr(sources, 'read'):
+            return [(code, partial(_read_from_store, sources, code)) for code in sources.codes()]
+        if not isinstance(sources, dict):
+            # 与batch_read_stock_csv相同，从文件名提取代码
+            sources = {os.path.basename(path).split('_')[0]: path for path in sources}
+        return [(code, partial(read_stock_csv, path)) for code, path in sources.items()]
+
+    def score(self, sources, output_path, start=None):
+        """
+        对全部代码打分，结果写入Parquet文件（symbol, date, prediction）
+
+        参数:
+            sources: {代码: CSV路径}、CSV路径列表或BarStore
+            output_path: 输出的Parquet文件路径，写入临时文件后原子替换
+            start: 打分的起始日期（含），默认只对每只代码的最后一个交易日打分
+
+        返回:
+            dict: symbols（成功打分的代码数）、rows、elapsed、symbols_per_sec、peak_chunk_mb（单块打分矩阵占用的峰值）、
+                  peak_rss_mb（主进程峰值常驻内存）、peak_worker_rss_mb（已结束的子进程中最大的峰值常驻内存，
+                  在当前进程中计算时为0）、skipped（{代码: 原因}）。峰值常驻内存只增不减，包括同一进程中此前的运行
+        """
+        items = self._sources(sources)
+        start = pd.Timestamp(start) if start is not None else None
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+        n_workers = self.max_workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+
+        n_symbols, n_rows, peak_chunk, skipped = 0, 0, 0, {}
+        start_time = time.perf_counter()
+        try:
+            with pq.ParquetWriter(tmp_path, OUTPUT_SCHEMA) as writer:
+                for i in range(0, len(items), self.chunk_size):
+                    chunk = items[i:i + self.chunk_size]
+                    args = ([read for _, read in chunk], repeat(self.features), repeat(self.compact), repeat(start))
+                    if executor is None:
+                        results = list(map(_feature_rows, *args))
+                    else:
+                        chunksize = max(1, len(chunk) // (4 * n_workers))
+                        results = list(executor.map(_feature_rows, *args, chunksize=chunksize))
+                    frames, codes = [], []
+                    for (code, _), (rows, reason) in zip(chunk, results):
+                        if rows is None:
+                            skipped[code] = reason
+                            continue
+                        frames.append(rows)
+                        codes.append(np.full(len(rows), code, dtype=object))
+                    if not frames:
+                        continue
+
+                    # 整块一次预测，特征转换为训练时的float64
+                    X = pd.concat(frames).astype(np.float64)
+                    peak_chunk = max(peak_chunk, X.memory_usage().sum())
+                    prediction = self.model.predict(X)
+                    writer.write_table(pa.table({'symbol': np.concatenate(codes), 'date': X.index.values.astype('datetime64[ns]'),
+                                                 'prediction': np.asarray(prediction, dtype=np.float64)},
+                                                schema=OUTPUT_SCHEMA))
+                    n_symbols += len(frames)
+                    n_rows += len(X)
+            os.replace(tmp_path, output_path)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        elapsed = time.perf_counter() - start_time
+        summary = {
+            'symbols': n_symbols,
+            'rows': n_rows,
+            'elapsed': elapsed,
+            'symbols_per_sec': n_symbols / elapsed if elapsed > 0 else float('nan'),
+            'peak_chunk_mb': peak_chunk / 2**20,
+            'peak_rss_mb': peak_rss_mb(),
+            'peak_worker_rss_mb': peak_rss_mb(children=True),
+            'skipped': skipped,
+        }
+        print(f"批量打分完成: {n_symbols} 只代码, {n_rows} 行, 耗时 {elapsed:.2f}s, "
+              f"{summary['symbols_per_sec']:.1f} 只/秒, 跳过 {len(skipped)} 只 -> {output_path}")
+        for code, reason in list(skipped.items())[:10]:
+            print(f"  跳过 {code}: {reason}")
+        return summary
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    import json
+    import subprocess
+    import sys
+    import tempfile
+
+    from sklearn.linear_model import Ridge
+    from Tool.feature_engineering import synthetic_bars
+    from Tool.feature_selector import FeatureSelector
+
+    with tempfile.TemporaryDirectory() as demo_dir:
+        # 1. 在深圳成分指数上训练并保存模型，用2个进程对本地全部akshare股票和指数打分，与逐只预测的结果一致
+        data = read_stock_csv("data/399001_index_20000101_20250630.csv")
+        features = feature_engineering(data)
+        train = features[features.index.year <= 2021].iloc[:-1]
+        test = features[features.index.year > 2021]
+        X_train, y_train, _, _, names = FeatureSelector().select_features(train, test, k=43)
+        save_model(f"{demo_dir}/model.joblib", Ridge().fit(X_train, y_train), names, model_name='Ridge')
+
+        sources = {os.path.basename(path).split('_')[0]: path for path in sorted(os.listdir("data"))
+                   if path.endswith("_20000101_20250630.csv") or path.endswith("_stock_20080101_20250630.csv")}
+        sources = {code: os.path.join("data", path) for code, path in sources.items()}
+        scorer = BatchScorer(f"{demo_dir}/model.joblib", chunk_size=2, max_workers=2)
+        scorer.score(sources, f"{demo_dir}/latest.parquet")
+        scorer.score(sources, f"{demo_dir}/since_2025.parquet", start="2025-01-01")
+        scored = pd.read_parquet(f"{demo_dir}/since_2025.parquet")
+        model = load_model(f"{demo_dir}/model.joblib")['model']
+        for code, path in sources.items():
+            rows = feature_engineering(read_stock_csv(path), require_target=False)
+            rows = rows.loc[rows.index >= "2025-01-01", names]
+            np.testing.assert_allclose(scored.loc[scored.symbol == code, 'prediction'].values, model.predict(rows), rtol=1e-4, atol=1e-5)
+        latest = pd.read_parquet(f"{demo_dir}/latest.parquet")
+        print(latest)
+        print("批量打分与逐只预测一致（紧凑模式的float32误差以内），最后一个交易日（无目标变量）也已打分")
+
+        # 2. 合成的全市场：每次运行在新的Python进程中进行，峰值内存不受此前运行的影响
+        n_symbols = 1000
+        os.makedirs(f"{demo_dir}/universe")
+        for i in range(n_symbols):
+            synthetic_bars(1500, seed=i).rename_axis('date').to_csv(f"{demo_dir}/universe/{i:06d}_stock.csv")
+        synthetic = feature_engineering(synthetic_bars(5000, seed=-1 % 2**32))
+        synthetic_names = [name for name in FEATURE_COLUMNS if name != 'target']
+        save_model(f"{demo_dir}/synthetic.joblib", Ridge().fit(synthetic[synthetic_names], synthetic.target), synthetic_names)
+
+        def score_in_subprocess(chunk_size, max_workers):
+            script = (
+                "import glob, json\n"
+                "from Model.batch_scorer import BatchScorer\n"
+                f"paths = sorted(glob.glob({demo_dir + '/universe/*.csv'!r}))\n"
+                f"summary = BatchScorer({demo_dir + '/synthetic.joblib'!r}, chunk_size={chunk_size}, max_workers={max_workers})"
+                f".score(paths, {demo_dir + '/universe.parquet'!r}, start='2003-01-01')\n"
+                "summary.pop('skipped')\n"
+                "print(json.dumps(summary))\n")
+            result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+            return json.loads(result.stdout.strip().splitlines()[-1])
+
+        # 内存随chunk_size增长：主进程中单块打分矩阵和峰值内存
+        for chunk_size in (10, 100, 1000):
+            summary = score_in_subprocess(chunk_size, max_workers=1)
+            print(f"chunk_size={chunk_size}: 单块打分矩阵 {summary['peak_chunk_mb']:.1f}MB, "
+                  f"进程峰值 {summary['peak_rss_mb']:.0f}MB, {summary['symbols_per_sec']:.1f} 只/秒")
+
+        # 吞吐量随进程数增长（单核机器上没有提升）
+        for max_workers in sorted({1, os.cpu_count() or 1}):
+            summary = score_in_subprocess(100, max_workers)
+            print(f"max_workers={max_workers}: {summary['symbols_per_sec']:.1f} 只/秒, 主进程峰值 {summary['peak_rss_mb']:.0f}MB, "
+                  f"工作进程峰值 {summary['peak_worker_rss_mb']:.0f}MB")
@@ -0,0 +1,182 @@
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.inspection import permutation_importance
+
+from Tool.fingerprint import dataset_fingerprint
+
+
+def _shap_values(model, X):
+    """
+    梯度提升模型自带的TreeSHAP贡献值，返回 (样本数, 特征数) 的数组；不支持的模型返回None
+
+    LightGBM、XGBoost和CatBoost都能在一次预测中直接给出每个特征的贡献，
+    不需要像排列重要性那样对每个特征重复预测
+    """
+    name = type(model).__name__
+    if name.startswith('LGBM'):
+        contributions = model.predict(X, pred_contrib=True)
+    elif name.startswith('XGB'):
+        import xgboost
+        contributions = model.get_booster().predict(xgboost.DMatrix(X), pred_contribs=True)
+    elif name.startswith('CatBoost'):
+        import catboost
+        contributions = model.get_feature_importance(catboost.Pool(X), type='ShapValues')
+    else:
+        return None
+    # 最后一列为基准值（bias）
+    return np.asarray(contributions)[:, :-1]
+
+
+def _native_importances(model, X):
+    """
+    树模型的feature_importances_，或线性模型标准化系数的绝对值；都没有时返回None
+
+    线性模型的系数依赖特征的量纲（如成交额约为1e9），乘以特征在X上的标准差后才能相互比较
+    """
+    if hasattr(model, 'feature_importances_'):
+        return np.asarray(model.feature_importances_, dtype=np.float64)
+    if hasattr(model, 'coef_'):
+        coef = np.abs(np.ravel(model.coef_)).astype(np.float64)
+        return coef * np.nanstd(np.asarray(X, dtype=np.float64), axis=0)
+    return None
+
+
+class FeatureImportance:
+    """
+    特征重要性计算服务，与绘图解耦
+
+    支持的方法:
+        permutation: 排列重要性，各特征的排列在n_jobs个进程中并行，可只抽样部分行
+        native: 模型自带的重要性（树模型的feature_importances_，线性模型标准化系数的绝对值）
+        shap: LightGBM/XGBoost/CatBoost的TreeSHAP贡献值的平均绝对值，一次预测得到全部特征
+        auto: 依次尝试shap、native，都不支持时使用permutation
+
+    结果按（方法参数, 模型, 数据集）的指纹缓存在内存中，指定cache_dir时同时保存到磁盘，
+    同一模型和数据集重复请求时直接返回
+    """
+
+    METHODS = ('permutation', 'native', 'shap', 'auto')
+
+    def __init__(self, method='permutation', n_repeats=10, n_jobs=-1, max_samples=1.0, random_state=42,
+                 cache_dir=None):
+        """
+        参数:
+            method: 计算方法，见METHODS
+            n_repeats: 排列重要性中每个特征的排列次数
+            n_jobs: 排列重要性的并行进程数，-1表示使用全部CPU
+            max_samples: 排列重要性每次抽样的行数（整数）或比例（浮点数），1.0表示使用全部行
+            random_state: 随机种子
+            cache_dir: 磁盘缓存目录，默认只缓存在内存中
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"未知的特征重要性方法: {method}，可选 {self.METHODS}")
+        self.method = method
+        self.n_repeats = n_repeats
+        self.n_jobs = n_jobs
+        self.max_samples = max_samples
+        self.random_state = random_state
+        self.cache_dir = cache_dir
+        self._cache = {}
+
+    def _key(self, method, model, X, y):
+        settings = (method, self.n_repeats, self.max_samples, self.random_state) if method == 'permutation' else (method,)
+        # native只依赖X（线性模型的标准差），不随y变化
+        return joblib.hash((settings, joblib.hash(model), dataset_fingerprint(X, y if method == 'permutation' else None)))
+
+    def _compute(self, method, model, X, y):
+        """返回 (重要性均值, 标准差)，方法不适用于该模型时返回None"""
+        if method == 'permutation':
+            result = permutation_importance(model, X, y, n_repeats=self.n_repeats, n_jobs=self.n_jobs,
+                                            max_samples=self.max_samples, random_state=self.random_state)
+            return result.importances_mean, result.importances_std
+        if method == 'native':
+            importances = _native_importances(model, X)
+            return None if importances is None else (importances, np.full(len(importances), np.nan))
+        shap_values = _shap_values(model, X)
+        if shap_values is None:
+            return None
+        shap_values = np.abs(shap_values)
+        return shap_values.mean(axis=0), shap_values.std(axis=0)
+
+    def compute(self, model, X, y=None):
+        """
+        计算特征重要性
+
+        参数:
+            model: 已训练的模型
+            X: 特征（DataFrame）
+            y: 目标变量，permutation方法必需
+
+        返回:
+            DataFrame: 以特征名为索引，包含importance和std列，按importance降序排列；
+                       attrs['method']为实际使用的方法
+        """
+        methods = ['shap', 'native', 'permutation'] if self.method == 'auto' else [self.method]
+        for method in methods:
+            if method == 'permutation' and y is None:
+                raise ValueError("排列重要性需要目标变量y")
+            key = self._key(method, model, X, y)
+            path = os.path.join(self.cache_dir, f"{key}.joblib") if self.cache_dir else None
+            if key in self._cache:
+                return self._cache[key]
+            if path and os.path.exists(path):
+                table = joblib.load(path)
+                self._cache[key] = table
+                return table
+
+            result = self._compute(method, model, X, y)
+            if result is None:
+                continue
+            table = pd.DataFrame({'importance': result[0], 'std': result[1]}, index=list(X.columns))
+            table = table.sort_values('importance', ascending=False)
+            table.attrs['method'] = method
+            self._cache[key] = table
+            if path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                joblib.dump(table, path)
+            return table
+        raise ValueError(f"{type(model).__name__} 不支持 {self.method} 方法的特征重要性")
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    from lightgbm import LGBMRegressor
+    from Tool.feature_engineering import feature_engineering
+    from Tool.feature_selector import FeatureSelector
+
+    data = pd.read_csv("data/399001_index_20000101_20250630.csv", index_col="date", parse_dates=True)
+    features = feature_engineering(data)
+    train = features[features.index.year <= 2021].iloc[:-1]
+    test = features[features.index.year > 2021]
+    X_train, y_train, X_test, y_test, _ = FeatureSelector().select_features(train, test, k=43)
+    model = LGBMRegressor(random_state=42, verbose=-1).fit(X_train, y_train)
+
+    # 原始方式：单进程、全部行
+    start_time = time.perf_counter()
+    expected = permutation_importance(model, X_test, y_test, n_repeats=10, random_state=42).importances_mean
+    print(f"sklearn permutation_importance: {time.perf_counter() - start_time:.2f}s")
+
+    runs = [
+        ("permutation n_jobs=-1", FeatureImportance(n_jobs=-1)),
+        ("permutation 抽样50%", FeatureImportance(n_jobs=1, max_samples=0.5)),
+        ("native", FeatureImportance(method='native')),
+        ("shap", FeatureImportance(method='shap')),
+    ]
+    tables = {}
+    for name, service in runs:
+        start_time = time.perf_counter()
+        tables[name] = service.compute(model, X_test, y_test)
+        first = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        service.compute(model, X_test, y_test)
+        print(f"{name}: {first:.2f}s, 缓存命中 {(time.perf_counter() - start_time) * 1000:.1f}ms, "
+              f"前5: {list(tables[name].index[:5])}")
+
+    # 并行排列与单进程结果相同
+    parallel = tables["permutation n_jobs=-1"]['importance'].reindex(X_test.columns).values
+    np.testing.assert_allclose(parallel, expected)
+    print("并行排列重要性与sklearn单进程结果一致")
@@ -3,10 +3,24 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from sklearn.metrics import confusion_matrix
 
+
+def draw_confusion_matrix(fig, conf_matrix):
+    """在fig上绘制百分比形式的混淆矩阵"""
+    ax = fig.add_subplot()
+    sns.heatmap(conf_matrix, annot=True, cmap='Blues', fmt='.2f', ax=ax)
+    ax.set_title('混淆矩阵')
+    ax.set_xlabel('预测值')
+    ax.set_ylabel('真实值')
+
+
 class ModelEvaluator:
-    def __init__(self):
-        """初始化模型评估器"""
-        pass
+    def __init__(self, reporter=None):
+        """初始化模型评估器
+
+        参数:
+            reporter: Reporter实例，提供时混淆矩阵在后台渲染到报告目录，不调用show()
+        """
+        self.reporter = reporter
         
     def evaluate_model(self, y_test, y_pred):
         """评估模型性能，生成混淆矩阵"""
@@ -23,10 +37,10 @@ class ModelEvaluator:
         conf_matrix = conf_matrix / np.sum(conf_matrix) * 100
         
         # 绘制配置矩阵
-        plt.figure(figsize=(8, 6))
-        sns.heatmap(conf_matrix, annot=True, cmap='Blues', fmt='.2f')
-        plt.title('混淆矩阵')
-        plt.xlabel('预测值')
-        plt.ylabel('真实值')
+        if self.reporter is not None:
+            self.reporter.figure('confusion_matrix', draw_confusion_matrix, conf_matrix, figsize=(8, 6))
+            return conf_matrix
+        draw_confusion_matrix(plt.figure(figsize=(8, 6)), conf_matrix)
         plt.tight_layout()
-        plt.show()
\ No newline at end of file
+        plt.show()
+        return conf_matrix
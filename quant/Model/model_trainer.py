@@ -1,13 +1,203 @@
+import os
+import time
+import multiprocessing
+from multiprocessing.connection import wait
 import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+from sklearn.base import clone
 from sklearn.linear_model import LinearRegression, Ridge
 from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor, AdaBoostRegressor
 from sklearn.neighbors import KNeighborsRegressor
 from sklearn.metrics import r2_score, mean_squared_error
+from sklearn.model_selection import TimeSeriesSplit
 from xgboost import XGBRegressor
 from lightgbm import LGBMRegressor
 from catboost import CatBoostRegressor
 import optuna
 
+# 数据集指纹已移到轻量模块，保留此处的导入以兼容原有的调用
+from Tool.fingerprint import dataset_fingerprint
+
+
+def _model_thread_param(model):
+    """返回模型控制自身线程数的参数名（n_jobs或thread_count），没有时返回None"""
+    params = model.get_params()
+    if 'n_jobs' in params:
+        return 'n_jobs'
+    if 'thread_count' in params:
+        return 'thread_count'
+    return None
+
+
+def _ridge_space(trial):
+    return {
+        'alpha': trial.suggest_float('alpha', 0, 5, step=0.05),
+        'solver': trial.suggest_categorical('solver', ['svd', 'cholesky', 'lsqr', 'sparse_cg', 'sag', 'saga']),
+        'max_iter': trial.suggest_int('max_iter', 1000, 3000, step=200),
+    }
+
+
+def _forest_space(trial):
+    return {
+        'n_estimators': trial.suggest_int('n_estimators', 50, 500, step=50),
+        'max_depth': trial.suggest_int('max_depth', 3, 20),
+        'min_samples_leaf': trial.suggest_int('min_samples_leaf', 1, 20),
+        'max_features': trial.suggest_float('max_features', 0.3, 1.0),
+    }
+
+
+def _gradient_boosting_space(trial):
+    return {
+        'n_estimators': trial.suggest_int('n_estimators', 50, 500, step=50),
+        'learning_rate': trial.suggest_float('learning_rate', 1e-3, 0.3, log=True),
+        'max_depth': trial.suggest_int('max_depth', 2, 8),
+        'subsample': trial.suggest_float('subsample', 0.5, 1.0),
+    }
+
+
+def _knn_space(trial):
+    return {
+        'n_neighbors': trial.suggest_int('n_neighbors', 3, 50),
+        'weights': trial.suggest_categorical('weights', ['uniform', 'distance']),
+        'p': trial.suggest_int('p', 1, 2),
+    }
+
+
+def _xgb_space(trial):
+    return {
+        'n_estimators': trial.suggest_int('n_estimators', 50, 800, step=50),
+        'learning_rate': trial.suggest_float('learning_rate', 1e-3, 0.3, log=True),
+        'max_depth': trial.suggest_int('max_depth', 2, 10),
+        'subsample': trial.suggest_float('subsample', 0.5, 1.0),
+        'colsample_bytree': trial.suggest_float('colsample_bytree', 0.5, 1.0),
+        'reg_lambda': trial.suggest_float('reg_lambda', 1e-3, 10, log=True),
+    }
+
+
+def _lgbm_space(trial):
+    return {
+        'n_estimators': trial.suggest_int('n_estimators', 50, 800, step=50),
+        'learning_rate': trial.suggest_float('learning_rate', 1e-3, 0.3, log=True),
+        'num_leaves': trial.suggest_int('num_leaves', 8, 256, log=True),
+        'min_child_samples': trial.suggest_int('min_child_samples', 5, 100),
+        'subsample': trial.suggest_float('subsample', 0.5, 1.0),
+        'colsample_bytree': trial.suggest_float('colsample_bytree', 0.5, 1.0),
+    }
+
+
+def _catboost_space(trial):
+    return {
+        'iterations': trial.suggest_int('iterations', 100, 1000, step=100),
+        'learning_rate': trial.suggest_float('learning_rate', 1e-3, 0.3, log=True),
+        'depth': trial.suggest_int('depth', 4, 10),
+        'l2_leaf_reg': trial.suggest_float('l2_leaf_reg', 1, 10, log=True),
+    }
+
+
+def _adaboost_space(trial):
+    return {
+        'n_estimators': trial.suggest_int('n_estimators', 25, 300, step=25),
+        'learning_rate': trial.suggest_float('learning_rate', 0.01, 1.0, log=True),
+        'loss': trial.suggest_categorical('loss', ['linear', 'square', 'exponential']),
+    }
+
+
+# 可调参模型：{模型名称: (模型类, 固定参数, 搜索空间)}
+# 不参与搜索的参数必须放在固定参数中：搜索空间返回的常量不会记录在study.best_params里，
+# build_model(model_name, study.best_params)重建模型时会丢失（如LightGBM的subsample_freq，为0时subsample不生效）
+SEARCH_SPACES = {
+    'Ridge': (Ridge, {'random_state': 42}, _ridge_space),
+    'ExtraTreesRegressor': (ExtraTreesRegressor, {'random_state': 42}, _forest_space),
+    'RandomForestRegressor': (RandomForestRegressor, {'random_state': 42}, _forest_space),
+    'GradientBoostingRegressor': (GradientBoostingRegressor, {'random_state': 42}, _gradient_boosting_space),
+    'KNeighborsRegressor': (KNeighborsRegressor, {}, _knn_space),
+    'XGBRegressor': (XGBRegressor, {'random_state': 42}, _xgb_space),
+    'LGBMRegressor': (LGBMRegressor, {'random_state': 42, 'verbose': -1, 'subsample_freq': 1}, _lgbm_space),
+    'CatBoostRegressor': (CatBoostRegressor, {'random_state': 42, 'verbose': False}, _catboost_space),
+    'AdaBoostRegressor': (AdaBoostRegressor, {'random_state': 42}, _adaboost_space),
+}
+
+
+def build_model(model_name, params, threads=None):
+    """按模型名称和参数构建模型，threads不为None时同时设置模型自身的线程数"""
+    model_class, fixed_params, _ = SEARCH_SPACES[model_name]
+    model = model_class(**{**fixed_params, **params})
+    if threads is not None:
+        param = _model_thread_param(model)
+        if param is not None:
+            model.set_params(**{param: threads})
+    return model
+
+
+def _take(data, indices):
+    return data.iloc[indices] if hasattr(data, 'iloc') else data[indices]
+
+
+def _objective(trial, model_name, X_train, y_train, X_test, y_test, cv_splits, threads):
+    """
+    Optuna目标函数，返回均方误差
+
+    cv_splits为None时在测试集上评估；否则在训练集内做按时间顺序的滚动交叉验证，
+    每折结束后上报累计平均误差，供剪枝器提前终止没有希望的试验
+    """
+    params = SEARCH_SPACES[model_name][2](trial)
+    if not cv_splits:
+        model = build_model(model_name, params, threads)
+        model.fit(X_train, y_train)
+        return mean_squared_error(y_test, model.predict(X_test))
+    
+    scores = []
+    for step, (train_index, valid_index) in enumerate(TimeSeriesSplit(n_splits=cv_splits).split(X_train)):
+        model = build_model(model_name, params, threads)
+        model.fit(_take(X_train, train_index), _take(y_train, train_index))
+        scores.append(mean_squared_error(_take(y_train, valid_index), model.predict(_take(X_train, valid_index))))
+        trial.report(float(np.mean(scores)), step)
+        if trial.should_prune():
+            raise optuna.TrialPruned()
+    return float(np.mean(scores))
+
+
+def _sqlite_storage(storage_dir):
+    os.makedirs(storage_dir, exist_ok=True)
+    url = f"sqlite:///{os.path.join(storage_dir, 'optuna.db')}"
+    # 多进程共享SQLite时等待写锁，而不是立即报错
+    return optuna.storages.RDBStorage(url, engine_kwargs={'connect_args': {'timeout': 60}})
+
+
+def _optimize_worker(storage_dir, study_name, model_name, X_train, y_train, X_test, y_test, cv_splits, threads, n_trials, n_jobs):
+    """子进程入口：加载共享的study并运行一部分试验"""
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = optuna.load_study(study_name=study_name, storage=_sqlite_storage(storage_dir))
+    study.optimize(lambda trial: _objective(trial, model_name, X_train, y_train, X_test, y_test, cv_splits, threads),
+                   n_trials=n_trials, n_jobs=n_jobs)
+
+
+def _fit_and_score(model, X_train, y_train, X_test, y_test, threads):
+    """拟合并评估单个模型，返回模型、指标和拟合/预测耗时"""
+    # 限制BLAS/OpenMP线程数，避免多个进程同时占满所有核心
+    with threadpool_limits(limits=threads):
+        start_time = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        y_pred = model.predict(X_test)
+        predict_time = time.perf_counter() - start_time
+    r2 = r2_score(y_test, y_pred)
+    rmse = mean_squared_error(y_test, y_pred)
+    return {'model': model, 'r2': r2, 'rmse': rmse, 'fit_time': fit_time, 'predict_time': predict_time}
+
+
+def _fit_and_score_worker(conn, model, X_train, y_train, X_test, y_test, threads):
+    """子进程入口，通过管道返回结果或错误"""
+    try:
+        conn.send(('ok', _fit_and_score(model, X_train, y_train, X_test, y_test, threads)))
+    except Exception as e:
+        conn.send(('error', repr(e)))
+    finally:
+        conn.close()
+
+
 class ModelTrainer:
     def __init__(self):
         """初始化模型训练器"""
@@ -24,46 +214,188 @@ class ModelTrainer:
             RandomForestRegressor(random_state=42)
         ]
         
-    def evaluate_all_models(self, X_train, y_train, X_test, y_test):
-        """评估所有模型"""
-        results = {}
-        for model in self.models:
-            model_name = type(model).__name__
-            model.fit(X_train, y_train)
-            y_pred = model.predict(X_test)
-            r2 = r2_score(y_test, y_pred)
-            rmse = mean_squared_error(y_test, y_pred)
-            results[model_name] = {'model': model, 'r2': r2, 'rmse': rmse}
-            print(f'{model_name}: R² = {r2:.2f}, 均方误差(Root Mean Squared Error)= {rmse:.2f}')
+    def evaluate_all_models(self, X_train, y_train, X_test, y_test, n_workers=1, timeout=None, threads=None, verbose=True):
+        """评估所有模型
+        
+        参数:
+            n_workers: 并行评估的进程数，1表示在当前进程中依次评估
+            timeout: 单个模型拟合加预测的最长时间（秒），超时的模型被终止，None表示不限时
+            threads: 每个模型可用的线程数，默认为CPU核心数除以n_workers
+            verbose: 是否打印每个模型的结果
+        
+        返回:
+            dict: {模型名称: {'model', 'r2', 'rmse', 'fit_time', 'predict_time', 'threads', 'status'}}，
+                  可用results_table整理为表格
+        """
+        n_workers = max(1, min(n_workers or 1, len(self.models)))
+        # 按并行进程数平分CPU核心，每个模型自身的n_jobs/thread_count不超过分到的核心数
+        if threads is None:
+            threads = max(1, (os.cpu_count() or 1) // n_workers)
+        
+        if n_workers == 1 and timeout is None:
+            results = {}
+            for model in self.models:
+                results[type(model).__name__] = self._evaluate_in_process(model, X_train, y_train, X_test, y_test, threads)
+        else:
+            results = self._evaluate_in_processes(X_train, y_train, X_test, y_test, n_workers, threads, timeout)
+        
+        if verbose:
+            for model_name, result in results.items():
+                if result['status'] == 'ok':
+                    print(f'{model_name}: R² = {result["r2"]:.2f}, 均方误差(Root Mean Squared Error)= {result["rmse"]:.2f}, '
+                          f'拟合 {result["fit_time"]:.2f}s, 预测 {result["predict_time"]:.3f}s')
+                else:
+                    print(f'{model_name}: {result["status"]} {result.get("error", "")}')
         return results
     
-    def objective(self, trial, X_train, y_train, X_test, y_test):
+    def _with_threads(self, model, threads):
+        """返回设置了线程数参数的模型副本，self.models中的模型不会被修改（也不会被拟合）"""
+        model = clone(model)
+        param = _model_thread_param(model)
+        if param is not None:
+            model.set_params(**{param: threads})
+        return model
+    
+    def _evaluate_in_process(self, model, X_train, y_train, X_test, y_test, threads):
+        result = _fit_and_score(self._with_threads(model, threads), X_train, y_train, X_test, y_test, threads)
+        result.update(threads=threads, status='ok')
+        return result
+    
+    def _evaluate_in_processes(self, X_train, y_train, X_test, y_test, n_workers, threads, timeout):
+        """每个模型在独立子进程中拟合，最多同时运行n_workers个，超时的子进程被终止"""
+        pending = [self._with_threads(model, threads) for model in self.models]
+        running = {}
+        results = {}
+        while pending or running:
+            while pending and len(running) < n_workers:
+                model = pending.pop(0)
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(
+                    target=_fit_and_score_worker,
+                    args=(sender, model, X_train, y_train, X_test, y_test, threads))
+                process.start()
+                sender.close()
+                running[receiver] = (type(model).__name__, process, time.perf_counter())
+            
+            for receiver in wait(list(running), timeout=0.1):
+                model_name, process, _ = running.pop(receiver)
+                try:
+                    status, payload = receiver.recv()
+                except EOFError:
+                    status, payload = 'error', f'子进程异常退出(exitcode={process.exitcode})'
+                process.join()
+                if status == 'ok':
+                    payload.update(threads=threads, status='ok')
+                    results[model_name] = payload
+                else:
+                    results[model_name] = {'model': None, 'r2': np.nan, 'rmse': np.nan, 'fit_time': np.nan,
+                                           'predict_time': np.nan, 'threads': threads, 'status': 'error', 'error': payload}
+            
+            if timeout is not None:
+                now = time.perf_counter()
+                for receiver, (model_name, process, start_time) in list(running.items()):
+                    if now - start_time > timeout:
+                        process.terminate()
+                        process.join()
+                        running.pop(receiver)
+                        results[model_name] = {'model': None, 'r2': np.nan, 'rmse': np.nan, 'fit_time': np.nan,
+                                               'predict_time': np.nan, 'threads': threads, 'status': 'timeout',
+                                               'error': f'超过{timeout}s'}
+        
+        # 按self.models的顺序返回
+        return {type(model).__name__: results[type(model).__name__] for model in self.models}
+    
+    @staticmethod
+    def results_table(results):
+        """将evaluate_all_models的结果整理为按RMSE排序的表格"""
+        rows = []
+        for model_name, result in results.items():
+            rows.append({
+                'model': model_name,
+                'status': result['status'],
+                'r2': result['r2'],
+                'rmse': result['rmse'],
+                'fit_time': result['fit_time'],
+                'predict_time': result['predict_time'],
+                'threads': result['threads'],
+            })
+        return pd.DataFrame(rows).set_index('model').sort_values('rmse')
+    
+    def objective(self, trial, X_train, y_train, X_test, y_test, model_name='Ridge', cv_splits=None):
         """Optuna优化目标函数"""
-        params = {
-            'alpha': trial.suggest_float('alpha', 0, 5, step=0.05),
-            'solver': trial.suggest_categorical('solver', ['svd', 'cholesky', 'lsqr', 'sparse_cg', 'sag', 'saga']),
-            'max_iter': trial.suggest_int('max_iter', 1000, 3000, step=200),
-            'random_state': 42
-        }
-        
-        tuning = Ridge(**params)
-        tuning.fit(X_train, y_train)
-        preds = tuning.predict(X_test)
-        rmse = np.round(mean_squared_error(y_test, preds), 3)
-        return rmse
+        return _objective(trial, model_name, X_train, y_train, X_test, y_test, cv_splits, None)
     
-    def train_and_optimize(self, X_train, y_train, X_test, y_test):
-        """训练模型并进行超参数优化"""
+    def optimize(self, X_train, y_train, X_test, y_test, model_name='Ridge', n_trials=100, n_jobs=1, n_processes=1,
+                 storage_dir=None, cv_splits=3, pruner=None, threads=None):
+        """对单个模型进行超参数优化
+        
+        参数:
+            model_name: SEARCH_SPACES中的模型名称
+            n_trials: 试验总数；续跑已有study时只补足剩余的试验
+            n_jobs: 每个进程内并行运行的试验数（线程）
+            n_processes: 共享同一个SQLite存储并行运行试验的进程数
+            storage_dir: study存储目录，指定时study按模型和数据集哈希命名并可续跑
+            cv_splits: 训练集内滚动交叉验证的折数，None表示直接在测试集上评估（不剪枝）
+            pruner: Optuna剪枝器，默认为MedianPruner
+            threads: 每个试验中模型可用的线程数，默认为CPU核心数除以并行的试验数
+        
+        返回:
+            optuna.Study
+        """
+        if n_processes > 1 and storage_dir is None:
+            raise ValueError("多进程并行优化需要指定storage_dir")
+        if pruner is None:
+            pruner = optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=0)
+        
+        # 并行的试验平分CPU核心
+        if threads is None:
+            threads = max(1, (os.cpu_count() or 1) // (max(1, n_jobs) * max(1, n_processes)))
+        storage = _sqlite_storage(storage_dir) if storage_dir is not None else None
+        study_name = f"{model_name}-{dataset_fingerprint(X_train, y_train, X_test, y_test)[:16]}-cv{cv_splits or 0}"
+        study = optuna.create_study(direction='minimize', pruner=pruner, storage=storage,
+                                    study_name=study_name if storage is not None else None, load_if_exists=True)
+        
+        finished = [t for t in study.trials if t.state in (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)]
+        remaining = max(0, n_trials - len(finished))
+        if finished:
+            print(f"续跑study {study_name}: 已完成 {len(finished)} 次试验，剩余 {remaining} 次")
+        if remaining == 0:
+            return study
+        
+        if n_processes > 1:
+            processes = []
+            per_process = [remaining // n_processes + (1 if i < remaining % n_processes else 0) for i in range(n_processes)]
+            for count in per_process:
+                if count == 0:
+                    continue
+                process = multiprocessing.Process(
+                    target=_optimize_worker,
+                    args=(storage_dir, study_name, model_name, X_train, y_train, X_test, y_test, cv_splits, threads, count, n_jobs))
+                process.start()
+                processes.append(process)
+            for process in processes:
+                process.join()
+            study = optuna.load_study(study_name=study_name, storage=storage, pruner=pruner)
+        else:
+            study.optimize(lambda trial: _objective(trial, model_name, X_train, y_train, X_test, y_test, cv_splits, threads),
+                           n_trials=remaining, n_jobs=n_jobs, show_progress_bar=True)
+        return study
+    
+    def train_and_optimize(self, X_train, y_train, X_test, y_test, model_name='Ridge', n_trials=100, n_jobs=1,
+                           n_processes=1, storage_dir=None, cv_splits=3, n_workers=1):
+        """训练模型并进行超参数优化
+        
+        参数说明见optimize；n_workers为evaluate_all_models并行评估的进程数
+        """
         # 评估所有模型
-        self.evaluate_all_models(X_train, y_train, X_test, y_test)
+        self.evaluate_all_models(X_train, y_train, X_test, y_test, n_workers=n_workers)
         
-        # 使用Ridge模型进行超参数优化
-        study = optuna.create_study(direction='minimize')
-        study.optimize(lambda trial: self.objective(trial, X_train, y_train, X_test, y_test), 
-                      n_trials=100, show_progress_bar=True)
+        # 对指定模型进行超参数优化
+        study = self.optimize(X_train, y_train, X_test, y_test, model_name=model_name, n_trials=n_trials, n_jobs=n_jobs,
+                              n_processes=n_processes, storage_dir=storage_dir, cv_splits=cv_splits)
         
         # 使用最优参数训练模型
-        best_model = Ridge(**study.best_params)
+        best_model = build_model(model_name, study.best_params)
         best_model.fit(X_train, y_train)
         y_pred = best_model.predict(X_test)
         
@@ -71,7 +403,7 @@ class ModelTrainer:
         r2 = r2_score(y_test, y_pred)
         rmse = mean_squared_error(y_test, y_pred)
         
-        print(f"优化后的Ridge模型: R² = {r2:.2f}, RMSE = {rmse:.3f}")
+        print(f"优化后的{model_name}模型: R² = {r2:.2f}, RMSE = {rmse:.3f}")
         print(f"最佳参数: {study.best_params}")
         
-        return best_model, y_pred, r2, rmse
\ No newline at end of file
+        return best_model, y_pred, r2, rmse
@@ -0,0 +1,142 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from Tool.feature_engineering import feature_engineering
+from Tool.feature_selector import FeatureSelector
+from Model.model_trainer import ModelTrainer
+
+
+def _run_fold(fold, train, test, features, models, threads):
+    """在单个折上用已选出的特征评估模型，返回每个模型一行的结果"""
+    X_train, y_train = train[features], train.target
+    X_test, y_test = test[features], test.target
+
+    model_trainer = ModelTrainer()
+    if models is not None:
+        model_trainer.models = models
+    results = model_trainer.evaluate_all_models(X_train, y_train, X_test, y_test, threads=threads, verbose=False)
+
+    rows = []
+    for model_name, result in results.items():
+        rows.append({
+            'fold': fold,
+            'model': model_name,
+            'r2': result['r2'],
+            'rmse': result['rmse'],
+            'fit_time': result['fit_time'],
+            'n_features': len(features),
+            'n_train': len(train),
+            'n_test': len(test),
+            'train_start': train.index[0],
+            'train_end': train.index[-1],
+            'test_start': test.index[0],
+            'test_end': test.index[-1],
+        })
+    return rows
+
+
+class WalkForwardValidator:
+    """
+    滚动前推（walk-forward）验证
+
+    测试窗口按时间顺序依次向后滚动，训练窗口为测试窗口之前的全部数据（扩展窗口）
+    或固定长度的数据（滑动窗口）。训练窗口末尾先去掉purge行（目标变量是下一日收益，
+    标签会跨入测试期），再去掉embargo行作为额外隔离。特征只在完整序列上计算一次，
+    各折直接按位置切片，不会对每个切片重新计算feature_engineering；各折的特征选择共用
+    完整序列上的一份累计统计量（FeatureSelector.select_folds）
+    """
+
+    def __init__(self, n_splits=5, test_size=250, train_size=None, purge=1, embargo=0, min_train_size=250):
+        """
+        参数:
+            n_splits: 折数
+            test_size: 每个测试窗口的行数
+            train_size: 滑动窗口的训练行数，None表示扩展窗口
+            purge: 训练窗口末尾去掉的行数，不小于目标变量的前瞻期
+            embargo: 在purge之外额外隔离的行数
+            min_train_size: 训练窗口的最少行数，不足的折被跳过
+        """
+        self.n_splits = n_splits
+        self.test_size = test_size
+        self.train_size = train_size
+        self.purge = purge
+        self.embargo = embargo
+        self.min_train_size = min_train_size
+
+    def split(self, n_samples):
+        """
+        生成各折的位置索引
+
+        返回:
+            list: [(训练位置数组, 测试位置数组), ...]，最后一折的测试窗口以最后一行结束
+        """
+        folds = []
+        gap = self.purge + self.embargo
+        for i in range(self.n_splits):
+            test_end = n_samples - (self.n_splits - 1 - i) * self.test_size
+            test_start = test_end - self.test_size
+            train_end = test_start - gap
+            train_start = 0 if self.train_size is None else max(0, train_end - self.train_size)
+            if test_start < 0 or train_end - train_start < self.min_train_size:
+                continue
+            folds.append((np.arange(train_start, train_end), np.arange(test_start, test_end)))
+        return folds
+
+    def run(self, data=None, features=None, k=43, p_value_threshold=0.05, models=None, n_workers=1,
+            selector=None):
+        """
+        运行滚动前推验证
+
+        参数:
+            data: 原始日线数据，未提供features时在其上计算一次feature_engineering
+            features: 已计算好的特征（含target列），可复用缓存的特征矩阵
+            k, p_value_threshold: 每折特征选择的参数
+            models: 参与评估的模型列表，默认为ModelTrainer的全部模型
+            n_workers: 并行运行的折数（进程）
+            selector: 特征选择器，默认为FeatureSelector()（f_regression）
+
+        返回:
+            dict: {'folds': 每折每个模型一行的结果, 'summary': 各模型跨折的平均值和标准差}
+        """
+        if features is None:
+            features = feature_engineering(data)
+        folds = self.split(len(features))
+        if not folds:
+            raise ValueError("数据长度不足以生成任何一折")
+
+        selector = selector if selector is not None else FeatureSelector()
+        fold_features = selector.select_folds(features, folds, k=k, p_value_threshold=p_value_threshold)
+
+        n_workers = max(1, min(n_workers, len(folds)))
+        threads = max(1, (os.cpu_count() or 1) // n_workers)
+        tasks = [(fold, features.iloc[train_index], features.iloc[test_index], fold_features[fold], models, threads)
+                 for fold, (train_index, test_index) in enumerate(folds)]
+
+        start_time = time.perf_counter()
+        if n_workers == 1:
+            fold_rows = [_run_fold(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                fold_rows = list(executor.map(_run_fold, *zip(*tasks)))
+        print(f"滚动前推验证完成: {len(folds)} 折, 耗时 {time.perf_counter() - start_time:.1f}s")
+
+        fold_results = pd.DataFrame([row for rows in fold_rows for row in rows])
+        summary = fold_results.groupby('model')[['r2', 'rmse']].agg(['mean', 'std'])
+        summary = summary.sort_values(('rmse', 'mean'))
+        return {'folds': fold_results, 'summary': summary}
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    from sklearn.linear_model import Ridge
+    from lightgbm import LGBMRegressor
+
+    data = pd.read_csv("data/399001_index_20000101_20250630.csv", index_col="date")
+    validator = WalkForwardValidator(n_splits=5, test_size=250, purge=1, embargo=5)
+    result = validator.run(data, models=[Ridge(random_state=42), LGBMRegressor(random_state=42, verbose=-1)], n_workers=2)
+    print(result['folds'][['fold', 'model', 'r2', 'rmse', 'train_end', 'test_start', 'test_end']])
+    print(result['summary'])
@@ -1,6 +1,39 @@
+from array import array
+
 import backtrader as bt
 import numpy as np
 
+
+class VolumePriceSignal(bt.Indicator):
+    """
+    量价信号指标
+
+    buy: 收盘价低于均线且成交量大于均量的两倍
+    sell: 收盘价高于均线且成交量大于均量的两倍
+
+    runonce模式下在once中对整段数组一次性比较，策略的next只需读取信号并下单
+    """
+    lines = ('buy', 'sell')
+    params = dict(window=20)
+
+    def __init__(self):
+        self.ma = bt.indicators.SimpleMovingAverage(self.data.close, period=self.p.window)
+        self.volume_ma = bt.indicators.SimpleMovingAverage(self.data.volume, period=self.p.window)
+
+    def next(self):
+        heavy = self.data.volume[0] > 2 * self.volume_ma[0]
+        self.lines.buy[0] = heavy and self.data.close[0] < self.ma[0]
+        self.lines.sell[0] = heavy and self.data.close[0] > self.ma[0]
+
+    def once(self, start, end):
+        close = np.asarray(self.data.close.array[start:end])
+        volume = np.asarray(self.data.volume.array[start:end])
+        ma = np.asarray(self.ma.array[start:end])
+        heavy = volume > 2 * np.asarray(self.volume_ma.array[start:end])
+        self.lines.buy.array[start:end] = array('d', (heavy & (close < ma)).astype(np.float64))
+        self.lines.sell.array[start:end] = array('d', (heavy & (close > ma)).astype(np.float64))
+
+
 class VolumePriceFactor(bt.Strategy):
     """
     基于价格和成交量的量化因子策略
@@ -27,13 +60,12 @@ class VolumePriceFactor(bt.Strategy):
         self.dataclose = self.datas[0].close
         self.datavolume = self.datas[0].volume   
         
-        # 计算20日均线
-        self.ma20 = bt.indicators.SimpleMovingAverage(
-            self.datas[0].close, period=self.window)
-        
-        # 计算20日均量（使用Talib的SMA来计算）
-        self.volume_ma20 = bt.indicators.SimpleMovingAverage(
-            self.datavolume, period=self.window)
+        # 量价信号（含20日均线和20日均量）
+        self.signal = VolumePriceSignal(self.datas[0], window=self.window)
+        self.ma20 = self.signal.ma
+        self.volume_ma20 = self.signal.volume_ma
+        self.buy_line = self.signal.buy
+        self.sell_line = self.signal.sell
         
         # 记录交易状态
         self.buy_signals = []
@@ -58,15 +90,8 @@ class VolumePriceFactor(bt.Strategy):
         """
         # 检查是否有持仓
         if self.position.size == 0:
-            # 没有持仓，检查买入条件
-            # 条件1: 收盘价小于20日均线
-            condition1 = self.dataclose[0] < self.ma20[0]
-            
-            # 条件2: 成交量大于20日均量的两倍
-            condition2 = self.datavolume[0] > 2 * self.volume_ma20[0]
-            
-            # 同时满足两个条件时买入
-            if condition1 and condition2:
+            # 没有持仓，收盘价小于20日均线且成交量大于20日均量的两倍时买入
+            if self.buy_line[0]:
                 # 买入信号
                 self.buy_signals.append(self.datas[0].datetime.date(0))
                 self.log(f'买入信号: 价格={self.dataclose[0]:.2f}, 20日均线={self.ma20[0]:.2f}')
@@ -79,15 +104,8 @@ class VolumePriceFactor(bt.Strategy):
                 self.buy_price = self.dataclose[0]
                 self.buy_date = self.datas[0].datetime.date(0)
         else:
-            # 有持仓，检查卖出条件
-            # 条件1: 收盘价大于20日均线
-            condition1 = self.dataclose[0] > self.ma20[0]
-            
-            # 条件2: 成交量大于20日均量的两倍
-            condition2 = self.datavolume[0] > 2 * self.volume_ma20[0]
-            
-            # 如果持有超过设定的周期，则卖出
-            if condition1 and condition2:
+            # 有持仓，收盘价大于20日均线且成交量大于20日均量的两倍时卖出
+            if self.sell_line[0]:
                 self.sell_signals.append(self.datas[0].datetime.date(0))
                 self.log(f'卖出信号: 价格={self.dataclose[0]:.2f}, 20日均线={self.ma20[0]:.2f}')
                 
@@ -185,5 +203,147 @@ class VolumePriceFactor(bt.Strategy):
             'min_profit': min(profits) if profits else 0
         }
 
+class _LegacyVolumePriceFactor(VolumePriceFactor):
+    """
+    原始实现：每根K线在next中逐个读取收盘价、成交量和均线判断条件，仅用于基准测试对比，
+    其余方法与VolumePriceFactor相同
+    """
+
+    def __init__(self):
+        """
+        初始化策略
+        """
+        # 保存参数
+        self.window = self.params.window
+        
+        # 保存数据引用
+        self.dataclose = self.datas[0].close
+        self.datavolume = self.datas[0].volume   
+        
+        # 计算20日均线
+        self.ma20 = bt.indicators.SimpleMovingAverage(
+            self.datas[0].close, period=self.window)
+        
+        # 计算20日均量（使用Talib的SMA来计算）
+        self.volume_ma20 = bt.indicators.SimpleMovingAverage(
+            self.datavolume, period=self.window)
+        
+        # 记录交易状态
+        self.buy_signals = []
+        self.trades = []
+        self.buy_price = 0
+        self.buy_date = None
+        self.sell_signals = []
+        self.sell_price = 0
+        self.sell_date = None
+
+    def next(self):
+        """
+        每个交易日执行一次
+        """
+        # 检查是否有持仓
+        if self.position.size == 0:
+            # 没有持仓，检查买入条件
+            # 条件1: 收盘价小于20日均线
+            condition1 = self.dataclose[0] < self.ma20[0]
+            
+            # 条件2: 成交量大于20日均量的两倍
+            condition2 = self.datavolume[0] > 2 * self.volume_ma20[0]
+            
+            # 同时满足两个条件时买入
+            if condition1 and condition2:
+                # 买入信号
+                self.buy_signals.append(self.datas[0].datetime.date(0))
+                self.log(f'买入信号: 价格={self.dataclose[0]:.2f}, 20日均线={self.ma20[0]:.2f}')
+                
+                # 计算买入数量（这里使用总资金的10%）
+                size = int(self.broker.getvalue()  / self.dataclose[0])
+                
+                # 执行买入
+                self.buy(size=size)
+                self.buy_price = self.dataclose[0]
+                self.buy_date = self.datas[0].datetime.date(0)
+        else:
+            # 有持仓，检查卖出条件
+            # 条件1: 收盘价大于20日均线
+            condition1 = self.dataclose[0] > self.ma20[0]
+            
+            # 条件2: 成交量大于20日均量的两倍
+            condition2 = self.datavolume[0] > 2 * self.volume_ma20[0]
+            
+            # 如果持有超过设定的周期，则卖出
+            if condition1 and condition2:
+                self.sell_signals.append(self.datas[0].datetime.date(0))
+                self.log(f'卖出信号: 价格={self.dataclose[0]:.2f}, 20日均线={self.ma20[0]:.2f}')
+                
+                # 记录交易结果
+                profit = (self.dataclose[0] - self.buy_price) / self.buy_price
+                self.trades.append({
+                    'entry_date': self.buy_date,
+                    'exit_date': self.datas[0].datetime.date(0),
+                    'entry_price': self.buy_price,
+                    'exit_price': self.dataclose[0],
+                    'profit': profit
+                })
+                
+                # 执行卖出
+                self.sell(size=self.position.size)
+                self.buy_price = 0
+                self.buy_date = None
+
 #后续需要补充天价天量做空的部分
-#熊市低位放量是最佳买入时机
\ No newline at end of file
+#熊市低位放量是最佳买入时机
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    import contextlib
+    import gc
+    import io
+    import time
+    import pandas as pd
+    from Tool.PandasData import PandasData
+
+    def timed(strategy):
+        """统计策略自身next的累计耗时"""
+        class Timed(strategy):
+            logic_time = 0.0
+
+            def next(self):
+                start_time = time.perf_counter()
+                super().next()
+                self.logic_time += time.perf_counter() - start_time
+        return Timed
+
+    def run_once(strategy, runonce):
+        """运行一次策略，返回总耗时、next耗时、最终资金和交易记录"""
+        cerebro = bt.Cerebro(runonce=runonce, stdstats=False)
+        cerebro.adddata(PandasData(dataname=data))
+        cerebro.addstrategy(timed(strategy))
+        cerebro.broker.setcash(1000000.0)
+        cerebro.broker.setcommission(commission=0.0001)
+        gc.collect()
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            strat = cerebro.run()[0]
+        elapsed = time.perf_counter() - start_time
+        return elapsed, strat.logic_time, cerebro.broker.getvalue(), strat.get_trade_results()
+
+    # 新旧实现在600519上的交易记录和最终资金完全相同，比较每秒处理的K线数和next每根K线的耗时（交替运行5轮取最快）。
+    # 总耗时中数据加载和broker占大部分，新旧实现相同
+    data = pd.read_csv("data/600519_stock_20080101_20250630.csv", index_col="date", parse_dates=True)
+    variants = {'原始实现': (_LegacyVolumePriceFactor, True), 'runonce=True': (VolumePriceFactor, True),
+                'runonce=False': (VolumePriceFactor, False)}
+    results = {}
+    for _ in range(5):
+        for name, (strategy, runonce) in variants.items():
+            elapsed, logic_time, value, trades = run_once(strategy, runonce)
+            if name in results:
+                elapsed, logic_time = min(elapsed, results[name][0]), min(logic_time, results[name][1])
+            results[name] = (elapsed, logic_time, value, trades)
+
+    legacy = results['原始实现']
+    for name, (elapsed, logic_time, value, trades) in results.items():
+        assert value == legacy[2] and trades == legacy[3]
+        print(f"{name}: {len(data) / elapsed:.0f} 根K线/秒 ({legacy[0] / elapsed:.2f}x), "
+              f"next {logic_time / len(data) * 1e6:.1f}us/根 ({legacy[1] / logic_time:.2f}x), "
+              f"交易 {len(trades)} 笔, 最终资金 {value:.2f}")
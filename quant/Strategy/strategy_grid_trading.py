@@ -1,7 +1,244 @@
+from array import array
+
 import backtrader as bt
 import numpy as np
 
+
+class GridSignal(bt.Indicator):
+    """
+    网格重置信号指标
+
+    以当根收盘价为基准价格建立网格（间距取当根ATR的倍数），之后每隔rebalance_days根K线
+    或价格偏离基准价格超过move_threshold时重新建立，重新建立的K线rebalance为1；
+    base/spacing为当根K线结束后生效的网格。
+
+    runonce模式下once按网格的生效区间分段，每段用数组运算查找下一次重置
+    """
+    lines = ('base', 'spacing', 'rebalance')
+    params = dict(
+        grid_spacing=0.02,
+        use_atr=True,
+        atr_period=14,
+        atr_multiplier=2.0,
+        rebalance_days=20,
+        move_threshold=0.3
+    )
+
+    def __init__(self):
+        if self.p.use_atr:
+            self.atr = bt.indicators.ATR(self.data, period=self.p.atr_period)
+        self.base_price = None
+        self.grid_spacing = None
+        self.reset_bar = None
+
+    def _spacing(self, base_price, atr):
+        """计算网格间距：启用ATR且ATR为正时取ATR的倍数，否则取基准价格的固定比例"""
+        if self.p.use_atr and atr > 0:
+            return atr * self.p.atr_multiplier
+        return base_price * self.p.grid_spacing
+
+    def next(self):
+        i = len(self) - 1
+        close = self.data.close[0]
+        atr = self.atr[0] if self.p.use_atr else 0.0
+        if (self.base_price is None or i - self.reset_bar >= self.p.rebalance_days or
+                abs(close - self.base_price) / self.base_price >= self.p.move_threshold):
+            self.base_price, self.grid_spacing, self.reset_bar = close, self._spacing(close, atr), i
+            self.lines.rebalance[0] = 1.0
+        else:
+            self.lines.rebalance[0] = 0.0
+        self.lines.base[0] = self.base_price
+        self.lines.spacing[0] = self.grid_spacing
+
+    def once(self, start, end):
+        close = np.asarray(self.data.close.array[:end])
+        atr = np.asarray(self.atr.array[:end]) if self.p.use_atr else np.zeros(end)
+        base = np.empty(end - start)
+        spacing = np.empty(end - start)
+        rebalance = np.zeros(end - start)
+
+        lo = start
+        if self.base_price is None:
+            self.base_price, self.grid_spacing, self.reset_bar = close[start], self._spacing(close[start], atr[start]), start
+            base[0], spacing[0], rebalance[0] = self.base_price, self.grid_spacing, 1.0
+            lo = start + 1
+
+        while lo < end:
+            # 当前网格最晚在reset_bar + rebalance_days重置，期间价格偏离过大时提前重置
+            hi = min(self.reset_bar + self.p.rebalance_days, end - 1)
+            segment = close[lo:hi + 1]
+            moved = np.flatnonzero(np.abs(segment - self.base_price) / self.base_price >= self.p.move_threshold)
+            if len(moved):
+                hi = lo + moved[0]
+            elif hi - self.reset_bar < self.p.rebalance_days:
+                # 数据结束前不会再重置
+                base[lo - start:] = self.base_price
+                spacing[lo - start:] = self.grid_spacing
+                break
+            base[lo - start:hi - start] = self.base_price
+            spacing[lo - start:hi - start] = self.grid_spacing
+            self.base_price, self.grid_spacing, self.reset_bar = close[hi], self._spacing(close[hi], atr[hi]), hi
+            base[hi - start], spacing[hi - start], rebalance[hi - start] = self.base_price, self.grid_spacing, 1.0
+            lo = hi + 1
+
+        for line, values in ((self.lines.base, base), (self.lines.spacing, spacing), (self.lines.rebalance, rebalance)):
+            line.array[start:end] = array('d', values)
+
+
 class GridTradingStrategy(bt.Strategy):
+    """
+    网格交易策略
+
+    交易规则与原始实现相同：收盘价不高于基准价格下方第一条网格线且资金足够时以市价买入一格，
+    不低于上方第一条网格线且有持仓时以市价卖出持仓的1/grid_levels。
+
+    网格线保存为升序的NumPy数组（下方和上方各grid_levels条），每根K线用二分查找定位收盘价，
+    代替逐条扫描网格线列表；只在有未完成订单时撤单，不会每根K线遍历订单列表
+    """
+    params = dict(
+        grid_spacing=0.02,    # 网格间距（百分比）
+        grid_levels=10,       # 网格层数
+        initial_cash_ratio=0.2,  # 初始资金用于建仓的比例
+        use_atr=True,         # 启用ATR自动调整网格间距
+        atr_period=14,        # ATR计算周期
+        atr_multiplier=2.0,   # ATR倍数，用于计算网格间距
+        rebalance_days=20,    # 重新计算网格的周期（天）
+        move_threshold=0.3    # 价格偏离基准价格的阈值，超过后移动网格
+    )
+
+    def __init__(self):
+        """
+        初始化网格交易策略
+        """
+        # 未完成的订单: order.ref -> 订单，已撤销的订单保留到最终状态通知为止
+        self.orders = {}
+
+        # 网格线（升序），在第一根K线上建立
+        self.levels = None
+
+        # 记录当前持仓数量
+        self.position_count = 0
+
+        # 网格信号指标（含ATR、基准价格和网格重置）
+        self.signal = GridSignal(self.data, grid_spacing=self.p.grid_spacing, use_atr=self.p.use_atr,
+                                 atr_period=self.p.atr_period, atr_multiplier=self.p.atr_multiplier,
+                                 rebalance_days=self.p.rebalance_days, move_threshold=self.p.move_threshold)
+
+        # 保存每根K线都要读取的数据线，避免逐根K线解析属性
+        self.dataclose = self.datas[0].close
+        self.rebalance = self.signal.rebalance
+
+        # 基准价格在第一根K线上确定
+        self.base_price = None
+        self.trade_count = 0
+
+    @property
+    def buy_grid_lines(self):
+        """基准价格下方的网格线（从高到低）"""
+        return self.levels[:self.p.grid_levels][::-1]
+
+    @property
+    def sell_grid_lines(self):
+        """基准价格上方的网格线（从低到高）"""
+        return self.levels[self.p.grid_levels:]
+
+    def _initialize_grid(self):
+        """
+        按信号指标给出的基准价格和间距初始化网格线
+        """
+        self.base_price = self.signal.base[0]
+        grid_spacing = self.signal.spacing[0]
+        steps = np.arange(1, self.p.grid_levels + 1)
+        self.levels = np.concatenate([self.base_price - steps[::-1] * grid_spacing, self.base_price + steps * grid_spacing])
+
+        # 计算每格的交易数量
+        self.cash_per_grid = self.broker.getvalue() * self.p.initial_cash_ratio / self.p.grid_levels
+
+    def next(self):
+        """
+        每个交易日执行一次：按当前网格判断买卖，网格重置的K线在下单后重建网格
+        """
+        # 取消所有未执行的订单
+        if self.orders:
+            self._cancel_open_orders()
+
+        if self.levels is not None:
+            current_price = self.dataclose[0]
+            # 二分查找低于收盘价的网格线数量：少于grid_levels条说明收盘价不高于最高的买入网格线，
+            # 多于grid_levels条（或恰好等于最低的卖出网格线）说明不低于最低的卖出网格线
+            zone = self.levels.searchsorted(current_price)
+            if zone < self.p.grid_levels:
+                self._check_buy_conditions(current_price)
+            elif zone > self.p.grid_levels or current_price == self.levels[zone]:
+                self._check_sell_conditions(current_price)
+
+        # 网格在这根K线上（重新）建立
+        if self.rebalance[0]:
+            self._initialize_grid()
+
+    def _cancel_open_orders(self):
+        """
+        取消所有未执行的订单
+        """
+        for order in self.orders.values():
+            if order.status in [order.Submitted, order.Accepted]:
+                self.cancel(order)
+
+    def _check_buy_conditions(self, current_price):
+        """
+        价格触及买入网格线时，资金足够则买入一格
+        """
+        # 获取可用资金
+        available_cash = self.broker.getcash()
+        if available_cash >= self.cash_per_grid:
+            # 计算购买数量
+            size = int(self.cash_per_grid / current_price)
+            if size > 0:
+                # 下买单
+                buy_order = self.buy(size=size)
+                self.orders[buy_order.ref] = buy_order
+                self.position_count += 1
+                print(f"买入: 价格={current_price:.2f}, 数量={size}, 网格价格={self.levels[self.p.grid_levels - 1]:.2f}")
+
+    def _check_sell_conditions(self, current_price):
+        """
+        价格触及卖出网格线时，有持仓则卖出一格
+        """
+        # 当前持仓数量，包括撤单前已经成交的订单
+        current_position = self.position.size
+        if current_position > 0:
+            # 计算卖出数量（可以选择全部卖出或部分卖出）
+            size = int(current_position / self.p.grid_levels) if self.position_count > 0 else current_position
+            size = max(1, size)  # 至少卖出1股
+
+            # 下卖单
+            sell_order = self.sell(size=size)
+            self.orders[sell_order.ref] = sell_order
+            self.position_count = max(0, self.position_count - 1)
+            print(f"卖出: 价格={current_price:.2f}, 数量={size}, 网格价格={self.levels[self.p.grid_levels]:.2f}")
+
+    def notify_order(self, order):
+        """
+        订单状态变化时的回调函数：订单到达最终状态时移出订单表，成交（包括撤单前已经成交）时计数
+        """
+        if order.status in [order.Completed, order.Canceled, order.Margin, order.Rejected]:
+            if self.orders.pop(order.ref, None) is not None and order.status == order.Completed:
+                self.trade_count += 1
+
+    def stop(self):
+        """
+        策略结束时执行
+        """
+        print(f"最终资金: {self.broker.getvalue():.2f}")
+        print(f"最终持仓: {self.position.size}")
+
+
+class _LegacyGridTradingStrategy(bt.Strategy):
+    """
+    原始实现：每根K线撤销全部未成交订单并按收盘价重新判断网格，以市价单买卖，仅用于基准测试对比。
+    原始的start()在第一根K线之前读取ATR，任何模式下都会抛出IndexError，这里去掉了该调用（网格在第一根K线建立），
+    其余逻辑保持不变
+    """
     params = dict(
         grid_spacing=0.02,    # 网格间距（百分比）
         grid_levels=10,       # 网格层数
@@ -40,10 +277,8 @@ class GridTradingStrategy(bt.Strategy):
         """
         策略启动时执行
         """
-        # 设置基准价格（使用第一个可用的收盘价）
-        if self.data.close[0] > 0:
-            self.base_price = self.data.close[0]
-            self._initialize_grid()
+        # 原始实现在此读取收盘价和ATR并建立网格，数据尚未开始迭代，已去掉；网格在next()的第一根K线建立
+        pass
     
     def _initialize_grid(self):
         """
@@ -181,4 +416,85 @@ class GridTradingStrategy(bt.Strategy):
         策略结束时执行
         """
         print(f"最终资金: {self.broker.getvalue():.2f}")
-        print(f"最终持仓: {self.position.size}")
\ No newline at end of file
+        print(f"最终持仓: {self.position.size}")
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    import contextlib
+    import gc
+    import io
+    import time
+    import pandas as pd
+    from Tool.PandasData import PandasData
+
+    def timed(strategy):
+        """统计策略自身next和notify_order的累计耗时，不含buy/sell中broker创建订单的耗时（新旧实现的订单相同）"""
+        class Timed(strategy):
+            def __init__(self):
+                super().__init__()
+                self.logic_time = 0.0
+
+            def next(self):
+                start_time = time.perf_counter()
+                super().next()
+                self.logic_time += time.perf_counter() - start_time
+
+            def notify_order(self, order):
+                start_time = time.perf_counter()
+                super().notify_order(order)
+                self.logic_time += time.perf_counter() - start_time
+
+            def buy(self, *args, **kwargs):
+                start_time = time.perf_counter()
+                order = super().buy(*args, **kwargs)
+                self.logic_time -= time.perf_counter() - start_time
+                return order
+
+            def sell(self, *args, **kwargs):
+                start_time = time.perf_counter()
+                order = super().sell(*args, **kwargs)
+                self.logic_time -= time.perf_counter() - start_time
+                return order
+        return Timed
+
+    def run_once(strategy, grid_levels, runonce):
+        """运行一次策略，返回总耗时、策略自身耗时、输出、策略、最终资金和订单数"""
+        cerebro = bt.Cerebro(runonce=runonce, stdstats=False)
+        cerebro.adddata(PandasData(dataname=data))
+        cerebro.addstrategy(timed(strategy), grid_levels=grid_levels)
+        cerebro.broker.setcash(1000000.0)
+        cerebro.broker.setcommission(commission=0.0001)
+        buffer = io.StringIO()
+        gc.collect()
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(buffer):
+            strat = cerebro.run()[0]
+        elapsed = time.perf_counter() - start_time
+        return [elapsed, strat.logic_time, buffer.getvalue(), strat, cerebro.broker.getvalue(), len(cerebro.broker.orders)]
+
+    # 新旧实现在600519上的交易记录和最终资金完全相同；比较每秒处理的K线数和策略自身网格判断（next、notify_order，
+    # 不含创建订单）每根K线的耗时。新旧实现交替运行5轮取最快，减少机器负载波动的影响。
+    # 总耗时中数据加载、broker和创建订单占大部分，新旧实现相同
+    data = pd.read_csv("data/600519_stock_20080101_20250630.csv", index_col="date", parse_dates=True)
+    variants = {'原始实现': (_LegacyGridTradingStrategy, True), 'runonce=True': (GridTradingStrategy, True),
+                'runonce=False': (GridTradingStrategy, False)}
+    for grid_levels in (10, 200):
+        results = {}
+        for _ in range(5):
+            for name, (strategy, runonce) in variants.items():
+                result = run_once(strategy, grid_levels, runonce)
+                if name in results:
+                    result[0], result[1] = min(result[0], results[name][0]), min(result[1], results[name][1])
+                results[name] = result
+
+        legacy = results['原始实现']
+        signals = {}
+        for name, (elapsed, logic_time, output, strat, value, n_orders) in results.items():
+            if name != '原始实现':
+                assert output == legacy[2] and value == legacy[4] and n_orders == legacy[5]
+                signals[name] = np.array([strat.signal.lines[i].array for i in range(3)])
+            print(f"grid_levels={grid_levels}, {name}: {len(data) / elapsed:.0f} 根K线/秒 ({legacy[0] / elapsed:.2f}x), "
+                  f"网格判断 {logic_time / len(data) * 1e6:.1f}us/根 ({legacy[1] / logic_time:.2f}x), "
+                  f"提交订单 {n_orders} 个, 最终资金 {value:.2f}")
+        # 两种模式下网格信号完全相同
+        np.testing.assert_array_equal(signals['runonce=True'][:, 14:], signals['runonce=False'][:, 14:])
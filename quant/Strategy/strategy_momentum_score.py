@@ -1,123 +1,271 @@
+import math
+from array import array
+from collections import deque
+
 import backtrader as bt
 import numpy as np
 import pandas as pd
 from sklearn.linear_model import LinearRegression
 
+
+class MomentumScoreState:
+    """
+    动量分的滚动状态：年化收益 × R平方 / EWMA波动率
+
+    只保存最近lookback_period个收盘价和收益率（有界环形缓冲区）：
+    年化收益由首尾收盘价之比得到，R平方由滚动回归和（Σy、Σy²、Σxy）按闭式公式计算，
+    EWMA方差的加权平方和每根K线增量更新，新增一根K线的计算量与历史长度无关
+    """
+
+    def __init__(self, lookback_period=20, ewma_period=10):
+        """
+        参数:
+            lookback_period: 计算动量分的回溯期
+            ewma_period: EWMA的周期参数
+        """
+        self.lookback_period = lookback_period
+        self.ewma_period = ewma_period
+        self.closes = deque(maxlen=lookback_period + 1)
+        # 收益率窗口及其回归和，x为窗口内的位置0..m-1
+        self.returns = deque()
+        self.sum_y = 0.0
+        self.sum_yy = 0.0
+        self.sum_xy = 0.0
+        # 对数收益率平方的EWMA加权和，窗口为最近lookback_period个收盘价的lookback_period-1个对数收益率
+        self.decay = 1 - 2 / (ewma_period + 1)
+        self.ewma_window = lookback_period - 1
+        self.squares = deque()
+        self.ewma_sum = 0.0
+        self.ewma_weight = sum(self.decay ** i for i in range(self.ewma_window))
+
+    def update(self, close):
+        """
+        输入新的收盘价，返回动量分；收盘价不足lookback_period个时返回NaN
+        """
+        if self.closes:
+            prev_close = self.closes[-1]
+
+            # 收益率窗口：满了先移出最旧的值，所有位置前移一位
+            y = (close - prev_close) / prev_close
+            if len(self.returns) == self.lookback_period:
+                oldest = self.returns.popleft()
+                self.sum_y -= oldest
+                self.sum_yy -= oldest * oldest
+                self.sum_xy -= self.sum_y
+            self.sum_xy += len(self.returns) * y
+            self.sum_y += y
+            self.sum_yy += y * y
+            self.returns.append(y)
+
+            # EWMA：已有值的权重整体衰减一步，最新值权重为1，超出窗口的值减去其衰减后的权重
+            square = math.log(close / prev_close) ** 2
+            self.ewma_sum = self.decay * self.ewma_sum + square
+            self.squares.append(square)
+            if len(self.squares) > self.ewma_window:
+                self.ewma_sum -= self.decay ** self.ewma_window * self.squares.popleft()
+        self.closes.append(close)
+
+        if len(self.closes) < self.lookback_period:
+            return np.nan
+        m = len(self.returns)
+        annualized_return = (close / self.closes[-1 - m]) ** (252 / m) - 1
+
+        sum_x = m * (m - 1) / 2
+        sum_xx = (m - 1) * m * (2 * m - 1) / 6
+        ss_total = self.sum_yy - self.sum_y * self.sum_y / m
+        ss_x = sum_xx - sum_x * sum_x / m
+        cov = self.sum_xy - sum_x * self.sum_y / m
+        r_squared = cov * cov / (ss_x * ss_total) if ss_total > 0 else 0
+
+        if self.ewma_window < self.ewma_period:
+            return 0
+        ewma_volatility = math.sqrt(max(self.ewma_sum, 0.0) / self.ewma_weight * 252)
+        return annualized_return * r_squared / ewma_volatility if ewma_volatility != 0 else 0
+
+
+def _window_r_squared(windows):
+    """对每一行y关于x=0..m-1做线性回归，返回R平方；总平方和为0的行为0"""
+    m = windows.shape[1]
+    x = np.arange(m) - (m - 1) / 2
+    centered = windows - windows.mean(axis=1, keepdims=True)
+    ss_total = (centered ** 2).sum(axis=1)
+    cov = centered @ x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(ss_total > 0, cov ** 2 / ((x ** 2).sum() * ss_total), 0.0)
+
+
+def momentum_score_array(close, lookback_period=20, ewma_period=10):
+    """
+    向量化计算整段收盘价序列的动量分，结果与逐根K线更新MomentumScoreState一致
+
+    返回:
+        ndarray: 与close等长，前lookback_period-1个为NaN
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    scores = np.full(n, np.nan)
+    if n < lookback_period:
+        return scores
+    returns = np.diff(close) / close[:-1]
+
+    # 第lookback_period根K线只有lookback_period-1个收益率，之后窗口为lookback_period个
+    ends = np.arange(lookback_period - 1, n)
+    m = np.minimum(ends, lookback_period)
+    annualized_return = (close[ends] / close[ends - m]) ** (252 / m) - 1
+
+    r_squared = np.empty(len(ends))
+    r_squared[0] = _window_r_squared(returns[None, :lookback_period - 1])[0]
+    if n > lookback_period:
+        windows = np.lib.stride_tricks.sliding_window_view(returns, lookback_period)
+        r_squared[1:] = _window_r_squared(windows)
+
+    ewma_window = lookback_period - 1
+    if ewma_window < ewma_period:
+        scores[ends] = 0
+        return scores
+    decay = 1 - 2 / (ewma_period + 1)
+    weights = decay ** np.arange(ewma_window)
+    squares = np.log(close[1:] / close[:-1]) ** 2
+    ewma = np.lib.stride_tricks.sliding_window_view(squares, ewma_window) @ weights[::-1]
+    ewma_volatility = np.sqrt(ewma / weights.sum() * 252)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores[ends] = np.where(ewma_volatility != 0, annualized_return * r_squared / ewma_volatility, 0)
+    return scores
+
+
+def _reference_momentum_score(close_history, lookback_period=20, ewma_period=10):
+    """
+    按全部历史重新计算收益率并拟合LinearRegression的原始实现，仅用于校验滚动版本的结果
+    """
+    returns = []
+    for i in range(1, len(close_history)):
+        returns.append((close_history[i] - close_history[i-1]) / close_history[i-1])
+
+    recent_returns = returns[-lookback_period:]
+    total_return = 1.0
+    for r in recent_returns:
+        total_return *= (1 + r)
+    annualized_return = (total_return ** (252 / len(recent_returns))) - 1
+
+    X = np.arange(len(recent_returns)).reshape(-1, 1)
+    y = np.array(recent_returns)
+    model = LinearRegression()
+    model.fit(X, y)
+    y_pred = model.predict(X)
+    ss_total = np.sum((y - np.mean(y)) ** 2)
+    ss_residual = np.sum((y - y_pred) ** 2)
+    r_squared = 1 - (ss_residual / ss_total) if ss_total != 0 else 0
+
+    log_returns = np.diff(np.log(close_history[-lookback_period:]))
+    if len(log_returns) < ewma_period:
+        ewma_volatility = 0
+    else:
+        lambda_ = 2 / (ewma_period + 1)
+        volatility = 0
+        weights = []
+        for i, ret in enumerate(reversed(log_returns)):
+            weight = (1 - lambda_) ** i
+            weights.append(weight)
+            volatility += weight * (ret ** 2)
+        volatility /= sum(weights)
+        ewma_volatility = np.sqrt(volatility * 252)
+
+    if ewma_volatility == 0:
+        return 0
+    return annualized_return * r_squared / ewma_volatility
+
+
+class MomentumScore(bt.Indicator):
+    """
+    动量分指标
+
+    逐根K线运行（runonce=False或实盘）时使用MomentumScoreState增量更新；
+    runonce模式下在once中对整段数据一次性向量化计算
+    """
+    lines = ('score',)
+    params = dict(
+        lookback_period=20,
+        ewma_period=10,
+    )
+
+    def __init__(self):
+        self.addminperiod(self.p.lookback_period)
+        self.state = MomentumScoreState(self.p.lookback_period, self.p.ewma_period)
+
+    def prenext(self):
+        self.state.update(self.data[0])
+
+    def next(self):
+        self.lines.score[0] = self.state.update(self.data[0])
+
+    def once(self, start, end):
+        scores = momentum_score_array(self.data.array[:end], self.p.lookback_period, self.p.ewma_period)
+        self.lines.score.array[start:end] = array('d', scores[start:end])
+
+
 class MomentumScoreStrategy(bt.Strategy):
     params = dict(
         lookback_period=20,  # 计算动量分的回溯期
         ewma_period=10,      # EWMA的周期参数
         score_threshold=0.5  # 动量分阈值，超过该值时买入
     )
-    
+
     def __init__(self):
-        # 存储价格历史数据
-        self.close_history = []
+        # 动量分：年化收益 × R平方 / EWMA波动率，正值表示上涨动量，负值表示下跌动量
+        self.score = MomentumScore(self.data.close, lookback_period=self.p.lookback_period,
+                                   ewma_period=self.p.ewma_period)
         self.momentum_score = None
-        
+
     def next(self):
-        # 记录收盘价历史
-        self.close_history.append(self.data.close[0])
-        
-        # 确保有足够的历史数据来计算动量分
-        if len(self.close_history) >= self.p.lookback_period:
-            # 计算动量分
-            self.momentum_score = self.calculate_momentum_score()
-            
-            # 交易逻辑
-            if not self.position and self.momentum_score > self.p.score_threshold:
-                # 当没有仓位且动量分大于阈值时买入
-                self.buy()
-                print(f"买入: 价格={self.data.close[0]}, 动量分={self.momentum_score}")
-            elif self.position and self.momentum_score < -self.p.score_threshold:
-                # 当有仓位且动量分小于负阈值时卖出
-                self.close()
-                print(f"卖出: 价格={self.data.close[0]}, 动量分={self.momentum_score}")
-    
-    def calculate_momentum_score(self):
-        """
-        计算动量分：年化收益 × R平方 / EWMA
-        该指标综合考量了资产的收益性、趋势持续性和波动性，用于捕捉市场动量
-        
-        返回值：
-            float: 计算得到的动量分数，正值表示上涨动量，负值表示下跌动量
-        """
-        # 计算日度收益率序列
-        returns = []
-        for i in range(1, len(self.close_history)):
-            # 计算相邻两日的收益率：(今日收盘价-昨日收盘价)/昨日收盘价
-            returns.append((self.close_history[i] - self.close_history[i-1]) / self.close_history[i-1])
-        
-        # 计算回溯期内的年化收益率（假设一年252个交易日）
-        recent_returns = returns[-self.p.lookback_period:]  # 获取最近lookback_period个收益率
-        total_return = 1.0
-        for r in recent_returns:
-            # 使用复利计算总收益
-            total_return *= (1 + r)
-        # 将总收益转换为年化收益率
-        annualized_return = (total_return ** (252 / len(recent_returns))) - 1
-        
-        # 计算R平方值，衡量收益率的线性趋势强度
-        # 准备线性回归数据：X为时间序列(0,1,2,...)，y为收益率序列
-        X = np.arange(len(recent_returns)).reshape(-1, 1)  # 重塑为二维数组以适应sklearn
-        y = np.array(recent_returns)
-        
-        # 执行线性回归，拟合收益率的时间趋势
-        model = LinearRegression()
-        model.fit(X, y)
-        y_pred = model.predict(X)  # 获取预测的收益率值
-        
-        # 计算R平方：1 - (残差平方和/总平方和)
-        ss_total = np.sum((y - np.mean(y)) ** 2)  # 总平方和（离均差平方和）
-        ss_residual = np.sum((y - y_pred) ** 2)   # 残差平方和（预测误差平方和）
-        # 避免除以零的情况，当总平方和为0时，R平方设为0
-        r_squared = 1 - (ss_residual / ss_total) if ss_total != 0 else 0
-        
-        # 计算EWMA（指数加权移动平均）波动率
-        # 首先计算价格的对数收益率，用于波动率计算
-        log_prices = np.log(self.close_history[-self.p.lookback_period:])  # 取对数价格
-        log_returns = np.diff(log_prices)  # 计算对数收益率
-        
-        # 调用专用方法计算EWMA波动率
-        ewma_volatility = self.calculate_ewma_volatility(log_returns, self.p.ewma_period)
-        
-        # 计算最终动量分：年化收益 × R平方 / EWMA波动率
-        # 避免除以零的情况，当波动率为0时，动量分设为0
-        if ewma_volatility == 0:
-            momentum_score = 0
-        else:
-            momentum_score = annualized_return * r_squared / ewma_volatility
-        
-        return momentum_score
-    
-    def calculate_ewma_volatility(self, returns, period):
-        # 计算EWMA波动率
-        if len(returns) < period:
-            return 0
-        
-        # EWMA参数
-        lambda_ = 2 / (period + 1)
-        
-        # 初始化波动率
-        volatility = 0
-        weights = []
-        
-        # 计算加权平方收益率
-        for i, ret in enumerate(reversed(returns)):
-            weight = (1 - lambda_) ** i
-            weights.append(weight)
-            volatility += weight * (ret ** 2)
-        
-        # 归一化权重
-        if sum(weights) > 0:
-            volatility /= sum(weights)
-        
-        # 年化波动率
-        annualized_vol = np.sqrt(volatility * 252)
-        
-        return annualized_vol
+        # 指标的最小周期保证已有lookback_period个收盘价
+        self.momentum_score = self.score[0]
+
+        # 交易逻辑
+        if not self.position and self.momentum_score > self.p.score_threshold:
+            # 当没有仓位且动量分大于阈值时买入
+            self.buy()
+            print(f"买入: 价格={self.data.close[0]}, 动量分={self.momentum_score}")
+        elif self.position and self.momentum_score < -self.p.score_threshold:
+            # 当有仓位且动量分小于负阈值时卖出
+            self.close()
+            print(f"卖出: 价格={self.data.close[0]}, 动量分={self.momentum_score}")
 
     def stop(self):
         if self.momentum_score is not None:
             print(f"最终动量分: {self.momentum_score}")
-        print(f"最终资金: {self.broker.getvalue():.2f}")
\ No newline at end of file
+        print(f"最终资金: {self.broker.getvalue():.2f}")
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    import time
+    from Tool.PandasData import PandasData
+
+    data = pd.read_csv("data/600519_stock_20080101_20250630.csv", index_col="date", parse_dates=True)
+    closes = data['close'].astype(float).tolist()
+
+    start_time = time.perf_counter()
+    expected = [np.nan] * 19 + [_reference_momentum_score(closes[:i + 1]) for i in range(19, len(closes))]
+    reference_time = time.perf_counter() - start_time
+
+    state = MomentumScoreState()
+    start_time = time.perf_counter()
+    streamed = [state.update(close) for close in closes]
+    state_time = time.perf_counter() - start_time
+
+    vectorized = momentum_score_array(closes)
+    np.testing.assert_allclose(streamed, expected, rtol=1e-6, atol=1e-9)
+    np.testing.assert_allclose(vectorized, expected, rtol=1e-6, atol=1e-9)
+    print(f"动量分与原始实现一致: 原始实现 {reference_time:.2f}s, 滚动状态 {state_time * 1000:.1f}ms")
+
+    # 两种运行模式下的指标值和交易结果相同
+    for runonce in (True, False):
+        cerebro = bt.Cerebro(runonce=runonce)
+        cerebro.adddata(PandasData(dataname=data))
+        cerebro.addstrategy(MomentumScoreStrategy)
+        start_time = time.perf_counter()
+        strat = cerebro.run()[0]
+        scores = np.array(strat.score.lines.score.array)
+        np.testing.assert_allclose(scores, expected, rtol=1e-6, atol=1e-9)
+        print(f"runonce={runonce}: 回测耗时 {time.perf_counter() - start_time:.2f}s")
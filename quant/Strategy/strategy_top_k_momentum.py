@@ -0,0 +1,73 @@
+import math
+
+import backtrader as bt
+import numpy as np
+
+from Strategy.strategy_momentum_score import MomentumScore
+
+
+class TopKMomentumStrategy(bt.Strategy):
+    """
+    截面动量轮动策略
+
+    每只代码计算动量分（年化收益 × R平方 / EWMA波动率），每隔rebalance_days根K线
+    对当日有K线且动量分有效的代码做截面排名，等权持有动量分最高的top_k只（动量分需大于min_score），
+    其余持仓清空。先下卖单再下买单，卖出释放的资金可用于同一次调仓的买入
+    """
+    params = dict(
+        top_k=10,              # 持有的代码数量
+        rebalance_days=20,     # 调仓周期（K线数）
+        lookback_period=20,    # 动量分的回溯期
+        ewma_period=10,        # EWMA的周期参数
+        min_score=0.0,         # 入选的最低动量分
+        invest_ratio=0.95,     # 投入的资产比例，留出现金应对开盘价跳空和佣金
+        printlog=False         # 是否打印日志
+    )
+
+    def __init__(self):
+        self.scores = [MomentumScore(data.close, lookback_period=self.p.lookback_period,
+                                     ewma_period=self.p.ewma_period) for data in self.datas]
+        self.bar_count = 0
+        self.rebalance_count = 0
+
+    def log(self, txt, doprint=False):
+        if self.p.printlog or doprint:
+            print(f'{self.datetime.date(0).isoformat()}, {txt}')
+
+    def prenext(self):
+        # 上市时间不同的代码不必等待全部数据源就绪
+        self.next()
+
+    def next(self):
+        self.bar_count += 1
+        if (self.bar_count - 1) % self.p.rebalance_days:
+            return
+
+        # 当日有K线且动量分已就绪的代码
+        now = self.datetime[0]
+        candidates = []
+        for i, data in enumerate(self.datas):
+            if len(data) and data.datetime[0] == now:
+                score = self.scores[i][0]
+                if not math.isnan(score) and score > self.p.min_score:
+                    candidates.append((i, score))
+        if not candidates:
+            return
+
+        # 截面排名，取动量分最高的top_k只
+        indexes = np.array([i for i, _ in candidates])
+        scores = np.array([score for _, score in candidates])
+        selected = set(indexes[np.argsort(-scores, kind='stable')[:self.p.top_k]].tolist())
+
+        for i, data in enumerate(self.datas):
+            if i not in selected and self.getposition(data).size:
+                self.order_target_percent(data, target=0.0)
+        weight = self.p.invest_ratio / len(selected)
+        for i in sorted(selected):
+            self.order_target_percent(self.datas[i], target=weight)
+
+        self.rebalance_count += 1
+        self.log(f'调仓: 持有 {[self.datas[i]._name for i in sorted(selected)]}')
+
+    def stop(self):
+        self.log(f'调仓次数: {self.rebalance_count}, 最终资金: {self.broker.getvalue():.2f}', doprint=True)
@@ -0,0 +1,267 @@
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+class BarStore:
+    """
+    本地列式K线存储，按代码和年份分区保存为Parquet文件
+
+    目录结构:
+        root/symbol=600519/year=2020/part.parquet
+
+    读取时只打开落在日期范围内的年份分区，日期过滤和列选择直接下推到Parquet文件，
+    避免每次运行都重新解析整份CSV文本
+    """
+
+    def __init__(self, root="../data/bar_store", date_column="date", max_workers=8):
+        """
+        参数:
+            root (str): 存储根目录
+            date_column (str): 日期列名称，读取时作为索引
+            max_workers (int): 多代码并行读取的线程数
+        """
+        self.root = root
+        self.date_column = date_column
+        self.max_workers = max_workers
+
+    def _symbol_dir(self, code):
+        return os.path.join(self.root, f"symbol={code}")
+
+    def _partition_path(self, code, year):
+        return os.path.join(self._symbol_dir(code), f"year={year}", "part.parquet")
+
+    def codes(self):
+        """返回存储中已有的全部代码"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name.split("=", 1)[1] for name in os.listdir(self.root) if name.startswith("symbol="))
+
+    def has(self, code):
+        """判断代码是否已有数据"""
+        return len(self.years(code)) > 0
+
+    def years(self, code):
+        """返回代码已存储的年份分区（升序）"""
+        symbol_dir = self._symbol_dir(code)
+        if not os.path.isdir(symbol_dir):
+            return []
+        years = []
+        for name in os.listdir(symbol_dir):
+            if name.startswith("year=") and os.path.exists(os.path.join(symbol_dir, name, "part.parquet")):
+                years.append(int(name.split("=", 1)[1]))
+        return sorted(years)
+
+    def _normalize(self, df):
+        """将以日期为索引的DataFrame整理为按日期排序、去重的列式表"""
+        df = df.copy()
+        if df.index.name == self.date_column or self.date_column not in df.columns:
+            df.index.name = self.date_column
+            df = df.reset_index()
+        df[self.date_column] = pd.to_datetime(df[self.date_column])
+        df = df.sort_values(self.date_column)
+        df = df.drop_duplicates(subset=self.date_column, keep="first")
+        return df.reset_index(drop=True)
+
+    def _write_partitions(self, code, partitions):
+        """
+        原子写入多个年份分区：先全部写入临时文件，成功后再逐个替换，
+        任一分区写入失败时不会留下半更新的数据
+
+        参数:
+            code (str): 代码
+            partitions (dict): {年份: DataFrame}
+        """
+        staged = []
+        try:
+            for year, df in partitions.items():
+                path = self._partition_path(code, year)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                staged.append((tmp_path, path))
+                pq.write_table(pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False), tmp_path)
+            for tmp_path, path in staged:
+                os.replace(tmp_path, path)
+        finally:
+            for tmp_path, _ in staged:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def write(self, code, df):
+        """
+        写入单只代码的数据，覆盖涉及到的年份分区
+
+        参数:
+            code (str): 股票或指数代码
+            df (DataFrame): 以日期为索引（或包含日期列）的K线数据
+        """
+        df = self._normalize(df)
+        years = df[self.date_column].dt.year
+        self._write_partitions(code, {int(year): part for year, part in df.groupby(years)})
+
+    def last_date(self, code):
+        """返回代码最后一根已存储K线的日期，没有数据时返回None"""
+        years = self.years(code)
+        if not years:
+            return None
+        table = pq.read_table(self._partition_path(code, years[-1]), columns=[self.date_column])
+        return pd.Timestamp(pc.max(table.column(self.date_column)).as_py())
+
+    def _read_partition(self, code, year):
+        return pq.read_table(self._partition_path(code, year)).to_pandas()
+
+    def append(self, code, df):
+        """
+        追加新K线，只重写最后一个年份分区和新增的年份分区
+
+        日期不晚于最后一根已存储K线的行不会写入，并按以下情况分类统计:
+            duplicated: 已存储且数值一致
+            conflicted: 已存储但数值不一致（保留已存储的数据）
+            stale: 早于最后一根K线但存储中不存在
+
+        参数:
+            code (str): 代码
+            df (DataFrame): 以日期为索引（或包含日期列）的K线数据
+
+        返回:
+            dict: 各类行数统计及追加后的最后日期
+        """
+        df = self._normalize(df)
+        report = {'appended': 0, 'duplicated': 0, 'conflicted': 0, 'stale': 0, 'last_date': None}
+        last = self.last_date(code)
+        if last is None:
+            if len(df):
+                self.write(code, df)
+            report['appended'] = len(df)
+            report['last_date'] = df[self.date_column].max() if len(df) else None
+            return report
+
+        # 检查与已存储数据重叠的部分
+        overlap = df[df[self.date_column] <= last].set_index(self.date_column)
+        if len(overlap):
+            stored = self._read_one(code, overlap.index.min(), last, None)
+            common = overlap.index.intersection(stored.index)
+            columns = overlap.columns.intersection(stored.columns)
+            new_values = overlap.loc[common, columns]
+            old_values = stored.loc[common, columns]
+            same = ((new_values == old_values) | (new_values.isna() & old_values.isna())).all(axis=1)
+            report['duplicated'] = int(same.sum())
+            report['conflicted'] = int((~same).sum())
+            report['stale'] = len(overlap) - len(common)
+            if report['conflicted']:
+                print(f"{code} 有{report['conflicted']}根K线与已存储数据不一致，保留已存储数据")
+
+        tail = df[df[self.date_column] > last]
+        report['last_date'] = last
+        if tail.empty:
+            return report
+
+        # 与最后一个分区合并，并按已存储的列类型对齐新数据
+        existing = self._read_partition(code, last.year)
+        tail = tail.copy()
+        for column in tail.columns.intersection(existing.columns):
+            try:
+                tail[column] = tail[column].astype(existing[column].dtype)
+            except (TypeError, ValueError):
+                pass
+
+        partitions = {}
+        for year, part in tail.groupby(tail[self.date_column].dt.year):
+            year = int(year)
+            if year == last.year:
+                part = pd.concat([existing, part], ignore_index=True)
+            partitions[year] = part
+        self._write_partitions(code, partitions)
+
+        report['appended'] = len(tail)
+        report['last_date'] = tail[self.date_column].max()
+        return report
+
+    def ingest_csv(self, code, csv_file, index_col="date"):
+        """将已有的CSV文件导入存储"""
+        df = pd.read_csv(csv_file, index_col=index_col)
+        self.write(code, df)
+        return df
+
+    def _read_one(self, code, start, end, columns):
+        files = []
+        for year in self.years(code):
+            if start is not None and year < start.year:
+                continue
+            if end is not None and year > end.year:
+                continue
+            files.append(self._partition_path(code, year))
+        if not files:
+            return None
+
+        dataset = ds.dataset(files, format="parquet")
+        if columns is not None:
+            columns = [self.date_column] + [c for c in columns if c != self.date_column]
+
+        # 日期过滤下推到Parquet扫描
+        date_field = ds.field(self.date_column)
+        expr = None
+        if start is not None:
+            expr = date_field >= pa.scalar(start, type=dataset.schema.field(self.date_column).type)
+        if end is not None:
+            cond = date_field <= pa.scalar(end, type=dataset.schema.field(self.date_column).type)
+            expr = cond if expr is None else expr & cond
+
+        table = dataset.to_table(columns=columns, filter=expr)
+        df = table.to_pandas()
+        df = df.set_index(self.date_column).sort_index()
+        return df
+
+    def read(self, codes, start=None, end=None, columns=None):
+        """
+        读取多只代码的数据
+
+        参数:
+            codes (list): 代码列表
+            start (str): 开始日期（含），如 "20080101"，默认为不限
+            end (str): 结束日期（含），如 "20250630"，默认为不限
+            columns (list): 需要读取的列，默认为全部列
+
+        返回:
+            dict: {代码: 以日期为索引的DataFrame}，按codes顺序，缺失的代码不包含在内
+        """
+        if isinstance(codes, str):
+            codes = [codes]
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            frames = list(executor.map(lambda code: self._read_one(code, start, end, columns), codes))
+
+        return {code: frame for code, frame in zip(codes, frames) if frame is not None}
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    # 将本地CSV导入存储，并对比CSV解析与列式读取的耗时
+    csv_files = {
+        "600519": "data/600519_stock_20080101_20250630.csv",
+        "002230": "data/002230_stock_20080101_20250630.csv",
+        "000333": "data/000333_stock_20080101_20250630.csv",
+    }
+    store = BarStore("data/bar_store/stock")
+    for code, csv_file in csv_files.items():
+        store.ingest_csv(code, csv_file)
+
+    start_time = time.perf_counter()
+    for csv_file in csv_files.values():
+        pd.read_csv(csv_file, index_col="date")
+    print(f"CSV读取耗时: {time.perf_counter() - start_time:.4f}s")
+
+    start_time = time.perf_counter()
+    frames = store.read(list(csv_files), start="20200101", end="20250630", columns=["open", "close"])
+    print(f"列式存储读取耗时: {time.perf_counter() - start_time:.4f}s")
+    for code, frame in frames.items():
+        print(code, frame.shape, frame.index.min(), frame.index.max())
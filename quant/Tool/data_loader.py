@@ -1,32 +1,128 @@
+import os
+import hashlib
 import pandas as pd
-from Tool.get_csv_data_akshare import get_stock_data_skshare, get_indices_data_akshare
-from Tool.feature_engineering import feature_engineering
+from Tool.bar_store import BarStore
+from Tool.data_updater import IncrementalUpdater
+from Tool.data_provider import FetchScheduler, LocalCsvProvider
+from Tool.get_csv_data_akshare import get_stock_data_skshare, get_indices_data_akshare, AkshareStockProvider, AkshareIndexProvider
+from Tool.feature_engineering import feature_engineering, assert_no_lookahead
 
 class DataLoader:
-    def __init__(self, use_local_data=True):
-        """初始化数据加载器"""
+    def __init__(self, use_local_data=True, use_bar_store=True, store_dir="../data/bar_store", data_dir="../data",
+                 stock_provider=None, index_provider=None, max_workers=8, requests_per_second=None, compact=False,
+                 refresh=False):
+        """初始化数据加载器
+        
+        参数:
+            use_local_data (bool): 是否使用本地CSV数据
+            use_bar_store (bool): 是否通过列式存储BarStore缓存和读取数据
+            store_dir (str): BarStore根目录，股票和指数分别存放在stock和index子目录
+            data_dir (str): 本地CSV数据目录
+            stock_provider (DataProvider): 股票数据源，默认根据use_local_data选择本地CSV或akshare
+            index_provider (DataProvider): 指数数据源，默认根据use_local_data选择本地CSV或akshare
+            max_workers (int): 并发下载线程数
+            requests_per_second (float): 每秒最多请求数，None表示不限速
+            compact (bool): 是否以紧凑模式生成特征（float32特征、bool标志，见feature_engineering）
+            refresh (bool): 使用本地数据时，是否也对BarStore中已有的代码做增量更新；
+                            默认只导入存储中缺失的代码，已导入的代码不会随本地CSV的更新而刷新或补齐
+        """
         self.use_local_data = use_local_data
         self.stock_datas = None
         self.index_datas = None
+        self.stock_store = None
+        self.index_store = None
+        if use_bar_store:
+            # 股票与指数代码可能重复（如000001），分开存储
+            self.stock_store = BarStore(os.path.join(store_dir, "stock"))
+            self.index_store = BarStore(os.path.join(store_dir, "index"))
+        
+        if stock_provider is None:
+            stock_provider = LocalCsvProvider(data_dir, kind="stock") if use_local_data else AkshareStockProvider()
+        if index_provider is None:
+            index_provider = LocalCsvProvider(data_dir, kind="index") if use_local_data else AkshareIndexProvider()
+        self.stock_provider = stock_provider
+        self.index_provider = index_provider
+        self.max_workers = max_workers
+        self.requests_per_second = requests_per_second
+        self.compact = compact
+        self.refresh = refresh
+        self._feature_cache = {}
+        self._lookahead_checked = set()
+        
+    def _load_with_store(self, store, provider, codes, start_date, end_date):
+        """从BarStore读取数据，存储中缺失的代码先通过数据源并发获取并写入存储
+        
+        不使用本地数据（或refresh=True）时，对已存储的代码只增量获取最后一根K线之后的数据；
+        任一代码没有数据时抛出异常并列出这些代码，返回的列表与codes按位置一一对应
+        """
+        scheduler = FetchScheduler(provider, max_workers=self.max_workers,
+                                   requests_per_second=self.requests_per_second)
+        updater = IncrementalUpdater(store, provider, scheduler=scheduler, default_start_date=start_date)
+        if self.use_local_data and not self.refresh:
+            codes_to_update = [code for code in codes if not store.has(code)]
+        else:
+            codes_to_update = list(codes)
+        if codes_to_update:
+            updater.update(codes_to_update, end_date=end_date)
+        
+        frames = store.read(codes, start=start_date, end=end_date)
+        missing = [code for code in codes if code not in frames]
+        if missing:
+            raise ValueError(f"以下代码没有数据: {missing}（{start_date} - {end_date}）")
+        return [frames[code] for code in codes]
         
-    def load_stock_data(self, stock_codes=["600519", "002230", "000333"]):
+    def load_stock_data(self, stock_codes=["600519", "002230", "000333"], start_date="20080101", end_date="20250630"):
         """加载股票数据"""
-        self.stock_datas = get_stock_data_skshare(stock_codes, use_local_data=self.use_local_data)
+        if self.stock_store is not None:
+            self.stock_datas = self._load_with_store(self.stock_store, self.stock_provider, stock_codes, start_date, end_date)
+        else:
+            self.stock_datas = get_stock_data_skshare(stock_codes, start_date=start_date, end_date=end_date, use_local_data=self.use_local_data)
         return self.stock_datas
         
-    def load_index_data(self, index_codes=["000001", "399001", "000300"]):
+    def load_index_data(self, index_codes=["000001", "399001", "000300"], start_date="20000101", end_date="20250630"):
         """加载指数数据"""
-        self.index_datas = get_indices_data_akshare(index_codes, use_local_data=self.use_local_data)
+        if self.index_store is not None:
+            self.index_datas = self._load_with_store(self.index_store, self.index_provider, index_codes, start_date, end_date)
+        else:
+            self.index_datas = get_indices_data_akshare(index_codes, start_date=start_date, end_date=end_date, use_local_data=self.use_local_data)
         return self.index_datas
         
-    def split_train_test(self, data, train_year_threshold=2021):
-        """将数据分割为训练集和测试集"""
+    @staticmethod
+    def _data_key(data):
+        return hashlib.sha1(pd.util.hash_pandas_object(data, index=True).values.tobytes()).hexdigest()
+
+    def get_features(self, data, key=None):
+        """返回完整序列上的特征，结果按数据内容（或指定的key）缓存，重复切分时不再重新计算指标"""
+        if key is None:
+            key = self._data_key(data)
+        if key not in self._feature_cache:
+            self._feature_cache[key] = feature_engineering(data, compact=self.compact)
+        return self._feature_cache[key]
+        
+    def split_train_test(self, data, train_year_threshold=2021, check_lookahead=True):
+        """将数据分割为训练集和测试集
+        
+        特征在完整序列上只计算一次，再按日期切分：测试期开头的行不会因为指标预热被丢弃，
+        测试期的指标也能使用之前的历史数据。训练集最后一行的目标变量是测试期第一天的收益，
+        因此将其从训练集中剔除，避免标签跨越切分点
+        
+        参数:
+            data: 日线数据
+            train_year_threshold: 训练集的最后一个年份
+            check_lookahead: 是否校验特征（按当前的compact模式）没有使用未来数据，默认开启；
+                             复用已算好的特征，同一份数据只校验一次
+        """
         data.index = pd.to_datetime(data.index)
-        train = data[data.index.year <= train_year_threshold]
-        test = data[data.index.year > train_year_threshold]
+        key = self._data_key(data)
+        features = self.get_features(data, key=key)
+        if check_lookahead and key not in self._lookahead_checked:
+            assert_no_lookahead(data, compact=self.compact, expected=features)
+            self._lookahead_checked.add(key)
+        train = features[features.index.year <= train_year_threshold]
+        test = features[features.index.year > train_year_threshold]
         
-        # 应用特征工程
-        train = feature_engineering(train)
-        test = feature_engineering(test)
+        # 剔除目标变量落在测试期内的训练行
+        if len(train) and len(test):
+            train = train.iloc[:-1]
         
-        return train, test
\ No newline at end of file
+        return train, test
@@ -0,0 +1,203 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+
+class DataProvider:
+    """
+    行情数据源接口
+
+    子类实现fetch方法，返回单只代码在日期范围内的日线数据（以日期为索引的DataFrame），
+    获取失败时直接抛出异常，由FetchScheduler负责重试和记录错误
+    """
+
+    def fetch(self, code, start_date, end_date):
+        """
+        参数:
+            code (str): 股票或指数代码
+            start_date (str): 开始日期，格式为 "YYYYMMDD"
+            end_date (str): 结束日期，格式为 "YYYYMMDD"
+        """
+        raise NotImplementedError
+
+
+class LocalCsvProvider(DataProvider):
+    """
+    从本地CSV文件读取数据的离线数据源，可在测试和基准测试中替代akshare/tushare
+
+    文件命名与get_stock_data_skshare保存的格式一致: {code}_{kind}_{start}_{end}.csv
+    """
+
+    def __init__(self, data_dir="../data", kind="stock", index_col="date", latency=0.0):
+        """
+        参数:
+            data_dir (str): CSV文件目录
+            kind (str): 数据类型，"stock" 或 "index"
+            index_col (str): 日期列名称
+            latency (float): 每次请求模拟的网络延迟（秒），用于基准测试
+        """
+        self.data_dir = data_dir
+        self.kind = kind
+        self.index_col = index_col
+        self.latency = latency
+
+    def find_file(self, code, start_date=None, end_date=None):
+        """查找代码对应的CSV文件，优先选择覆盖请求日期范围的文件，其次选择跨度最长的文件"""
+        prefix = f"{code}_{self.kind}_"
+        candidates = []
+        for name in os.listdir(self.data_dir):
+            if not (name.startswith(prefix) and name.endswith(".csv")):
+                continue
+            parts = name[len(prefix):-len(".csv")].split("_")
+            if len(parts) != 2:
+                continue
+            file_start, file_end = parts
+            covers = ((start_date is None or file_start <= start_date) and
+                      (end_date is None or file_end >= end_date))
+            span = int(file_end) - int(file_start)
+            candidates.append((covers, span, name))
+        if not candidates:
+            raise FileNotFoundError(f"未找到{code}的本地数据文件: {self.data_dir}")
+        candidates.sort(reverse=True)
+        return os.path.join(self.data_dir, candidates[0][2])
+
+    def fetch(self, code, start_date, end_date):
+        if self.latency:
+            time.sleep(self.latency)
+        df = pd.read_csv(self.find_file(code, start_date, end_date), index_col=self.index_col)
+        dates = pd.to_datetime(df.index)
+        mask = (dates >= pd.Timestamp(start_date)) & (dates <= pd.Timestamp(end_date))
+        return df[mask]
+
+
+class RateLimiter:
+    """按固定间隔发放请求许可的限速器，线程安全"""
+
+    def __init__(self, requests_per_second=None):
+        """
+        参数:
+            requests_per_second (float): 每秒最多请求数，None或0表示不限速
+        """
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_time = time.monotonic()
+
+    def acquire(self):
+        """阻塞直到获得一次请求许可"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class FetchScheduler:
+    """
+    多代码并发下载调度器
+
+    使用线程池并发调用DataProvider，所有线程共享一个限速器，
+    失败的请求按指数退避重试，每只代码单独记录结果或错误
+    """
+
+    def __init__(self, provider, max_workers=8, requests_per_second=None, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0):
+        """
+        参数:
+            provider (DataProvider): 数据源
+            max_workers (int): 并发线程数
+            requests_per_second (float): 每秒最多请求数，None表示不限速
+            max_retries (int): 失败后的最大重试次数
+            backoff_base (float): 第一次重试前的等待时间（秒），之后每次翻倍
+            backoff_max (float): 单次重试等待时间上限（秒）
+        """
+        self.provider = provider
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        # 加入随机抖动，避免多个线程同时重试
+        return delay * (0.5 + random.random() / 2)
+
+    def _fetch_one(self, code, start_date, end_date):
+        start_time = time.perf_counter()
+        error = None
+        attempts = 0
+        for attempt in range(1, self.max_retries + 2):
+            attempts = attempt
+            self.rate_limiter.acquire()
+            try:
+                data = self.provider.fetch(code, start_date, end_date)
+                return {'code': code, 'data': data, 'error': None, 'attempts': attempts,
+                        'elapsed': time.perf_counter() - start_time}
+            except FileNotFoundError as e:
+                # 本地文件不存在，重试没有意义
+                error = e
+                break
+            except Exception as e:
+                error = e
+                if attempt <= self.max_retries:
+                    time.sleep(self._backoff(attempt))
+        return {'code': code, 'data': None, 'error': repr(error), 'attempts': attempts,
+                'elapsed': time.perf_counter() - start_time}
+
+    def fetch_many(self, requests):
+        """
+        并发获取多个请求
+
+        参数:
+            requests (list): [(代码, 开始日期, 结束日期), ...]
+
+        返回:
+            dict: {代码: {'code', 'data', 'error', 'attempts', 'elapsed'}}，按请求顺序
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._fetch_one, code, start_date, end_date)
+                       for code, start_date, end_date in requests]
+            results = [future.result() for future in futures]
+        return {result['code']: result for result in results}
+
+    def fetch(self, codes, start_date, end_date):
+        """以相同的日期范围并发获取多只代码"""
+        return self.fetch_many([(code, start_date, end_date) for code in codes])
+
+    @staticmethod
+    def report(results):
+        """将fetch结果整理为每只代码一行的汇总表"""
+        rows = []
+        for code, result in results.items():
+            rows.append({
+                'code': code,
+                'ok': result['error'] is None,
+                'rows': len(result['data']) if result['data'] is not None else 0,
+                'attempts': result['attempts'],
+                'elapsed': result['elapsed'],
+                'error': result['error'],
+            })
+        return pd.DataFrame(rows).set_index('code')
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    # 使用本地CSV模拟50ms延迟的网络数据源，对比串行与并发获取
+    codes = ["600519", "002230", "000333", "999999"]
+    provider = LocalCsvProvider("data", kind="stock", latency=0.05)
+
+    start_time = time.perf_counter()
+    serial = FetchScheduler(provider, max_workers=1, max_retries=0).fetch(codes, "20080101", "20250630")
+    print(f"串行获取耗时: {time.perf_counter() - start_time:.3f}s")
+
+    start_time = time.perf_counter()
+    results = FetchScheduler(provider, max_workers=8, requests_per_second=50).fetch(codes, "20080101", "20250630")
+    print(f"并发获取耗时: {time.perf_counter() - start_time:.3f}s")
+    print(FetchScheduler.report(results))
@@ -0,0 +1,102 @@
+import pandas as pd
+from Tool.bar_store import BarStore
+from Tool.data_provider import DataProvider, FetchScheduler
+
+
+class IncrementalUpdater:
+    """
+    BarStore增量更新器
+
+    根据每只代码最后一根已存储K线的日期，只获取之后缺失的数据并追加写入，
+    刷新耗时与新增K线数量相关，而与历史长度无关
+    """
+
+    def __init__(self, store, provider, scheduler=None, default_start_date="20080101"):
+        """
+        参数:
+            store (BarStore): 目标存储
+            provider (DataProvider): 数据源
+            scheduler (FetchScheduler): 并发下载调度器，默认为使用provider的FetchScheduler
+            default_start_date (str): 存储中没有该代码时的起始日期
+        """
+        self.store = store
+        self.provider = provider
+        self.scheduler = scheduler if scheduler is not None else FetchScheduler(provider)
+        self.default_start_date = default_start_date
+
+    def next_start_date(self, code):
+        """返回代码需要获取的起始日期（最后一根K线的下一天）"""
+        last = self.store.last_date(code)
+        if last is None:
+            return self.default_start_date
+        return (last + pd.Timedelta(days=1)).strftime("%Y%m%d")
+
+    def ingest(self, code, df):
+        """将一份已获取的数据（可能包含历史部分）增量写入存储"""
+        return self.store.append(code, df)
+
+    def update(self, codes, end_date=None):
+        """
+        增量更新多只代码，缺失的数据通过调度器并发获取
+
+        参数:
+            codes (list): 代码列表
+            end_date (str): 结束日期，格式为 "YYYYMMDD"，默认为今天
+
+        返回:
+            dict: {代码: 更新统计}，统计内容见BarStore.append，另含fetched（获取到的行数）和error
+        """
+        if end_date is None:
+            end_date = pd.Timestamp.today().strftime("%Y%m%d")
+
+        reports = {}
+        requests = []
+        for code in codes:
+            start_date = self.next_start_date(code)
+            if pd.Timestamp(start_date) > pd.Timestamp(end_date):
+                # 已是最新数据，无需获取
+                reports[code] = self._empty_report(code, None)
+            else:
+                requests.append((code, start_date, end_date))
+
+        for code, result in self.scheduler.fetch_many(requests).items():
+            data = result['data']
+            if result['error'] is not None:
+                print(f"获取{code}数据失败: {result['error']}")
+            if data is None or len(data) == 0:
+                reports[code] = self._empty_report(code, result['error'])
+                continue
+
+            report = self.store.append(code, data)
+            report['fetched'] = len(data)
+            report['error'] = None
+            reports[code] = report
+            print(f"{code} 增量更新: 新增{report['appended']}根K线，最新日期 {report['last_date']}")
+        return {code: reports[code] for code in codes}
+
+    def _empty_report(self, code, error):
+        return {'fetched': 0, 'appended': 0, 'duplicated': 0, 'conflicted': 0, 'stale': 0,
+                'last_date': self.store.last_date(code), 'error': error}
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    import tempfile
+
+    # 用本地CSV模拟数据源：先写入2023年之前的数据，再增量追加剩余部分
+    csv_file = "data/600519_stock_20080101_20250630.csv"
+    full = pd.read_csv(csv_file, index_col="date")
+    full.index = pd.to_datetime(full.index)
+
+    class FrameProvider(DataProvider):
+        def fetch(self, code, start_date, end_date):
+            return full.loc[start_date:end_date]
+
+    store = BarStore(tempfile.mkdtemp())
+    store.write("600519", full.loc[:"2022-12-31"])
+    updater = IncrementalUpdater(store, FrameProvider())
+    print(updater.update(["600519"], end_date="20250630"))
+    # 再次更新时没有新数据，不会重复写入
+    print(updater.update(["600519"], end_date="20250630"))
+    # 重叠数据按日期去重
+    print(updater.ingest("600519", full.loc["2025-01-01":]))
@@ -1,21 +1,228 @@
+import functools
+import sys
+import time
 import numpy as np
 import talib as ta
 import pandas as pd
 
-def feature_engineering(df):
+# 特征列（按输出顺序）
+FEATURE_COLUMNS = [
+    'high_low_ratio', 'open_close_ratio', 'candle_to_wick_ratio',
+    'close_lag1', 'close_lag2', 'close_lag3', 'close_lag5',
+    'Close_lag1_ratio', 'Close_lag2_ratio', 'Close_lag3_ratio', 'Close_lag5_ratio',
+    'sma10', 'sma20', 'sma80', 'sma100',
+    'Close_sma10_ratio', 'Close_sma20_ratio', 'Close_sma80_ratio', 'Close_sma100_ratio',
+    'sma10_sma20_ratio', 'sma20_sma80_ratio', 'sma80_sma100_ratio', 'sma10_sma80_ratio', 'sma20_sma100_ratio',
+    'rsi', 'rsi_overbought', 'rsi_oversold', 'cci',
+    'obv', 'obv_divergence_10_days', 'obv_divergence_20_days',
+    'returns_in_%', 'target',
+]
+
+# 不放入浮点特征块、单独插入的整数列
+_INT_COLUMNS = ['rsi_overbought', 'rsi_oversold', 'obv']
+
+# 紧凑模式下保持float64的特征：目标变量保留原始精度，模型评估不受影响
+_FLOAT64_COLUMNS = ['target']
+
+
+def shift_array(values, periods):
+    """与pandas.Series.shift一致的数组平移，空出的位置填充NaN"""
+    result = np.full(len(values), np.nan)
+    if periods > 0:
+        result[periods:] = values[:-periods]
+    elif periods < 0:
+        result[:periods] = values[-periods:]
+    else:
+        result[:] = values
+    return result
+
+
+def compute_obv(close, volume):
+    """
+    向量化计算OBV（On-Balance Volume）
+
+    收盘价上涨累加成交量，下跌累减成交量，持平不变，第一根K线为0；
+    以带符号成交量的累计和实现，结果与逐行累加完全一致
+    """
+    close = np.asarray(close)
+    volume = np.asarray(volume)
+    signed_volume = np.zeros(len(volume), dtype=volume.dtype)
+    if len(volume) > 1:
+        change = np.diff(close)
+        signed_volume[1:] = np.where(change > 0, volume[1:], np.where(change < 0, -volume[1:], 0))
+    return np.cumsum(signed_volume)
+
+
+def compact_frame(df):
+    """
+    压缩DataFrame的内存占用：浮点列转为float32，整数列无损地缩小到能容纳取值的最小整数类型，
+    字符串列转为类别编码；布尔列和类别列保持不变
+    """
+    columns = {}
+    for name in df.columns:
+        values = df[name]
+        if values.dtype.kind == 'f':
+            values = values.astype(np.float32)
+        elif values.dtype.kind in 'iu':
+            values = pd.to_numeric(values, downcast='integer' if values.dtype.kind == 'i' else 'unsigned')
+        elif values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+            values = values.astype('category')
+        columns[name] = values
+    return pd.DataFrame(columns, index=df.index)
+
+
+def bytes_per_row(df):
+    """DataFrame每行占用的字节数（包括索引和类别列的类别表）"""
+    return df.memory_usage(deep=True).sum() / max(len(df), 1)
+
+
+def feature_engineering(df, compact=False, require_target=True):
     """
     特征工程，添加技术指标和滞后特征
+
+    所有浮点特征先写入一个预分配的二维数组，最后一次性拼接到原始数据上，
+    避免逐列赋值时反复重新分配DataFrame
+
+    参数:
+        df: 日线数据
+        compact: 紧凑模式。特征按float64计算后以float32保存（目标变量除外），RSI超买/超卖标志为bool，
+                 原始列由compact_frame压缩；只有传入TA-Lib的价格序列在调用处转换为float64
+        require_target: 为False时保留目标变量为空的行（最后一个交易日），用于对最新数据打分
+    """
+    # 将数据转换为float64类型以兼容TA-Lib
+    close_float = df['close'].to_numpy(dtype=np.float64)
+    high_float = df['high'].to_numpy(dtype=np.float64)
+    low_float = df['low'].to_numpy(dtype=np.float64)
+    open_float = df['open'].to_numpy(dtype=np.float64)
+
+    separate_columns = _INT_COLUMNS + (_FLOAT64_COLUMNS if compact else [])
+    float_columns = [c for c in FEATURE_COLUMNS if c not in separate_columns]
+    position = {name: i for i, name in enumerate(float_columns)}
+    block = np.empty((len(df), len(float_columns)), dtype=np.float32 if compact else np.float64)
+
+    def put(name, values):
+        # 返回float64的原值，后续特征不会因为float32的存储损失精度
+        block[:, position[name]] = values
+        return values
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        put('high_low_ratio', high_float / low_float)
+        put('open_close_ratio', open_float / close_float)
+        candle = (close_float - open_float) / (high_float - low_float)
+        candle[np.isinf(candle)] = 0
+        put('candle_to_wick_ratio', candle)
+
+        # 添加滞后特征及其比率
+        for lag in (1, 2, 3, 5):
+            lagged = put(f'close_lag{lag}', shift_array(close_float, lag))
+            put(f'Close_lag{lag}_ratio', close_float / lagged)
+
+        # 使用TA-Lib计算移动平均线
+        sma = {}
+        for period in (10, 20, 80, 100):
+            sma[period] = put(f'sma{period}', ta.SMA(close_float, timeperiod=period))
+        for period in (10, 20, 80, 100):
+            put(f'Close_sma{period}_ratio', close_float / sma[period])
+        for short, long in ((10, 20), (20, 80), (80, 100), (10, 80), (20, 100)):
+            put(f'sma{short}_sma{long}_ratio', sma[short] / sma[long])
+
+    # 使用TA-Lib计算RSI和CCI
+    rsi = put('rsi', ta.RSI(close_float, timeperiod=14))
+    put('cci', ta.CCI(high_float, low_float, close_float, timeperiod=20))
+
+    # 向量化计算OBV
+    obv = compute_obv(df['close'].values, df['volume'].values)
+    obv_diff = pd.Series(obv).diff()
+    close_diff = pd.Series(close_float).diff()
+    for window in (10, 20):
+        put(f'obv_divergence_{window}_days',
+            (obv_diff.rolling(window).sum() - close_diff.rolling(window).sum()).values)
+
+    # 日度收益率及目标变量
+    returns = np.round(pd.Series(close_float).pct_change().values * 100, 2)
+    put('returns_in_%', returns)
+    target = shift_array(returns, -1)
+
+    flag_type = bool if compact else int
+    separate_values = {
+        'rsi_overbought': (rsi >= 70).astype(flag_type),
+        'rsi_oversold': (rsi <= 30).astype(flag_type),
+        'obv': obv,
+    }
+    if compact:
+        separate_values['target'] = target
+    else:
+        put('target', target)
+
+    # 移除空值：原始列和特征列中任一为空的行都剔除
+    valid = ~np.isnan(block[:, [position[c] for c in float_columns if c != 'target']]).any(axis=1) & df.notna().all(axis=1).values
+    if require_target:
+        valid &= ~np.isnan(target)
+    if obv.dtype.kind == 'f':
+        valid &= ~np.isnan(obv)
+
+    features = pd.DataFrame(block[valid], index=df.index[valid], columns=float_columns)
+    for name in separate_columns:
+        features.insert(FEATURE_COLUMNS.index(name), name, separate_values[name][valid])
+    raw = df[valid]
+    if compact:
+        raw = compact_frame(raw)
+    return pd.concat([raw, features], axis=1)
+
+
+def assert_no_lookahead(df, func=feature_engineering, n_checks=5, seed=0, compact=False, expected=None):
+    """
+    校验特征没有使用未来数据
+
+    随机选取若干日期，将该日期之后的行情替换为随机扰动后的数据重新计算特征，
+    该日期的特征（目标变量除外）必须与原结果完全相同，否则抛出ValueError
+
+    参数:
+        compact: 以紧凑模式调用func（func需接受compact参数，如feature_engineering）
+        expected: 已在df上算好的特征，提供时不再重新计算
+    """
+    rng = np.random.default_rng(seed)
+    if compact:
+        func = functools.partial(func, compact=True)
+    if expected is None:
+        expected = func(df)
+    columns = [c for c in expected.columns if c != 'target']
+    candidates = [df.index.get_loc(date) for date in expected.index[:-1]]
+    if not candidates:
+        return
+    positions = rng.choice(candidates, size=min(n_checks, len(candidates)), replace=False)
+
+    for position in positions:
+        perturbed = df.copy()
+        n_future = len(df) - position - 1
+        for column in ['open', 'high', 'low', 'close', 'volume']:
+            values = df[column].values.astype(np.float64)
+            values[position + 1:] *= rng.uniform(0.5, 1.5, n_future)
+            # 保持原来的类型（如整数的成交量），否则紧凑模式下该列的存储类型和精度会随之改变
+            if df[column].dtype.kind in 'iu':
+                values = np.round(values)
+            perturbed[column] = values.astype(df[column].dtype)
+        result = func(perturbed)
+        date = df.index[position]
+        if date not in result.index:
+            raise ValueError(f"特征使用了未来数据: {date} 的行在未来数据变化后被剔除")
+        changed = [c for c in columns
+                   if not np.allclose(np.float64(result.at[date, c]), np.float64(expected.at[date, c]), rtol=1e-12, atol=0, equal_nan=True)]
+        if changed:
+            raise ValueError(f"特征使用了未来数据: {date} 的 {changed} 在未来数据变化后改变")
+
+
+def _reference_feature_engineering(df):
+    """
+    逐列赋值、逐行计算OBV的原始实现，仅用于校验向量化版本的输出一致性
     """
-    # 创建DataFrame的副本以避免SettingWithCopyWarning
     df = df.copy()
-    
-    # 使用.loc设置新列以避免警告
+
     df.loc[:, 'high_low_ratio'] = df['high'] / df['low']
     df.loc[:, 'open_close_ratio'] = df['open'] / df['close']
     df.loc[:, 'candle_to_wick_ratio'] = (df['close'] - df['open']) / (df['high'] - df['low'])
     df.loc[:, 'candle_to_wick_ratio'] = df['candle_to_wick_ratio'].replace([np.inf, -np.inf], 0)
 
-    # 添加滞后特征
     df.loc[:, 'close_lag1'] = df['close'].shift(1)
     df.loc[:, 'close_lag2'] = df['close'].shift(2)
     df.loc[:, 'close_lag3'] = df['close'].shift(3)
@@ -26,13 +233,10 @@ def feature_engineering(df):
     df.loc[:, 'Close_lag3_ratio'] = df['close'] / df['close_lag3']
     df.loc[:, 'Close_lag5_ratio'] = df['close'] / df['close_lag5']
 
-    # 将数据转换为float64类型以兼容TA-Lib
     close_float = df['close'].astype(np.float64).values
     high_float = df['high'].astype(np.float64).values
     low_float = df['low'].astype(np.float64).values
-    volume_float = df['volume'].astype(np.float64).values
-    
-    # 使用正确的TA-Lib函数计算移动平均线
+
     df.loc[:, 'sma10'] = ta.SMA(close_float, timeperiod=10)
     df.loc[:, 'sma20'] = ta.SMA(close_float, timeperiod=20)
     df.loc[:, 'sma80'] = ta.SMA(close_float, timeperiod=80)
@@ -49,15 +253,12 @@ def feature_engineering(df):
     df.loc[:, 'sma10_sma80_ratio'] = df['sma10'] / df['sma80']
     df.loc[:, 'sma20_sma100_ratio'] = df['sma20'] / df['sma100']
 
-    # 使用正确的TA-Lib函数计算RSI
     df.loc[:, 'rsi'] = ta.RSI(close_float, timeperiod=14)
     df.loc[:, 'rsi_overbought'] = (df['rsi'] >= 70).astype(int)
     df.loc[:, 'rsi_oversold'] = (df['rsi'] <= 30).astype(int)
-    
-    # 使用正确的TA-Lib函数计算CCI，确保输入是double类型
+
     df.loc[:, 'cci'] = ta.CCI(high_float, low_float, close_float, timeperiod=20)
-    
-    # 手动计算OBV（On-Balance Volume）
+
     obv = []
     prev_obv = 0
     for i in range(len(df)):
@@ -73,16 +274,76 @@ def feature_engineering(df):
             obv.append(current_obv)
             prev_obv = current_obv
     df.loc[:, 'obv'] = obv
-    
+
     df.loc[:, 'obv_divergence_10_days'] = df['obv'].diff().rolling(10).sum() - df['close'].diff().rolling(10).sum()
     df.loc[:, 'obv_divergence_20_days'] = df['obv'].diff().rolling(20).sum() - df['close'].diff().rolling(20).sum()
 
-    # 日度收益率
     df.loc[:, 'returns_in_%'] = np.round((df['close'].pct_change()) * 100, 2)
-
-    # 目标变量，检验训练结果
     df.loc[:, 'target'] = df['returns_in_%'].shift(-1)
 
-    # 移除空值
     df.dropna(inplace=True)
-    return df
\ No newline at end of file
+    return df
+
+
+def synthetic_bars(n_rows, seed=0):
+    """生成随机游走的合成日线数据，用于基准测试"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_rows)))
+    open_ = close * (1 + rng.normal(0, 0.005, n_rows))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n_rows)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n_rows)))
+    volume = rng.integers(1_000, 1_000_000, n_rows)
+    index = pd.date_range("2000-01-01", periods=n_rows, freq="D")
+    return pd.DataFrame({'open': open_, 'close': close, 'high': high, 'low': low, 'volume': volume}, index=index)
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    # 1. 与原始实现逐列对比，确认输出完全一致
+    csv_files = ["data/000001_index_20000101_20250630.csv", "data/399001_index_20000101_20250630.csv",
+                 "data/000300_index_20000101_20250630.csv", "data/600519_stock_20080101_20250630.csv"]
+    for csv_file in csv_files:
+        data = pd.read_csv(csv_file, index_col="date")
+        start_time = time.perf_counter()
+        expected = _reference_feature_engineering(data)
+        reference_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        result = feature_engineering(data)
+        vectorized_time = time.perf_counter() - start_time
+        pd.testing.assert_frame_equal(result, expected)
+        print(f"{csv_file}: 输出一致, 原始实现 {len(data) / reference_time:,.0f} 行/秒, "
+              f"向量化实现 {len(data) / vectorized_time:,.0f} 行/秒")
+
+    # 2. 两种模式的特征都没有使用未来数据
+    for compact in (False, True):
+        assert_no_lookahead(data, compact=compact)
+    print("特征未使用未来数据（compact=False/True）")
+
+    # 3. 紧凑模式：每行字节数和模型指标对比
+    from sklearn.linear_model import Ridge
+    from sklearn.metrics import mean_squared_error, r2_score
+    from Tool.feature_selector import FeatureSelector
+
+    data = pd.read_csv("data/399001_index_20000101_20250630.csv", index_col="date", parse_dates=True)
+    for compact in (False, True):
+        features = feature_engineering(data, compact=compact)
+        train = features[features.index.year <= 2021].iloc[:-1]
+        test = features[features.index.year > 2021]
+        X_train, y_train, X_test, y_test, _ = FeatureSelector().select_features(train, test, k=20)
+        y_pred = Ridge().fit(X_train, y_train).predict(X_test)
+        hit_rate = np.mean((y_pred > 0) == (y_test.values > 0))
+        print(f"compact={compact}: 每行 {bytes_per_row(features):.0f} 字节, R2 {r2_score(y_test, y_pred):.6f}, "
+              f"RMSE {np.sqrt(mean_squared_error(y_test, y_pred)):.6f}, 方向准确率 {hit_rate:.4f}")
+
+    # 4. 合成面板基准测试：默认1000万行（2500只股票 x 4000天），可通过命令行参数调整总行数
+    total_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    days_per_symbol = 4000
+    n_symbols = max(1, total_rows // days_per_symbol)
+    elapsed = 0.0
+    for symbol in range(n_symbols):
+        bars = synthetic_bars(days_per_symbol, seed=symbol)
+        start_time = time.perf_counter()
+        feature_engineering(bars)
+        elapsed += time.perf_counter() - start_time
+    print(f"合成面板 {n_symbols} x {days_per_symbol} = {n_symbols * days_per_symbol:,} 行: "
+          f"{n_symbols * days_per_symbol / elapsed:,.0f} 行/秒")
@@ -0,0 +1,273 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import talib as ta
+
+from Tool.feature_engineering import FEATURE_COLUMNS, compute_obv, shift_array
+
+# 可直接作为特征输入的原始列
+RAW_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+class FeatureDef:
+    """
+    单个特征的声明：名称、输入（原始列或其他特征）、计算函数和参数
+
+    计算函数按inputs的顺序接收输入数组，参数以关键字形式传入，返回与输入等长的数组
+    """
+
+    def __init__(self, name, inputs, func, **params):
+        self.name = name
+        self.inputs = list(inputs)
+        self.func = func
+        self.params = params
+
+    def signature(self):
+        """特征定义的唯一描述，用于计算特征集哈希"""
+        params = ",".join(f"{k}={v}" for k, v in sorted(self.params.items()))
+        return f"{self.name}<-{','.join(self.inputs)}|{self.func.__module__}.{self.func.__qualname__}|{params}"
+
+
+class FeatureRegistry:
+    """
+    声明式特征注册表
+
+    特征之间的依赖构成DAG，compute时只计算请求的特征及其依赖，
+    共享的中间结果（如SMA、滞后价格）在一次计算中只算一次；
+    计算结果按（代码, 日期范围, 特征集哈希）缓存，重复实验无需重新计算
+    """
+
+    def __init__(self, cache_size=128):
+        """
+        参数:
+            cache_size (int): 内存中最多缓存的结果数量
+        """
+        self.features = {}
+        self.patterns = []
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def register(self, name, inputs, func, **params):
+        """注册一个固定名称的特征"""
+        self.features[name] = FeatureDef(name, inputs, func, **params)
+        return self.features[name]
+
+    def register_pattern(self, pattern, factory):
+        """
+        注册一类参数化特征，如 sma(\\d+)
+
+        参数:
+            pattern (str): 完整匹配特征名称的正则表达式
+            factory (callable): factory(name, match) -> FeatureDef
+        """
+        self.patterns.append((re.compile(pattern), factory))
+
+    def get(self, name):
+        """返回特征定义，参数化特征在第一次请求时按模式生成"""
+        if name in self.features:
+            return self.features[name]
+        for pattern, factory in self.patterns:
+            match = pattern.fullmatch(name)
+            if match:
+                self.features[name] = factory(name, match)
+                return self.features[name]
+        raise KeyError(f"未注册的特征: {name}")
+
+    def resolve(self, names):
+        """按依赖关系对请求的特征及其全部依赖做拓扑排序"""
+        order = []
+        state = {}
+
+        def visit(name):
+            if name in RAW_COLUMNS or state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f"特征存在循环依赖: {name}")
+            state[name] = 'visiting'
+            for dependency in self.get(name).inputs:
+                visit(dependency)
+            state[name] = 'done'
+            order.append(name)
+
+        for name in names:
+            visit(name)
+        return order
+
+    def feature_set_hash(self, names, passthrough=()):
+        """请求的特征集及其全部依赖定义的哈希"""
+        signatures = sorted(self.get(name).signature() for name in self.resolve(names))
+        signatures.append("passthrough:" + ",".join(sorted(passthrough)))
+        signatures.append("requested:" + ",".join(sorted(names)))
+        return hashlib.sha1("\n".join(signatures).encode("utf-8")).hexdigest()
+
+    def _cache_key(self, df, computed, passthrough, symbol):
+        if symbol is None:
+            # 未提供代码时以数据内容作为标识
+            columns = [c for c in RAW_COLUMNS if c in df.columns] + list(passthrough)
+            symbol = hashlib.sha1(pd.util.hash_pandas_object(df[columns], index=True).values.tobytes()).hexdigest()
+        start = df.index[0] if len(df) else None
+        end = df.index[-1] if len(df) else None
+        return (symbol, start, end, len(df), self.feature_set_hash(computed, passthrough))
+
+    def compute(self, df, names, symbol=None, dropna=True):
+        """
+        计算请求的特征
+
+        参数:
+            df (DataFrame): 单只代码的日线数据，需包含open/high/low/close/volume列
+            names (list): 请求的特征名称；df中已有的列（如amount、turn）直接透传
+            symbol (str): 代码，用于缓存键；为None时以数据内容哈希代替
+            dropna (bool): 是否移除请求特征中含空值的行
+
+        返回:
+            DataFrame: 只包含请求特征的DataFrame，列顺序与names一致
+        """
+        passthrough = [name for name in names if name in df.columns]
+        computed = [name for name in names if name not in df.columns]
+        key = self._cache_key(df, computed, passthrough, symbol)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key].copy()
+
+        values = {column: df[column].values for column in RAW_COLUMNS + passthrough if column in df.columns}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for name in self.resolve(computed):
+                feature = self.get(name)
+                values[name] = feature.func(*(values[i] for i in feature.inputs), **feature.params)
+
+        result = pd.DataFrame({name: values[name] for name in names}, index=df.index)
+        if dropna:
+            result = result.dropna()
+
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result.copy()
+
+    def clear_cache(self):
+        """清空缓存"""
+        self._cache.clear()
+
+
+def _as_float(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def _ratio(numerator, denominator):
+    return _as_float(numerator) / _as_float(denominator)
+
+
+def _candle_to_wick(open_, high, low, close):
+    candle = (_as_float(close) - _as_float(open_)) / (_as_float(high) - _as_float(low))
+    candle[np.isinf(candle)] = 0
+    return candle
+
+
+def _lag(close, periods):
+    return shift_array(_as_float(close), periods)
+
+
+def _sma(close, window):
+    return ta.SMA(_as_float(close), timeperiod=window)
+
+
+def _rsi(close, window):
+    return ta.RSI(_as_float(close), timeperiod=window)
+
+
+def _cci(high, low, close, window):
+    return ta.CCI(_as_float(high), _as_float(low), _as_float(close), timeperiod=window)
+
+
+def _above(values, threshold):
+    return (values >= threshold).astype(int)
+
+
+def _below(values, threshold):
+    return (values <= threshold).astype(int)
+
+
+def _obv_divergence(obv, close, window):
+    obv_diff = pd.Series(obv).diff()
+    close_diff = pd.Series(_as_float(close)).diff()
+    return (obv_diff.rolling(window).sum() - close_diff.rolling(window).sum()).values
+
+
+def _returns_in_pct(close):
+    close = _as_float(close)
+    return np.round((close / shift_array(close, 1) - 1) * 100, 2)
+
+
+def _lead(values, periods):
+    return shift_array(values, -periods)
+
+
+def default_registry(cache_size=128):
+    """
+    返回包含feature_engineering全部特征的注册表
+
+    窗口类特征可按名称使用任意窗口，例如 sma50、Close_sma50_ratio、sma5_sma60_ratio、
+    close_lag10、rsi6、cci14、obv_divergence_5_days
+    """
+    registry = FeatureRegistry(cache_size=cache_size)
+    registry.register('high_low_ratio', ['high', 'low'], _ratio)
+    registry.register('open_close_ratio', ['open', 'close'], _ratio)
+    registry.register('candle_to_wick_ratio', ['open', 'high', 'low', 'close'], _candle_to_wick)
+
+    registry.register_pattern(r'close_lag(\d+)', lambda name, m: FeatureDef(
+        name, ['close'], _lag, periods=int(m.group(1))))
+    registry.register_pattern(r'Close_lag(\d+)_ratio', lambda name, m: FeatureDef(
+        name, ['close', f'close_lag{m.group(1)}'], _ratio))
+    registry.register_pattern(r'sma(\d+)', lambda name, m: FeatureDef(
+        name, ['close'], _sma, window=int(m.group(1))))
+    registry.register_pattern(r'Close_sma(\d+)_ratio', lambda name, m: FeatureDef(
+        name, ['close', f'sma{m.group(1)}'], _ratio))
+    registry.register_pattern(r'sma(\d+)_sma(\d+)_ratio', lambda name, m: FeatureDef(
+        name, [f'sma{m.group(1)}', f'sma{m.group(2)}'], _ratio))
+
+    registry.register('rsi', ['close'], _rsi, window=14)
+    registry.register_pattern(r'rsi(\d+)', lambda name, m: FeatureDef(
+        name, ['close'], _rsi, window=int(m.group(1))))
+    registry.register('rsi_overbought', ['rsi'], _above, threshold=70)
+    registry.register('rsi_oversold', ['rsi'], _below, threshold=30)
+
+    registry.register('cci', ['high', 'low', 'close'], _cci, window=20)
+    registry.register_pattern(r'cci(\d+)', lambda name, m: FeatureDef(
+        name, ['high', 'low', 'close'], _cci, window=int(m.group(1))))
+
+    registry.register('obv', ['close', 'volume'], compute_obv)
+    registry.register_pattern(r'obv_divergence_(\d+)_days', lambda name, m: FeatureDef(
+        name, ['obv', 'close'], _obv_divergence, window=int(m.group(1))))
+
+    registry.register('returns_in_%', ['close'], _returns_in_pct)
+    registry.register('target', ['returns_in_%'], _lead, periods=1)
+    return registry
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    from Tool.feature_engineering import feature_engineering
+
+    data = pd.read_csv("data/399001_index_20000101_20250630.csv", index_col="date")
+    registry = default_registry()
+
+    # 全部特征与feature_engineering的结果一致
+    expected = feature_engineering(data)[FEATURE_COLUMNS]
+    result = registry.compute(data, FEATURE_COLUMNS, symbol="399001")
+    pd.testing.assert_frame_equal(result, expected)
+    print("注册表计算结果与feature_engineering一致")
+
+    # 只计算请求的特征，任意窗口可直接按名称使用，原始列直接透传
+    names = ['Close_sma50_ratio', 'sma5_sma60_ratio', 'rsi6', 'turn', 'target']
+    print("计算顺序:", registry.resolve([name for name in names if name not in data.columns]))
+    start_time = time.perf_counter()
+    registry.compute(data, names, symbol="399001")
+    first = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    registry.compute(data, names, symbol="399001")
+    second = time.perf_counter() - start_time
+    print(f"首次计算 {first * 1000:.2f}ms, 命中缓存 {second * 1000:.2f}ms")
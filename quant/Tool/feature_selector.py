@@ -1,10 +1,221 @@
-from sklearn.feature_selection import SelectKBest, f_regression
+import hashlib
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
+from sklearn.feature_selection import SelectKBest, f_regression, mutual_info_regression
+
+
+def _f_test(n, sum_x, sum_xx, sum_xy, sum_y, sum_yy):
+    """
+    由充分统计量计算单变量线性回归的F统计量和p值，与sklearn的f_regression一致
+    （常数列的F为0、p值为1，完全相关列的F为float64最大值、p值为0）
+
+    参数:
+        n: 样本数
+        sum_x, sum_xx, sum_xy: 各列的Σx、Σx²、Σxy
+        sum_y, sum_yy: Σy、Σy²
+    """
+    ss_x = sum_xx - sum_x * sum_x / n
+    ss_y = sum_yy - sum_y * sum_y / n
+    cov = sum_xy - sum_x * sum_y / n
+    dof = n - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.where((ss_x > 0) & (ss_y > 0), cov / np.sqrt(ss_x * ss_y), 0.0)
+        corr = np.clip(corr, -1.0, 1.0)
+        f_score = corr ** 2 / (1 - corr ** 2) * dof
+    f_score[np.isinf(f_score)] = np.finfo(np.float64).max
+    p_value = stats.f.sf(f_score, 1, dof)
+    return f_score, p_value
+
+
+def _top_k(scores, k):
+    """与SelectKBest相同的取前k个的规则（稳定排序，NaN视为最小），返回按列顺序排列的位置"""
+    scores = np.where(np.isnan(scores), np.finfo(np.float64).min, scores)
+    mask = np.zeros(len(scores), dtype=bool)
+    if k > 0:
+        mask[np.argsort(scores, kind='mergesort')[-k:]] = True
+    return np.flatnonzero(mask)
+
+
+class RegressionStats:
+    """
+    训练矩阵的单变量回归充分统计量
+
+    保存各列Σx、Σx²、Σxy以及Σy、Σy²沿行方向的累计和，任意连续行区间的统计量由两行累计和相减得到，
+    因此同一矩阵上的任意k、p值阈值，以及滚动前推的各折训练窗口，都不需要重新扫描数据。
+    累计前先减去各列的均值，避免Σx²与(Σx)²/n相减时损失精度
+    """
+
+    def __init__(self, X, y):
+        """
+        参数:
+            X: 特征矩阵（DataFrame或二维数组）
+            y: 目标变量
+        """
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        X = X - X.mean(axis=0)
+        y = y - y.mean()
+        n_features = X.shape[1]
+        self.cum_x = np.vstack([np.zeros(n_features), np.cumsum(X, axis=0)])
+        self.cum_xx = np.vstack([np.zeros(n_features), np.cumsum(X * X, axis=0)])
+        self.cum_xy = np.vstack([np.zeros(n_features), np.cumsum(X * y[:, None], axis=0)])
+        self.cum_y = np.concatenate([[0.0], np.cumsum(y)])
+        self.cum_yy = np.concatenate([[0.0], np.cumsum(y * y)])
+
+    def __len__(self):
+        return len(self.cum_y) - 1
+
+    def f_test(self, start=0, end=None):
+        """
+        行区间[start, end)上的F统计量和p值
+
+        返回:
+            tuple: (F统计量数组, p值数组)
+        """
+        end = len(self) if end is None else end
+        return _f_test(end - start,
+                       self.cum_x[end] - self.cum_x[start],
+                       self.cum_xx[end] - self.cum_xx[start],
+                       self.cum_xy[end] - self.cum_xy[start],
+                       self.cum_y[end] - self.cum_y[start],
+                       self.cum_yy[end] - self.cum_yy[start])
+
 
 class FeatureSelector:
-    def __init__(self):
-        """初始化特征选择器"""
-        self.k_best = None
-        
+    """
+    特征选择器
+
+    支持三种方法：
+        f_regression: 按单变量F统计量取前k个，再保留p值小于阈值的特征
+        mutual_info: 按互信息取前k个，再保留互信息大于0的特征（互信息没有p值），多列并行估计
+        corr_cluster: 先按特征间的|相关系数|做层次聚类，每个簇只保留F统计量最高的一个特征，
+                      再按F统计量取前k个并按p值过滤，避免选入大量高度相关的均线、滞后特征
+
+    同一训练矩阵的统计量（RegressionStats、互信息、相关矩阵）按数据内容缓存，
+    以不同的k或p值阈值重复选择时不再重新计算。
+    缓存最多保留cache_size个训练矩阵（最近最少使用的先被淘汰），可用clear_cache清空
+    """
+
+    METHODS = ('f_regression', 'mutual_info', 'corr_cluster')
+
+    def __init__(self, method='f_regression', corr_threshold=0.9, n_jobs=-1, random_state=42, cache_size=8):
+        """初始化特征选择器
+
+        参数:
+            method: 选择方法，见METHODS
+            corr_threshold: corr_cluster方法中同一簇特征之间的最低|相关系数|
+            n_jobs: 互信息估计的并行数，-1表示使用全部CPU
+            random_state: 互信息估计的随机种子
+            cache_size: 缓存统计量的训练矩阵个数上限
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"未知的特征选择方法: {method}，可选 {self.METHODS}")
+        self.method = method
+        self.corr_threshold = corr_threshold
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.features = None
+        self.scores_ = None
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def clear_cache(self):
+        """清空缓存的统计量"""
+        self._cache.clear()
+
+    def _cached(self, X, y):
+        """返回训练矩阵的统计量缓存项（各项统计量在首次使用时才计算），不存在时创建"""
+        digest = hashlib.sha1(",".join(map(str, X.columns)).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(X, index=True).values.tobytes())
+        digest.update(pd.util.hash_pandas_object(y, index=True).values.tobytes())
+        key = digest.hexdigest()
+        if key in self._cache:
+            self._cache.move_to_end(key)
+        else:
+            self._cache[key] = {}
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return self._cache[key]
+
+    @staticmethod
+    def _stats(X, y, entry):
+        if 'stats' not in entry:
+            entry['stats'] = RegressionStats(X, y)
+        return entry['stats']
+
+    def _mutual_info(self, X, y, entry):
+        if 'mutual_info' not in entry:
+            entry['mutual_info'] = mutual_info_regression(X.to_numpy(dtype=np.float64), y.to_numpy(dtype=np.float64),
+                                                          random_state=self.random_state, n_jobs=self.n_jobs)
+        return entry['mutual_info']
+
+    def _clusters(self, X, entry):
+        """按|相关系数|对特征做平均连接层次聚类，返回每列的簇编号"""
+        if 'clusters' not in entry:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                corr = np.nan_to_num(np.corrcoef(X.to_numpy(dtype=np.float64), rowvar=False))
+            distance = np.clip(1 - np.abs(corr), 0, None)
+            np.fill_diagonal(distance, 0)
+            tree = linkage(squareform(distance, checks=False), method='average')
+            entry['clusters'] = fcluster(tree, t=1 - self.corr_threshold, criterion='distance')
+        return entry['clusters']
+
+    def scores(self, X, y):
+        """
+        各特征的打分表
+
+        返回:
+            DataFrame: 以特征名为索引，包含f_score、p_value，mutual_info方法另有mutual_info列，
+                       corr_cluster方法另有cluster列
+        """
+        entry = self._cached(X, y)
+        if 'table' not in entry:
+            f_score, p_value = self._stats(X, y, entry).f_test()
+            table = pd.DataFrame({'f_score': f_score, 'p_value': p_value}, index=X.columns)
+            if self.method == 'mutual_info':
+                table['mutual_info'] = self._mutual_info(X, y, entry)
+            elif self.method == 'corr_cluster':
+                table['cluster'] = self._clusters(X, entry)
+            entry['table'] = table
+        return entry['table']
+
+    def _select(self, columns, f_score, p_value, k, p_value_threshold, mutual_info=None, clusters=None):
+        """由打分选出特征名（按列顺序）"""
+        k = min(k, len(columns))
+        if self.method == 'mutual_info':
+            chosen = [i for i in _top_k(mutual_info, k) if mutual_info[i] > 0]
+        else:
+            candidates = np.arange(len(columns))
+            if self.method == 'corr_cluster':
+                # 每个簇保留F统计量最高的特征
+                best = {}
+                for i in candidates:
+                    if clusters[i] not in best or f_score[i] > f_score[best[clusters[i]]]:
+                        best[clusters[i]] = i
+                candidates = np.array(sorted(best.values()))
+            top = candidates[_top_k(f_score[candidates], k)]
+            chosen = [i for i in top if p_value[i] < p_value_threshold]
+        return [columns[i] for i in chosen]
+
+    def select(self, X, y, k=43, p_value_threshold=0.05):
+        """
+        在训练矩阵上选择特征
+
+        返回:
+            list: 选中的特征名（按列顺序）
+        """
+        table = self.scores(X, y)
+        self.scores_ = table
+        return self._select(list(X.columns), table['f_score'].values, table['p_value'].values, k, p_value_threshold,
+                            mutual_info=table['mutual_info'].values if 'mutual_info' in table else None,
+                            clusters=table['cluster'].values if 'cluster' in table else None)
+
     def select_features(self, train, test, k=43, p_value_threshold=0.05):
         """选择重要特征"""
         # 分离特征和目标变量
@@ -12,33 +223,143 @@ class FeatureSelector:
         y_train = train.target
         X_test = test.drop('target', axis=1)
         y_test = test.target
-        
-        # 使用f_regression作为分数函数初始化SelectKBest
-        self.k_best = SelectKBest(score_func=f_regression, k=k)
-        
-        # 拟合变换
-        self.k_best.fit(X_train, y_train)
-        
-        # 获取特征名称及索引位置
-        feature_indices = self.k_best.get_support(indices=True)
-        feature_names = X_train.columns[feature_indices]
-        
-        # 获取p值
-        p_values = self.k_best.pvalues_
-        
-        # 创建特征列
-        features = []
-        
-        # 只选择p值小于阈值的特征变量
-        for feature, pvalue in zip(feature_names, p_values):
-            if pvalue < p_value_threshold:
-                features.append(feature)
-        
+
+        # 在前k个特征中只保留p值小于阈值的特征，每个特征使用自身的p值
+        features = self.select(X_train, y_train, k=k, p_value_threshold=p_value_threshold)
+
         print(f"特征变量选取：{len(features)} 个")
         print(features)
-        
+        self.features = features
+
         # 筛选特征
         X_train_kbest = X_train[features]
         X_test_kbest = X_test[features]
-        
-        return X_train_kbest, y_train, X_test_kbest, y_test, features
\ No newline at end of file
+
+        return X_train_kbest, y_train, X_test_kbest, y_test, features
+
+    def select_folds(self, data, folds, k=43, p_value_threshold=0.05):
+        """
+        在多个训练窗口上分别选择特征
+
+        f_regression和corr_cluster方法在完整序列上只计算一次累计统计量，
+        连续行区间的训练窗口直接由累计和相减得到各自的F统计量；
+        互信息和相关矩阵依赖窗口内的全部样本，仍按窗口分别计算，结果按窗口的行区间记录在完整序列的缓存项中
+        （不为每个窗口单独哈希数据或构建RegressionStats）
+
+        参数:
+            data: 含target列的完整特征表
+            folds: [(训练位置数组, 测试位置数组), ...]，如WalkForwardValidator.split的返回值
+            k, p_value_threshold: 同select_features
+
+        返回:
+            list: 每折选中的特征名列表
+        """
+        X = data.drop('target', axis=1)
+        y = data.target
+        columns = list(X.columns)
+        entry = self._cached(X, y)
+        stats_all = self._stats(X, y, entry)
+        windows = entry.setdefault('windows', {})
+        selected = []
+        for train_index, _ in folds:
+            start, end = int(train_index[0]), int(train_index[-1]) + 1
+            if end - start != len(train_index):
+                # 非连续的训练窗口退回逐折计算
+                selected.append(self.select(X.iloc[train_index], y.iloc[train_index], k, p_value_threshold))
+                continue
+            f_score, p_value = stats_all.f_test(start, end)
+            mutual_info = clusters = None
+            if self.method != 'f_regression':
+                window = windows.setdefault((start, end), {})
+                if self.method == 'mutual_info':
+                    mutual_info = self._mutual_info(X.iloc[start:end], y.iloc[start:end], window)
+                else:
+                    clusters = self._clusters(X.iloc[start:end], window)
+            selected.append(self._select(columns, f_score, p_value, k, p_value_threshold,
+                                         mutual_info=mutual_info, clusters=clusters))
+        return selected
+
+    def materialize(self, data, registry, symbol=None, features=None):
+        """通过特征注册表只计算已选中的特征和目标变量
+
+        参数:
+            data: 单只代码的日线数据
+            registry: FeatureRegistry实例
+            symbol: 代码，用于特征缓存
+            features: 需要的特征列表，默认为上一次select_features选中的特征
+        """
+        features = list(features if features is not None else self.features)
+        names = features + ['target'] if 'target' not in features else features
+        return registry.compute(data, names, symbol=symbol)
+
+
+def _legacy_select_features(train, k=43, p_value_threshold=0.05):
+    """
+    原始实现：每次重新拟合SelectKBest，且把选中特征的名称与全部特征的p值按位置配对，
+    仅用于对比修复前后的结果
+    """
+    X_train = train.drop('target', axis=1)
+    k_best = SelectKBest(score_func=f_regression, k=k).fit(X_train, train.target)
+    feature_names = X_train.columns[k_best.get_support(indices=True)]
+    return [feature for feature, pvalue in zip(feature_names, k_best.pvalues_) if pvalue < p_value_threshold]
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    from Tool.feature_engineering import feature_engineering
+    from Model.walk_forward import WalkForwardValidator
+
+    data = pd.read_csv("data/399001_index_20000101_20250630.csv", index_col="date", parse_dates=True)
+    features = feature_engineering(data)
+    train = features[features.index.year <= 2021].iloc[:-1]
+    test = features[features.index.year > 2021]
+    X_train, y_train = train.drop('target', axis=1), train.target
+
+    # 1. F统计量和p值与sklearn一致；修复前的p值与特征名错位
+    selector = FeatureSelector()
+    table = selector.scores(X_train, y_train)
+    expected_f, expected_p = f_regression(X_train, y_train)
+    np.testing.assert_allclose(table['f_score'].values, expected_f, rtol=1e-6)
+    np.testing.assert_allclose(table['p_value'].values, expected_p, rtol=1e-6, atol=1e-300)
+    for k in (10, 20, 40):
+        fixed = selector.select(X_train, y_train, k=k)
+        expected = [name for name in X_train.columns[SelectKBest(f_regression, k=k).fit(X_train, y_train).get_support()]
+                    if table.at[name, 'p_value'] < 0.05]
+        assert fixed == expected, (fixed, expected)
+        print(f"k={k}: 修复后 {fixed}\n      修复前 {_legacy_select_features(train, k=k)}")
+
+    # 2. 缓存统计量后，不同k和p值阈值的重复选择不再扫描数据
+    grid = [(k, p) for k in range(5, 41, 5) for p in (0.01, 0.05, 0.1)]
+    start_time = time.perf_counter()
+    for k, p in grid:
+        _legacy_select_features(train, k=k, p_value_threshold=p)
+    legacy_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    for k, p in grid:
+        selector.select(X_train, y_train, k=k, p_value_threshold=p)
+    cached_time = time.perf_counter() - start_time
+    print(f"{len(grid)} 组(k, p值阈值): SelectKBest逐次拟合 {legacy_time * 1000:.1f}ms, 缓存统计量 {cached_time * 1000:.1f}ms")
+
+    # 3. 互信息和相关聚类
+    for method in ('mutual_info', 'corr_cluster'):
+        start_time = time.perf_counter()
+        chosen = FeatureSelector(method=method).select(X_train, y_train, k=10)
+        print(f"{method}: {chosen} ({time.perf_counter() - start_time:.2f}s)")
+
+    # 4. 多折：累计统计量与逐折拟合的结果一致
+    folds = WalkForwardValidator(n_splits=10, test_size=250, purge=1).split(len(features))
+    start_time = time.perf_counter()
+    per_fold = selector.select_folds(features, folds, k=20)
+    folds_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    for (train_index, _), chosen in zip(folds, per_fold):
+        fold = features.iloc[train_index]
+        assert chosen == FeatureSelector().select(fold.drop('target', axis=1), fold.target, k=20)
+    print(f"{len(folds)} 折: 累计统计量 {folds_time * 1000:.1f}ms, 逐折计算 {(time.perf_counter() - start_time) * 1000:.1f}ms")
+
+    # 5. 相关聚类的多折选择与逐折一致，缓存中只有完整序列一项，不为每折构建RegressionStats
+    clustered = FeatureSelector(method='corr_cluster')
+    for (train_index, _), chosen in zip(folds, clustered.select_folds(features, folds, k=20)):
+        fold = features.iloc[train_index]
+        assert chosen == FeatureSelector(method='corr_cluster').select(fold.drop('target', axis=1), fold.target, k=20)
+    print(f"corr_cluster {len(folds)} 折与逐折一致, 缓存项 {len(clustered._cache)} 个")
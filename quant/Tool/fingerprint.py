@@ -0,0 +1,19 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+def dataset_fingerprint(*arrays):
+    """数据集及特征列的哈希，用于生成可续跑的study名称和结果缓存的键；None（如缺省的目标变量）按占位处理"""
+    digest = hashlib.sha1()
+    for array in arrays:
+        if array is None:
+            digest.update(b"<None>")
+        elif isinstance(array, (pd.DataFrame, pd.Series)):
+            if isinstance(array, pd.DataFrame):
+                digest.update(",".join(map(str, array.columns)).encode("utf-8"))
+            digest.update(pd.util.hash_pandas_object(array, index=True).values.tobytes())
+        else:
+            digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
@@ -2,6 +2,60 @@ import akshare as ak
 import pandas as pd  # 添加pandas导入
 import os  # 添加os模块用于目录操作
 import akshare as ak  # 添加akshare库的导入
+from Tool.data_provider import DataProvider
+
+def fetch_stock_akshare(code, start_date, end_date):
+    """从akshare获取单只股票的日线数据，返回以日期为索引的DataFrame"""
+    # 使用akshare库获取A股每日历史数据
+    stock_zh_a_hist_df = ak.stock_zh_a_hist(
+        symbol=str(code),        # 转换为字符串格式的股票代码
+        period="daily",          # 周期为日线
+        start_date=start_date,   # 开始日期
+        end_date=end_date        # 结束日期
+    )
+    
+    # 重命名列名，使其更符合常规命名规范
+    stock_zh_a_hist_df.columns = ["date", "code", "open", "close", "high", "low", 
+                                 "volume", "amount", "amplitude", "price-limit", 
+                                 "change-amount", "turn"]
+    
+    # 设置日期列为索引，方便后续的时间序列分析
+    return stock_zh_a_hist_df.set_index("date")
+
+def fetch_index_akshare(code, start_date, end_date):
+    """从akshare获取单个指数的日线数据，返回以日期为索引的DataFrame"""
+    # 获取指数数据
+    index_zh_a_hist_df = ak.index_zh_a_hist(
+        symbol=str(code),
+        period="daily",
+        start_date=start_date,
+        end_date=end_date
+    )
+    
+    # 动态检查列数并调整列名列表
+    # 指数数据通常比股票数据少一列（缺少'price-limit'列）
+    if len(index_zh_a_hist_df.columns) == 11:
+        # 适用于11列的指数数据
+        index_zh_a_hist_df.columns = ["date", "code", "open", "close", "high", "low", 
+                                     "volume", "amount", "amplitude", "change-amount", "turn"]
+    else:
+        # 适用于12列的股票数据格式
+        index_zh_a_hist_df.columns = ["date", "code", "open", "close", "high", "low", 
+                                     "volume", "amount", "amplitude", "price-limit", 
+                                     "change-amount", "turn"]
+    
+    # 设置日期列为索引
+    return index_zh_a_hist_df.set_index("date")
+
+class AkshareStockProvider(DataProvider):
+    """akshare股票日线数据源"""
+    def fetch(self, code, start_date, end_date):
+        return fetch_stock_akshare(code, start_date, end_date)
+
+class AkshareIndexProvider(DataProvider):
+    """akshare指数日线数据源"""
+    def fetch(self, code, start_date, end_date):
+        return fetch_index_akshare(code, start_date, end_date)
 
 # 注意：函数名中的'skshare'拼写有误，应为'akshare'
 def get_stock_data_skshare(stockcodes, start_date="20080101", end_date="20250630", save_csv=True, output_dir="../data", use_local_data=False):
@@ -45,21 +99,7 @@ def get_stock_data_skshare(stockcodes, start_date="20080101", end_date="20250630
                 print(f"从本地加载数据失败: {e}")
         
         try:
-            # 使用akshare库获取A股每日历史数据
-            stock_zh_a_hist_df = ak.stock_zh_a_hist(
-                symbol=str(code),        # 转换为字符串格式的股票代码
-                period="daily",          # 周期为日线
-                start_date=start_date,   # 开始日期
-                end_date=end_date        # 结束日期
-            )
-            
-            # 重命名列名，使其更符合常规命名规范
-            stock_zh_a_hist_df.columns = ["date", "code", "open", "close", "high", "low", 
-                                         "volume", "amount", "amplitude", "price-limit", 
-                                         "change-amount", "turn"]
-            
-            # 设置日期列为索引，方便后续的时间序列分析
-            stock_zh_a_hist_df = stock_zh_a_hist_df.set_index("date")
+            stock_zh_a_hist_df = fetch_stock_akshare(code, start_date, end_date)
             
             # 如果需要保存为CSV文件
             if save_csv:
@@ -128,28 +168,7 @@ def get_indices_data_akshare(indices_codes, start_date="20000101", end_date="202
                 print(f"从本地加载数据失败: {e}")
         
         try:
-            # 获取指数数据
-            index_zh_a_hist_df = ak.index_zh_a_hist(
-                symbol=str(code),
-                period="daily",
-                start_date=start_date,
-                end_date=end_date
-            )
-            
-            # 动态检查列数并调整列名列表
-            # 指数数据通常比股票数据少一列（缺少'price-limit'列）
-            if len(index_zh_a_hist_df.columns) == 11:
-                # 适用于11列的指数数据
-                index_zh_a_hist_df.columns = ["date", "code", "open", "close", "high", "low", 
-                                             "volume", "amount", "amplitude", "change-amount", "turn"]
-            else:
-                # 适用于12列的股票数据格式
-                index_zh_a_hist_df.columns = ["date", "code", "open", "close", "high", "low", 
-                                             "volume", "amount", "amplitude", "price-limit", 
-                                             "change-amount", "turn"]
-            
-            # 设置日期列为索引
-            index_zh_a_hist_df = index_zh_a_hist_df.set_index("date")
+            index_zh_a_hist_df = fetch_index_akshare(code, start_date, end_date)
             
             # 如果需要保存为CSV文件
             if save_csv:
@@ -0,0 +1,21 @@
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块
+    resource = None
+
+
+def peak_rss_mb(children=False):
+    """
+    当前进程的峰值常驻内存(MB)，不支持的平台（Windows）返回NaN
+
+    ru_maxrss在Linux下的单位为KB，在macOS下为字节；峰值只增不减，包括此前所有运行的占用
+
+    参数:
+        children: 为True时返回已结束的子进程中最大的峰值常驻内存，没有子进程时为0
+    """
+    if resource is None:
+        return float('nan')
+    peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 2**20 if sys.platform == 'darwin' else peak_rss / 2**10
@@ -0,0 +1,429 @@
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from Tool.feature_engineering import FEATURE_COLUMNS
+
+
+class Panel:
+    """
+    (日期 x 代码) 布局的行情面板
+
+    每个字段（open/high/low/close/volume）是一个形状为 (日期数, 代码数) 的二维数组，
+    某只代码在某日没有K线时对应位置为NaN
+    """
+
+    FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+    def __init__(self, dates, symbols, fields):
+        """
+        参数:
+            dates (DatetimeIndex): 日期轴
+            symbols (list): 代码轴
+            fields (dict): {字段名: 二维数组}
+        """
+        self.dates = dates
+        self.symbols = list(symbols)
+        self.fields = fields
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.symbols)
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.fields.values())
+
+    def __getitem__(self, field):
+        return self.fields[field]
+
+    @classmethod
+    def from_frames(cls, frames, dtype=np.float64):
+        """
+        由 {代码: 以日期为索引的DataFrame} 构建面板，日期轴为所有代码日期的并集
+
+        参数:
+            frames (dict): 单代码日线数据，如BarStore.read的返回值
+            dtype: 面板数组的数据类型
+        """
+        indexes = {code: pd.DatetimeIndex(pd.to_datetime(df.index)) for code, df in frames.items()}
+        dates = indexes[next(iter(indexes))] if len(indexes) == 1 else None
+        for index in indexes.values():
+            dates = index if dates is None else dates.union(index)
+        dates = dates.sort_values()
+
+        symbols = list(frames)
+        fields = {field: np.full((len(dates), len(symbols)), np.nan, dtype=dtype) for field in cls.FIELDS}
+        for j, code in enumerate(symbols):
+            rows = dates.get_indexer(indexes[code])
+            for field in cls.FIELDS:
+                fields[field][rows, j] = frames[code][field].values
+        return cls(dates, symbols, fields)
+
+    @classmethod
+    def from_store(cls, store, codes, start=None, end=None, dtype=np.float64):
+        """从BarStore只读取OHLCV列构建面板"""
+        return cls.from_frames(store.read(codes, start=start, end=end, columns=cls.FIELDS), dtype=dtype)
+
+    def save(self, directory):
+        """
+        将面板保存为目录下的.npy文件（dates.npy、symbols.npy、每个字段一个文件）
+
+        字段数组按列优先（Fortran）顺序存储，同一只代码的K线在文件中连续，
+        内存映射读取单只代码时只会读入该代码所在的页
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "dates.npy"), self.dates.values.astype('datetime64[ns]'))
+        np.save(os.path.join(directory, "symbols.npy"), np.array(self.symbols, dtype=str))
+        for field, values in self.fields.items():
+            np.save(os.path.join(directory, f"{field}.npy"), np.asfortranarray(values))
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """
+        读取save保存的面板
+
+        参数:
+            directory: save的保存目录
+            mmap_mode: 字段数组的内存映射模式，默认'r'只读映射：数据页在被访问时才从磁盘读入，
+                       多个进程映射同一文件时共用操作系统页缓存中的同一份物理内存；为None时完整读入内存
+        """
+        dates = pd.DatetimeIndex(np.load(os.path.join(directory, "dates.npy")))
+        symbols = np.load(os.path.join(directory, "symbols.npy")).tolist()
+        fields = {field: np.load(os.path.join(directory, f"{field}.npy"), mmap_mode=mmap_mode)
+                  for field in cls.FIELDS}
+        return cls(dates, symbols, fields)
+
+
+def _shift(x, periods):
+    """沿时间轴平移，空出的位置填充NaN"""
+    result = np.full(x.shape, np.nan)
+    if periods > 0:
+        result[periods:] = x[:-periods]
+    elif periods < 0:
+        result[:periods] = x[-periods:]
+    else:
+        result[:] = x
+    return result
+
+
+def _diff(x):
+    result = np.full(x.shape, np.nan)
+    result[1:] = x[1:] - x[:-1]
+    return result
+
+
+def _rolling_sum(x, window):
+    """沿时间轴的滚动求和，窗口内存在NaN时结果为NaN"""
+    valid = ~np.isnan(x)
+    total = np.cumsum(np.where(valid, x, 0.0), axis=0)
+    count = np.cumsum(valid, axis=0)
+    total[window:] -= total[:-window].copy()
+    count[window:] -= count[:-window].copy()
+    total[count < window] = np.nan
+    return total
+
+
+def _rolling_mean(x, window):
+    return _rolling_sum(x, window) / window
+
+
+def _rsi(close, period=14):
+    """
+    Wilder平滑的RSI，与TA-Lib一致：前period个价格变动取简单平均作为种子，之后指数平滑；
+    遇到缺失K线时该代码的状态重新开始预热
+    """
+    n_dates, n_symbols = close.shape
+    result = np.full(close.shape, np.nan)
+    diff = _diff(close)
+    gain = np.clip(diff, 0, None)
+    loss = np.clip(-diff, 0, None)
+
+    count = np.zeros(n_symbols, dtype=np.int64)
+    avg_gain = np.zeros(n_symbols)
+    avg_loss = np.zeros(n_symbols)
+    for t in range(1, n_dates):
+        valid = ~np.isnan(diff[t])
+        count = np.where(valid, count + 1, 0)
+        g = np.where(valid, gain[t], 0.0)
+        l = np.where(valid, loss[t], 0.0)
+        warming = count <= period
+        avg_gain = np.where(count == 0, 0.0, np.where(warming, avg_gain + g, (avg_gain * (period - 1) + g) / period))
+        avg_loss = np.where(count == 0, 0.0, np.where(warming, avg_loss + l, (avg_loss * (period - 1) + l) / period))
+        seed = count == period
+        avg_gain = np.where(seed, avg_gain / period, avg_gain)
+        avg_loss = np.where(seed, avg_loss / period, avg_loss)
+
+        ready = count >= period
+        total = avg_gain + avg_loss
+        with np.errstate(divide='ignore', invalid='ignore'):
+            value = np.where(total != 0, 100 * avg_gain / total, 0.0)
+        result[t] = np.where(ready, value, np.nan)
+    return result
+
+
+def _cci(high, low, close, period=20):
+    """CCI = (典型价格 - 均值) / (0.015 * 平均绝对偏差)，平均绝对偏差为0时取0，与TA-Lib一致"""
+    typical = (high + low + close) / 3
+    mean = _rolling_mean(typical, period)
+    deviation = np.zeros(typical.shape)
+    for k in range(period):
+        deviation += np.abs(_shift(typical, k) - mean)
+    deviation /= period
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(deviation != 0, (typical - mean) / (0.015 * deviation), 0.0)
+    result[np.isnan(mean)] = np.nan
+    return result
+
+
+def _obv(close, volume):
+    """带符号成交量沿时间轴的累计和，每只代码第一根K线为0"""
+    change = _diff(close)
+    signed = np.where(change > 0, volume, np.where(change < 0, -volume, 0.0))
+    signed[np.isnan(signed)] = 0.0
+    obv = np.cumsum(signed, axis=0)
+    obv[np.isnan(close)] = np.nan
+    return obv
+
+
+def compute_panel_block(open_, high, low, close, volume):
+    """
+    对一组代码计算feature_engineering的全部特征
+
+    输入为形状 (日期数, 代码数) 的float64数组，返回 {特征名: 同形状数组}
+    """
+    features = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features['high_low_ratio'] = high / low
+        features['open_close_ratio'] = open_ / close
+        candle = (close - open_) / (high - low)
+        candle[np.isinf(candle)] = 0
+        features['candle_to_wick_ratio'] = candle
+
+        for lag in (1, 2, 3, 5):
+            features[f'close_lag{lag}'] = _shift(close, lag)
+        for lag in (1, 2, 3, 5):
+            features[f'Close_lag{lag}_ratio'] = close / features[f'close_lag{lag}']
+
+        for period in (10, 20, 80, 100):
+            features[f'sma{period}'] = _rolling_mean(close, period)
+        for period in (10, 20, 80, 100):
+            features[f'Close_sma{period}_ratio'] = close / features[f'sma{period}']
+        for short, long in ((10, 20), (20, 80), (80, 100), (10, 80), (20, 100)):
+            features[f'sma{short}_sma{long}_ratio'] = features[f'sma{short}'] / features[f'sma{long}']
+
+        rsi = _rsi(close, 14)
+        features['rsi'] = rsi
+        features['rsi_overbought'] = np.where(np.isnan(rsi), np.nan, (rsi >= 70).astype(np.float64))
+        features['rsi_oversold'] = np.where(np.isnan(rsi), np.nan, (rsi <= 30).astype(np.float64))
+        features['cci'] = _cci(high, low, close, 20)
+
+        obv = _obv(close, volume)
+        features['obv'] = obv
+        obv_diff = _diff(obv)
+        close_diff = _diff(close)
+        for window in (10, 20):
+            features[f'obv_divergence_{window}_days'] = _rolling_sum(obv_diff, window) - _rolling_sum(close_diff, window)
+
+        returns = np.round((close / features['close_lag1'] - 1) * 100, 2)
+        features['returns_in_%'] = returns
+        features['target'] = _shift(returns, -1)
+    return features
+
+
+def _pack(values, traded):
+    """
+    将每只代码的交易日移到时间轴顶部并保持顺序，返回 (压缩后的数组, 排列)
+
+    第k行为各代码自己的第k个交易日，交易日较少的代码末尾为NaN；
+    np.put_along_axis(out, order, packed, axis=0) 可将结果放回原来的日期
+    """
+    order = np.argsort(~traded, axis=0, kind='stable')
+    packed = np.take_along_axis(values, order, axis=0)
+    packed[np.arange(len(values))[:, None] >= traded.sum(axis=0)] = np.nan
+    return packed, order
+
+
+def cross_sectional_rank(x):
+    """每个日期截面上的百分位排名（0~1，NaN不参与排名）"""
+    x = np.asarray(x, dtype=np.float64)
+    valid = ~np.isnan(x)
+    order = np.argsort(np.where(valid, x, np.inf), axis=1, kind='stable')
+    ranks = np.empty(x.shape)
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(x.shape[1], dtype=np.float64), x.shape), axis=1)
+    count = valid.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ranks = ranks / (count - 1)
+    ranks[~valid] = np.nan
+    return ranks
+
+
+def cross_sectional_zscore(x):
+    """每个日期截面上的标准分数，截面标准差为0时为NaN"""
+    x = np.asarray(x, dtype=np.float64)
+    valid = ~np.isnan(x)
+    count = valid.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(valid, x, 0.0).sum(axis=1, keepdims=True) / count
+        centered = np.where(valid, x - mean, 0.0)
+        std = np.sqrt((centered ** 2).sum(axis=1, keepdims=True) / count)
+        z = (x - mean) / np.where(std > 0, std, np.nan)
+    return z
+
+
+class PanelFeatureEngine:
+    """
+    全市场面板特征引擎
+
+    时间序列指标按代码分块、沿时间轴向量化计算，截面排名和标准分数按日期分块计算，
+    每块的大小由内存预算决定。面板的日期轴是所有代码日期的并集，有停牌的代码先压缩到自己的交易日
+    （收盘价不为空的日期）上计算，滚动窗口和滞后特征与逐代码的feature_engineering一致，再放回面板日期，
+    停牌日的特征为NaN；指定输出目录时结果写入内存映射的.npy文件，
+    常驻内存只与分块大小有关，而与代码数量无关
+    """
+
+    # 单块计算时同时存在的 (日期数 x 代码数) float64 数组个数的估计值
+    ARRAYS_PER_BLOCK = 48
+
+    def __init__(self, memory_budget_mb=1024, dtype=np.float32):
+        """
+        参数:
+            memory_budget_mb (int): 计算工作区的内存预算（MB）
+            dtype: 输出特征数组的数据类型
+        """
+        self.memory_budget_mb = memory_budget_mb
+        self.dtype = dtype
+
+    def _chunk_size(self, length, arrays):
+        budget = self.memory_budget_mb * 1024 * 1024
+        return max(1, int(budget // (arrays * max(1, length) * 8)))
+
+    def _allocate(self, name, shape, out_dir):
+        if out_dir is None:
+            return np.empty(shape, dtype=self.dtype)
+        return np.lib.format.open_memmap(os.path.join(out_dir, f"{name}.npy"), mode="w+", dtype=self.dtype, shape=shape)
+
+    def compute(self, panel, names=None, out_dir=None):
+        """
+        计算面板特征
+
+        参数:
+            panel (Panel): 行情面板
+            names (list): 需要输出的特征，默认为feature_engineering的全部特征
+            out_dir (str): 输出目录，指定时每个特征写入 {out_dir}/{特征名}.npy
+
+        返回:
+            dict: {特征名: 形状为 (日期数, 代码数) 的数组}
+        """
+        names = list(names) if names is not None else list(FEATURE_COLUMNS)
+        if out_dir is not None:
+            os.makedirs(out_dir, exist_ok=True)
+        n_dates, n_symbols = panel.shape
+        outputs = {name: self._allocate(name, panel.shape, out_dir) for name in names}
+
+        chunk = self._chunk_size(n_dates, self.ARRAYS_PER_BLOCK)
+        for start in range(0, n_symbols, chunk):
+            columns = slice(start, min(start + chunk, n_symbols))
+            inputs = [np.asarray(panel[field][:, columns], dtype=np.float64) for field in Panel.FIELDS]
+            traded = ~np.isnan(inputs[Panel.FIELDS.index('close')])
+            if traded.all():
+                block = compute_panel_block(*inputs)
+                for name in names:
+                    outputs[name][:, columns] = block[name]
+            else:
+                # 在各代码自己的交易日上计算，只保留到交易日最多的代码的长度
+                length = int(traded.sum(axis=0).max())
+                packed = [_pack(values, traded) for values in inputs]
+                order = packed[0][1]
+                block = compute_panel_block(*[values[:length] for values, _ in packed])
+                for name in names:
+                    result = np.full(traded.shape, np.nan)
+                    np.put_along_axis(result, order[:length], block[name], axis=0)
+                    result[~traded] = np.nan
+                    outputs[name][:, columns] = result
+            del block, inputs
+        return outputs
+
+    def cross_sectional(self, features, names, out_dir=None):
+        """
+        计算截面排名和标准分数，输出 {特征名}_cs_rank 与 {特征名}_cs_zscore
+
+        参数:
+            features (dict): compute的返回值
+            names (list): 需要做截面变换的特征
+            out_dir (str): 输出目录
+        """
+        outputs = {}
+        for name in names:
+            values = features[name]
+            n_dates, n_symbols = values.shape
+            rank = self._allocate(f"{name}_cs_rank", values.shape, out_dir)
+            zscore = self._allocate(f"{name}_cs_zscore", values.shape, out_dir)
+            chunk = self._chunk_size(n_symbols, 8)
+            for start in range(0, n_dates, chunk):
+                rows = slice(start, min(start + chunk, n_dates))
+                rank[rows] = cross_sectional_rank(values[rows])
+                zscore[rows] = cross_sectional_zscore(values[rows])
+            outputs[f"{name}_cs_rank"] = rank
+            outputs[f"{name}_cs_zscore"] = zscore
+        return outputs
+
+
+def synthetic_panel(n_dates, n_symbols, seed=0, dtype=np.float32):
+    """生成随机游走的合成面板，用于基准测试"""
+    rng = np.random.default_rng(seed)
+    close = (100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_dates, n_symbols)), axis=0))).astype(dtype)
+    open_ = (close * (1 + rng.normal(0, 0.005, close.shape))).astype(dtype)
+    high = (np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, close.shape)))).astype(dtype)
+    low = (np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, close.shape)))).astype(dtype)
+    volume = rng.integers(1_000, 1_000_000, close.shape).astype(dtype)
+    dates = pd.date_range("2000-01-01", periods=n_dates, freq="B")
+    symbols = [f"{i:06d}" for i in range(n_symbols)]
+    return Panel(dates, symbols, {'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume})
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    import tempfile
+    from Tool.feature_engineering import feature_engineering
+
+    # 1. 与逐代码的feature_engineering结果对比，包括有停牌（日期不连续）的代码
+    csv_files = {"000001": "data/000001_index_20000101_20250630.csv",
+                 "399001": "data/399001_index_20000101_20250630.csv",
+                 "000300": "data/000300_index_20000101_20250630.csv",
+                 "600519": "data/600519_stock_20080101_20250630.csv"}
+    frames = {code: pd.read_csv(path, index_col="date") for code, path in csv_files.items()}
+    gapped = frames["399001"]
+    frames["gapped"] = gapped.drop(gapped.index[np.random.default_rng(0).choice(len(gapped), 300, replace=False)])
+    panel = Panel.from_frames(frames)
+    engine = PanelFeatureEngine(dtype=np.float64)
+    features = engine.compute(panel)
+    for j, code in enumerate(panel.symbols):
+        expected = feature_engineering(frames[code])
+        rows = panel.dates.get_indexer(pd.to_datetime(expected.index))
+        for name in FEATURE_COLUMNS:
+            np.testing.assert_allclose(features[name][rows, j], expected[name].values, rtol=1e-7, atol=1e-6,
+                                       err_msg=f"{code} {name}")
+    print("面板特征与feature_engineering一致")
+    cs = engine.cross_sectional(features, ['Close_sma20_ratio'])
+    print("截面排名示例:", cs['Close_sma20_ratio_cs_rank'][-1])
+
+    # 2. 合成面板：默认5000只代码 x 4000天，可通过命令行参数调整代码数
+    n_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_dates = 4000
+    panel = synthetic_panel(n_dates, n_symbols)
+    engine = PanelFeatureEngine(memory_budget_mb=512)
+    out_dir = tempfile.mkdtemp()
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    features = engine.compute(panel, out_dir=out_dir)
+    engine.cross_sectional(features, ['Close_sma20_ratio', 'rsi'], out_dir=out_dir)
+    elapsed = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{n_symbols} x {n_dates} 面板: 耗时 {elapsed:.1f}s, 输入 {panel.nbytes / 2**20:.0f}MB, "
+          f"计算峰值内存 {peak / 2**20:.0f}MB（预算 {engine.memory_budget_mb}MB）")
@@ -0,0 +1,90 @@
+import datetime
+
+import backtrader as bt
+import numpy as np
+
+# datetime64[D]的整数值加上该偏移即为date.toordinal()，与bt.date2num对日线的取值一致
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def date_numbers(dates):
+    """将DatetimeIndex向量化转换为backtrader内部的日期数值（与bt.date2num一致）"""
+    days = dates.values.astype('datetime64[D]')
+    fraction = (dates.values - days).astype('timedelta64[s]').astype(np.float64) / 86400
+    return days.astype(np.int64) + _EPOCH_ORDINAL + fraction
+
+
+class PanelFeed(bt.feed.DataBase):
+    """
+    从Panel中读取单只代码行情的backtrader数据源
+
+    多个数据源共享同一个Panel的二维数组，每根K线直接从数组中按位置读取，
+    不为每只代码复制一份DataFrame；该代码没有K线（收盘价为NaN）的日期和fromdate/todate之外的日期被跳过。
+    Panel由Panel.load内存映射读取时，K线所在的数据页在读取时才从磁盘载入，
+    多个进程读取同一面板文件时共用页缓存中的同一份物理内存
+    """
+    params = (
+        ('panel', None),
+        ('symbol', None),
+    )
+
+    def start(self):
+        super(PanelFeed, self).start()
+        panel = self.p.panel
+        self._column = panel.symbols.index(self.p.symbol)
+        rows = np.flatnonzero(~np.isnan(panel['close'][:, self._column]))
+        datetimes = date_numbers(panel.dates[rows])
+        keep = np.ones(len(rows), dtype=bool)
+        if self.p.fromdate is not None:
+            keep &= datetimes >= bt.date2num(self.p.fromdate)
+        if self.p.todate is not None:
+            keep &= datetimes <= bt.date2num(self.p.todate)
+        self._rows = rows[keep]
+        self._datetimes = datetimes[keep]
+        self._arrays = [panel[field] for field in ('open', 'high', 'low', 'close', 'volume')]
+        self._position = -1
+
+    def _load(self):
+        self._position += 1
+        if self._position >= len(self._rows):
+            return False
+        row = self._rows[self._position]
+        column = self._column
+        open_, high, low, close, volume = self._arrays
+        self.lines.datetime[0] = self._datetimes[self._position]
+        self.lines.open[0] = open_[row, column]
+        self.lines.high[0] = high[row, column]
+        self.lines.low[0] = low[row, column]
+        self.lines.close[0] = close[row, column]
+        self.lines.volume[0] = volume[row, column]
+        return True
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    import tempfile
+    import pandas as pd
+    from Tool.PandasData import PandasData
+    from Tool.panel_features import Panel
+
+    csv_files = {"600519": "data/600519_stock_20080101_20250630.csv",
+                 "002230": "data/002230_stock_20080101_20250630.csv"}
+    frames = {code: pd.read_csv(path, index_col="date", parse_dates=True) for code, path in csv_files.items()}
+    panel = Panel.from_frames(frames)
+    demo_dir = tempfile.mkdtemp()
+    panel.save(demo_dir)
+    mapped = Panel.load(demo_dir)
+
+    # 内存中的面板、内存映射的面板与PandasData读取的K线逐根一致
+    for code, df in frames.items():
+        bars = {}
+        for name, feed in (("panel", PanelFeed(panel=panel, symbol=code)), ("mmap", PanelFeed(panel=mapped, symbol=code)),
+                           ("pandas", PandasData(dataname=df))):
+            cerebro = bt.Cerebro(stdstats=False)
+            cerebro.adddata(feed)
+            cerebro.addstrategy(bt.Strategy)
+            data = cerebro.run()[0].datas[0]
+            bars[name] = np.array([data.lines[i].array for i in range(7)])
+        np.testing.assert_array_equal(bars["panel"], bars["pandas"])
+        np.testing.assert_array_equal(bars["mmap"], bars["pandas"])
+        print(f"{code}: PanelFeed与PandasData的 {bars['panel'].shape[1]} 根K线一致")
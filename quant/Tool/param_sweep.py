@@ -0,0 +1,337 @@
+import contextlib
+import csv
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from Tool.data_provider import LocalCsvProvider
+from Tool.memory import peak_rss_mb
+
+# 结果表中固定的列，参数列插在symbol和params之后
+RESULT_COLUMNS = ['final_value', 'sharpe', 'max_drawdown', 'rnorm100', 'n_trades', 'elapsed',
+                  'peak_rss_mb', 'pss_mb', 'status', 'error']
+
+# 每个工作进程的状态：数据源、已加载的行情或内存映射的面板
+_WORKER = {}
+
+
+def param_grid(grid):
+    """
+    展开参数网格
+
+    参数:
+        grid (dict): {参数名: 候选值列表}
+
+    返回:
+        list: 所有组合的参数dict
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def param_samples(space, n_samples, seed=42):
+    """
+    从参数空间中随机抽样
+
+    参数:
+        space (dict): {参数名: 候选值列表 或 (下限, 上限)}；整数上下限按整数均匀抽样，浮点上下限按连续均匀抽样
+        n_samples (int): 抽样个数
+        seed (int): 随机种子，相同种子得到相同的样本，便于断点续跑
+
+    返回:
+        list: 参数dict列表（已去重）
+    """
+    rng = random.Random(seed)
+    samples, seen = [], set()
+    for _ in range(n_samples):
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                params[name] = rng.randint(low, high) if isinstance(low, int) and isinstance(high, int) else rng.uniform(low, high)
+            else:
+                params[name] = rng.choice(list(values))
+        key = json.dumps(params, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            samples.append(params)
+    return samples
+
+
+def _init_worker(provider, start_date, end_date, panel_dir=None, quiet=True):
+    """
+    工作进程初始化：记录数据源；quiet为True时关闭日志输出，使用不弹窗的绘图后端
+
+    这两项设置作用于整个进程，在调用方进程中运行（n_workers=1）时应传入quiet=False
+    """
+    _WORKER.clear()
+    _WORKER.update(provider=provider, start_date=start_date, end_date=end_date, frames={},
+                   panel_dir=panel_dir, panel=None)
+    if not quiet:
+        return
+    logging.disable(logging.CRITICAL)
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+    except ImportError:
+        pass
+
+
+def _load_frame(symbol):
+    """返回代码的日线数据，每个工作进程对每只代码只读取一次"""
+    frames = _WORKER['frames']
+    if symbol not in frames:
+        df = _WORKER['provider'].fetch(symbol, _WORKER['start_date'], _WORKER['end_date'])
+        df.index = pd.to_datetime(df.index)
+        frames[symbol] = df
+    return frames[symbol]
+
+
+def _data_feed(symbol):
+    """
+    返回代码的backtrader数据源
+
+    指定了面板目录时，每个工作进程只读映射一次面板文件，由PanelFeed按需读取K线，
+    各进程共用页缓存中的同一份数据；否则从数据源读取DataFrame并包装为PandasData
+    """
+    from Tool.PandasData import PandasData
+    from Tool.panel_feed import PanelFeed
+    from Tool.panel_features import Panel
+
+    if _WORKER['panel_dir'] is None:
+        return PandasData(dataname=_load_frame(symbol))
+    if _WORKER['panel'] is None:
+        _WORKER['panel'] = Panel.load(_WORKER['panel_dir'], mmap_mode='r')
+    return PanelFeed(panel=_WORKER['panel'], symbol=symbol,
+                     fromdate=pd.Timestamp(_WORKER['start_date']).to_pydatetime(),
+                     todate=pd.Timestamp(_WORKER['end_date']).to_pydatetime())
+
+
+def _memory_usage():
+    """
+    当前进程的内存占用(MB)：峰值常驻内存，以及按共享进程数分摊共享页后的PSS（仅Linux，其他平台为NaN）
+
+    多个进程映射同一文件时，每个进程的RSS都包含这些共享页，PSS才反映各进程实际分摊的物理内存
+    """
+    peak_rss = peak_rss_mb()
+    pss = float('nan')
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1]) / 2**10
+                    break
+    except OSError:
+        pass
+    return peak_rss, pss
+
+
+def _run_one(strategy, symbol, params, cash, commission):
+    """运行一次回测，返回指标dict；策略中的print输出被丢弃，不添加用于绘图的observer"""
+    import backtrader as bt
+
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(_data_feed(symbol))
+    if 'printlog' in strategy.params._getkeys():
+        params = dict(params, printlog=False)
+    cerebro.addstrategy(strategy, **params)
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=commission)
+    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+    cerebro.addanalyzer(bt.analyzers.Returns, _name='returns')
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        strat = cerebro.run()[0]
+
+    trades = strat.analyzers.trades.get_analysis()
+    return {
+        'final_value': cerebro.broker.getvalue(),
+        'sharpe': strat.analyzers.sharpe.get_analysis()['sharperatio'],
+        'max_drawdown': strat.analyzers.drawdown.get_analysis().max.drawdown,
+        'rnorm100': strat.analyzers.returns.get_analysis()['rnorm100'],
+        'n_trades': trades.get('total', {}).get('closed', 0),
+    }
+
+
+def _run_chunk(strategy, symbol, param_list, cash, commission):
+    """在同一只代码上依次运行一组参数，单次失败只记录错误，不影响同组的其他参数"""
+    rows = []
+    for params in param_list:
+        start_time = time.perf_counter()
+        row = {'symbol': symbol, 'params': json.dumps(params, sort_keys=True), **params}
+        try:
+            row.update(_run_one(strategy, symbol, params, cash, commission))
+            row['status'] = 'ok'
+        except Exception as e:
+            row.update(status='error', error=f"{type(e).__name__}: {e}")
+        row['elapsed'] = time.perf_counter() - start_time
+        row['peak_rss_mb'], row['pss_mb'] = _memory_usage()
+        rows.append(row)
+    return rows
+
+
+class ParamSweep:
+    """
+    策略参数扫描
+
+    在多只代码上对参数网格或随机抽样的参数组合做回测，任务按代码分组提交到进程池，
+    每个工作进程对每只代码只读取一次数据；每完成一组结果就追加写入CSV结果表，
+    中断后重新运行会跳过结果表中已成功的（代码, 参数）组合，出错的组合会重新运行。
+    指定panel_dir（Panel.save的保存目录）时改为从内存映射的面板读取K线，工作进程不再各自缓存DataFrame
+    """
+
+    def __init__(self, strategy, provider=None, start_date="20080101", end_date="20250630",
+                 cash=1000000.0, commission=0.0001, panel_dir=None):
+        """
+        初始化参数扫描
+
+        参数:
+            strategy: backtrader策略类（需可在工作进程中导入）
+            provider: 数据源（DataProvider），默认读取本地股票CSV
+            start_date, end_date: 回测日期范围，格式为 "YYYYMMDD"
+            cash: 初始资金
+            commission: 佣金比例
+            panel_dir: 面板目录，提供时忽略provider，从内存映射的面板读取K线
+        """
+        self.strategy = strategy
+        self.provider = provider if provider is not None else LocalCsvProvider(data_dir="data", kind="stock")
+        self.start_date = start_date
+        self.end_date = end_date
+        self.cash = cash
+        self.commission = commission
+        self.panel_dir = panel_dir
+
+    @staticmethod
+    def completed(results_file):
+        """结果表中已成功完成的（代码, 参数）组合，出错的组合在续跑时重新运行"""
+        if not results_file or not os.path.exists(results_file):
+            return set()
+        done = pd.read_csv(results_file, usecols=['symbol', 'params', 'status'], dtype=str)
+        done = done[done['status'] == 'ok']
+        return set(zip(done['symbol'], done['params']))
+
+    def run(self, symbols, param_list, results_file=None, n_workers=1, chunk_size=8, start_method=None):
+        """
+        运行参数扫描
+
+        参数:
+            symbols (list): 代码列表
+            param_list (list): 参数dict列表，可由param_grid或param_samples生成
+            results_file (str): 结果CSV路径，提供时逐组追加写入并支持断点续跑
+            n_workers (int): 工作进程数，1表示在当前进程中运行
+            chunk_size (int): 每个任务包含的参数组合数
+            start_method (str): 工作进程的启动方式，如"spawn"，默认使用平台的默认方式
+
+        返回:
+            DataFrame: 结果表（包括之前运行已写入的结果）
+        """
+        param_names = sorted({name for params in param_list for name in params})
+        columns = ['symbol', 'params'] + param_names + RESULT_COLUMNS
+        done = self.completed(results_file)
+
+        tasks = []
+        for symbol in symbols:
+            pending = [params for params in param_list
+                       if (str(symbol), json.dumps(params, sort_keys=True)) not in done]
+            for i in range(0, len(pending), chunk_size):
+                tasks.append((self.strategy, symbol, pending[i:i + chunk_size], self.cash, self.commission))
+        n_total = sum(len(task[2]) for task in tasks)
+        print(f"参数扫描: {len(symbols)} 只代码 × {len(param_list)} 组参数, 已完成 {len(done)}, 待运行 {n_total}")
+
+        rows = []
+        writer_file = None
+        if results_file:
+            new_file = not os.path.exists(results_file)
+            if not new_file:
+                # 续跑时沿用已有结果表的列，避免新旧版本的列不一致
+                with open(results_file, newline="", encoding="utf-8") as f:
+                    columns = next(csv.reader(f), columns)
+            writer_file = open(results_file, "a", newline="", encoding="utf-8")
+            writer = csv.DictWriter(writer_file, fieldnames=columns, extrasaction='ignore')
+            if new_file:
+                writer.writeheader()
+
+        def collect(chunk_rows):
+            rows.extend(chunk_rows)
+            if writer_file:
+                writer.writerows(chunk_rows)
+                writer_file.flush()
+            print(f"  进度 {len(rows)}/{n_total}")
+
+        start_time = time.perf_counter()
+        try:
+            initargs = (self.provider, self.start_date, self.end_date, self.panel_dir)
+            if n_workers == 1:
+                # 在当前进程中运行，不改变调用方的日志和绘图后端设置
+                _init_worker(*initargs, quiet=False)
+                for task in tasks:
+                    collect(_run_chunk(*task))
+            else:
+                mp_context = multiprocessing.get_context(start_method) if start_method else None
+                with ProcessPoolExecutor(max_workers=n_workers, mp_context=mp_context,
+                                         initializer=_init_worker, initargs=initargs) as executor:
+                    futures = [executor.submit(_run_chunk, *task) for task in tasks]
+                    for future in as_completed(futures):
+                        collect(future.result())
+        finally:
+            if writer_file:
+                writer_file.close()
+        elapsed = time.perf_counter() - start_time
+        if n_total:
+            print(f"参数扫描完成: {n_total} 次回测, 耗时 {elapsed:.1f}s, 平均 {elapsed / n_total:.2f}s/次")
+
+        if results_file:
+            # 出错后重跑成功的组合在结果表中有新旧两行，保留最后一次的结果
+            results = pd.read_csv(results_file, dtype={'symbol': str, 'params': str})
+            return results.drop_duplicates(['symbol', 'params'], keep='last').reset_index(drop=True)
+        return pd.DataFrame(rows, columns=columns)
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    from Strategy.strategy_ma_cross import SmaCross
+
+    demo_dir = tempfile.mkdtemp()
+    results_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join(demo_dir, "sma_cross_sweep.csv")
+    sweep = ParamSweep(SmaCross, start_date="20150101", end_date="20250630")
+    grid = param_grid({'short': [5, 10, 20], 'long': [30, 60]})
+    results = sweep.run(["600519", "000333", "002230"], grid, results_file=results_file, n_workers=2, chunk_size=3)
+    print(results.sort_values('final_value', ascending=False).head(10)[['symbol', 'short', 'long', 'final_value', 'sharpe', 'max_drawdown', 'n_trades']])
+
+    # 再次运行时所有组合都已在结果表中，不会重复回测
+    sweep.run(["600519", "000333", "002230"], grid, results_file=results_file, n_workers=2)
+
+    # 内存映射面板与PandasData两种读取方式的工作进程内存占用：合成面板默认100只代码 x 4000天，
+    # 每只代码的两组参数可能分到不同的工作进程，PandasData各自缓存一份DataFrame，内存映射的面板页则由两个进程共用
+    import numpy as np
+    from Tool.panel_features import synthetic_panel
+
+    n_symbols = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    panel = synthetic_panel(4000, n_symbols, dtype=np.float64)
+    csv_dir, panel_dir = os.path.join(demo_dir, "csv"), os.path.join(demo_dir, "panel")
+    os.makedirs(csv_dir, exist_ok=True)
+    for j, code in enumerate(panel.symbols):
+        df = pd.DataFrame({field: panel[field][:, j] for field in panel.FIELDS}, index=panel.dates.rename("date"))
+        df.to_csv(os.path.join(csv_dir, f"{code}_stock_20000101_20251231.csv"))
+    panel.save(panel_dir)
+
+    for name, kwargs in (("PandasData", dict(provider=LocalCsvProvider(data_dir=csv_dir, kind="stock"))),
+                         ("内存映射面板", dict(panel_dir=panel_dir))):
+        sweep = ParamSweep(SmaCross, start_date="20000101", end_date="20251231", **kwargs)
+        start_time = time.perf_counter()
+        results = sweep.run(panel.symbols, param_grid({'short': [10, 20], 'long': [30]}), n_workers=2, chunk_size=1,
+                            start_method="spawn")
+        print(f"{name}: 耗时 {time.perf_counter() - start_time:.0f}s, 工作进程峰值RSS {results['peak_rss_mb'].max():.0f}MB, "
+              f"PSS {results['pss_mb'].max():.0f}MB")
@@ -0,0 +1,233 @@
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import joblib
+import pandas as pd
+
+
+def _code_hash(func):
+    """函数（或模块、类）源代码的哈希，实现改变时阶段自动失效；取不到源代码时使用限定名"""
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = f"{getattr(func, '__module__', '')}.{getattr(func, '__qualname__', repr(func))}"
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+def _digest(value):
+    """
+    输出的内容哈希；DataFrame/Series按列名、类型、索引和值计算，与内部的块布局无关
+    （joblib读回的DataFrame块布局可能不同，直接用joblib.hash会使下游无谓失效）
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        columns = list(value.columns) if isinstance(value, pd.DataFrame) else value.name
+        dtypes = [str(dtype) for dtype in value.dtypes] if isinstance(value, pd.DataFrame) else str(value.dtype)
+        return joblib.hash((type(value).__name__, columns, dtypes, pd.util.hash_pandas_object(value, index=True).values))
+    if isinstance(value, (list, tuple)):
+        return joblib.hash((type(value).__name__, [_digest(item) for item in value]))
+    if isinstance(value, dict):
+        return joblib.hash({key: _digest(item) for key, item in value.items()})
+    return joblib.hash(value)
+
+
+class Stage:
+    """流水线中的一个阶段：func(*上游输出, **params)"""
+
+    def __init__(self, name, func, inputs=(), params=None, cache=True, depends=()):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.params = dict(params or {})
+        self.cache = cache
+        self.depends = list(depends)
+
+    def code_hash(self):
+        """阶段函数及其依赖的模块/函数的源代码哈希"""
+        return [_code_hash(self.func)] + [_code_hash(dependency) for dependency in self.depends]
+
+
+class Pipeline:
+    """
+    带产物缓存的有向无环流水线
+
+    每个阶段的键由函数源代码、参数和上游输出的内容哈希共同决定，输出用joblib保存到
+    cache_dir/<阶段名>/<键>.joblib，同时记录输出本身的内容哈希；再次运行时键不变的阶段直接命中缓存，
+    上游重新执行但输出内容不变时下游也不会失效。cache=False的阶段（如读取数据、输出报告）每次都执行，
+    其输出的内容哈希决定下游是否失效。所有输入都已就绪的阶段在线程池中并发执行。
+    源代码哈希覆盖阶段函数本身和add时通过depends声明的模块，阶段调用的其他库改变时不会失效
+    """
+
+    def __init__(self, cache_dir="../data/pipeline_cache", max_workers=4):
+        """
+        参数:
+            cache_dir: 产物缓存目录
+            max_workers: 并发执行阶段的线程数
+        """
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.stages = {}
+
+    def add(self, name, func, inputs=(), cache=True, depends=(), **params):
+        """
+        添加阶段
+
+        参数:
+            name: 阶段名
+            func: 阶段函数，按inputs的顺序接收上游输出，params作为关键字参数
+            inputs: 上游阶段名列表
+            cache: 是否缓存输出
+            depends: 阶段函数调用的模块或函数，其源代码参与缓存键的计算，实现改变时阶段失效
+            **params: 阶段参数，参与缓存键的计算
+        """
+        for upstream in inputs:
+            if upstream not in self.stages:
+                raise ValueError(f"阶段 {name} 的上游 {upstream} 尚未添加")
+        self.stages[name] = Stage(name, func, inputs, params, cache, depends)
+        return self
+
+    def _paths(self, stage, key):
+        directory = os.path.join(self.cache_dir, stage.name)
+        return os.path.join(directory, f"{key}.joblib"), os.path.join(directory, f"{key}.json")
+
+    def _required(self, targets):
+        """目标阶段及其全部上游，按添加顺序（即拓扑顺序）排列"""
+        required = set()
+
+        def visit(name):
+            if name not in required:
+                required.add(name)
+                for upstream in self.stages[name].inputs:
+                    visit(upstream)
+
+        for name in targets:
+            visit(name)
+        return [name for name in self.stages if name in required]
+
+    def run(self, targets=None, force=()):
+        """
+        运行流水线
+
+        参数:
+            targets: 需要输出的阶段名列表，默认为全部阶段
+            force: 忽略缓存、强制重新执行的阶段名
+
+        返回:
+            dict: {阶段名: 输出}，只包含targets中的阶段；命中缓存的上游阶段不会被读入内存
+        """
+        targets = list(targets) if targets is not None else list(self.stages)
+        order = self._required(targets)
+        digests, keys, values, report = {}, {}, {}, {}
+        lock = threading.Lock()
+
+        def value_of(name):
+            with lock:
+                if name in values:
+                    return values[name]
+            value = joblib.load(self._paths(self.stages[name], keys[name])[0])
+            with lock:
+                values[name] = value
+            return value
+
+        def execute(stage):
+            start_time = time.perf_counter()
+            value = stage.func(*[value_of(name) for name in stage.inputs], **stage.params)
+            digest = _digest(value)
+            if stage.cache:
+                artifact, meta = self._paths(stage, keys[stage.name])
+                os.makedirs(os.path.dirname(artifact), exist_ok=True)
+                joblib.dump(value, artifact)
+                with open(meta, "w", encoding="utf-8") as f:
+                    json.dump({'digest': digest}, f)
+            with lock:
+                values[stage.name] = value
+            return digest, time.perf_counter() - start_time
+
+        pending = list(order)
+        running = {}
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # 输入已全部就绪的阶段：先查缓存，未命中则提交执行
+                for name in [name for name in pending if all(upstream in digests for upstream in self.stages[name].inputs)]:
+                    pending.remove(name)
+                    stage = self.stages[name]
+                    if not stage.cache:
+                        # 不缓存的阶段参数可以是不可序列化的对象（如Reporter），不参与键的计算
+                        running[executor.submit(execute, stage)] = name
+                        continue
+                    keys[name] = joblib.hash((name, stage.code_hash(), stage.params,
+                                              [digests[upstream] for upstream in stage.inputs]))
+                    artifact, meta = self._paths(stage, keys[name])
+                    if name not in force and os.path.exists(artifact) and os.path.exists(meta):
+                        with open(meta, encoding="utf-8") as f:
+                            digests[name] = json.load(f)['digest']
+                        report[name] = ('缓存', 0.0)
+                        continue
+                    running[executor.submit(execute, stage)] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    digests[name], elapsed = future.result()
+                    report[name] = ('执行', elapsed)
+
+        for name in order:
+            status, elapsed = report[name]
+            print(f"  {name}: {status}" + (f" {elapsed:.2f}s" if status == '执行' else ""))
+        print(f"流水线完成: 执行 {sum(status == '执行' for status, _ in report.values())} 个阶段, "
+              f"命中缓存 {sum(status == '缓存' for status, _ in report.values())} 个, 耗时 {time.perf_counter() - start_time:.2f}s")
+        self.last_report = report
+        return {name: value_of(name) for name in targets}
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    import shutil
+
+    import pandas as pd
+    from sklearn.linear_model import Ridge
+    from sklearn.metrics import r2_score
+    from Tool.feature_engineering import feature_engineering
+    from Tool.feature_selector import FeatureSelector
+
+    def load(path):
+        return pd.read_csv(path, index_col="date", parse_dates=True)
+
+    def split(data, year):
+        features = feature_engineering(data)
+        return features[features.index.year <= year].iloc[:-1], features[features.index.year > year]
+
+    def select(split_result, k):
+        train, test = split_result
+        return FeatureSelector().select_features(train, test, k=k)
+
+    def fit(selected, alpha):
+        X_train, y_train, X_test, y_test, _ = selected
+        model = Ridge(alpha=alpha).fit(X_train, y_train)
+        return model, r2_score(y_test, model.predict(X_test))
+
+    def build(k, alpha):
+        pipeline = Pipeline(cache_dir="data/pipeline_cache_demo")
+        pipeline.add('load_399001', load, path="data/399001_index_20000101_20250630.csv", cache=False)
+        pipeline.add('load_000300', load, path="data/000300_index_20000101_20250630.csv", cache=False)
+        pipeline.add('split_399001', split, inputs=['load_399001'], year=2021)
+        pipeline.add('split_000300', split, inputs=['load_000300'], year=2021)
+        pipeline.add('select_399001', select, inputs=['split_399001'], k=k)
+        pipeline.add('fit_399001', fit, inputs=['select_399001'], alpha=alpha)
+        return pipeline
+
+    shutil.rmtree("data/pipeline_cache_demo", ignore_errors=True)
+    print("第一次运行:")
+    build(k=43, alpha=1.0).run()
+    print("再次运行（全部命中缓存）:")
+    build(k=43, alpha=1.0).run()
+    print("只修改模型参数（只重新执行fit）:")
+    model, r2 = build(k=43, alpha=10.0).run(targets=['fit_399001'])['fit_399001']
+    print(f"R2 = {r2:.4f}")
+    shutil.rmtree("data/pipeline_cache_demo", ignore_errors=True)
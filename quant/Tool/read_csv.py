@@ -1,75 +1,238 @@
-import pandas as pd
+import csv
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+
+# 各数据源CSV的日期列和需要统一的列名：akshare为date/code/.../volume，tushare为trade_date/ts_code/.../vol
+SCHEMAS = {
+    'akshare': {'date_column': 'date', 'rename': {}},
+    'tushare': {'date_column': 'trade_date', 'rename': {'ts_code': 'code', 'vol': 'volume'}},
+}
+
+# 未指定date_format时依次尝试的日期格式：ISO（YYYY-MM-DD）和tushare原始的YYYYMMDD
+DATE_PARSERS = [pv.ISO8601, "%Y%m%d"]
+
+# 按类别读取的列
+CATEGORY_COLUMNS = ['code', 'ts_code']
 
+# 必须为数值的行情列，按浮点数严格解析，无法解析的值直接报错
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'vol', 'amount']
 
-def read_stock_csv(file_path, date_column='trade_date', date_format=None):
+
+def detect_schema(columns):
     """
-    读取股票CSV数据文件并进行基本预处理
-    
+    根据表头判断CSV的数据源
+
+    参数:
+        columns (list): CSV表头的列名
+
+    返回:
+        str: SCHEMAS中的数据源名称
+    """
+    for name, schema in SCHEMAS.items():
+        if schema['date_column'] in columns:
+            return name
+    raise ValueError(f"无法识别的CSV表头: {columns}")
+
+
+def _read_header(file_path):
+    # utf-8-sig去掉Excel等工具写入的BOM，csv.reader处理带引号的列名
+    with open(file_path, encoding='utf-8-sig', newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def read_stock_csv(file_path, date_column=None, date_format=None, dtype=np.float64):
+    """
+    读取股票CSV数据文件并统一为以date为索引的DataFrame
+
+    使用pyarrow的CSV引擎读取：日期列解析为日期，code/ts_code为类别，行情列（PRICE_COLUMNS）按浮点数严格解析，
+    无法解析的值直接报错而不是退化为object列；其他列按内容推断，数值列转换为浮点数，非数值列保留为字符串。
+    列名统一为akshare的命名：索引为date，ts_code→code，vol→volume。
+    排序、去重（同一日期保留第一行）和删除全部列为空的行合并为一次行选择，
+    文件已按日期有序且没有重复和空行时不复制数据
+
     参数:
         file_path: CSV文件路径
-        date_column: 日期列名称，默认为'trade_date'
-        date_format: 日期格式，默认为None，由pandas自动推断
-        
+        date_column: 日期列名称，默认为None，根据表头识别akshare（date）或tushare（trade_date）格式
+        date_format: 日期格式，如"%Y%m%d"，默认为None，依次尝试ISO格式（YYYY-MM-DD）和YYYYMMDD
+        dtype: 数值列的类型，np.float64或np.float32
+
     返回:
         预处理后的pandas DataFrame
     """
     # 检查文件是否存在
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"文件不存在: {file_path}")
-    
-    # 读取CSV文件，解析日期列
+
+    header = _read_header(file_path)
+    if date_column is None:
+        schema = SCHEMAS[detect_schema(header)]
+    else:
+        schema = {'date_column': date_column, 'rename': SCHEMAS['tushare']['rename']}
+    date_column = schema['date_column']
+    if date_column not in header:
+        raise ValueError(f"{file_path} 中没有日期列 {date_column}")
+
+    float_type = pa.float32() if np.dtype(dtype) == np.float32 else pa.float64()
+    column_types = {}
+    for column in header:
+        if column == date_column:
+            column_types[column] = pa.timestamp('s')
+        elif column in CATEGORY_COLUMNS:
+            column_types[column] = pa.dictionary(pa.int32(), pa.string())
+        elif column in PRICE_COLUMNS:
+            column_types[column] = float_type
+    convert_options = pv.ConvertOptions(
+        column_types=column_types,
+        timestamp_parsers=[date_format] if date_format else DATE_PARSERS,
+        strings_can_be_null=True,
+    )
+    try:
+        table = pv.read_csv(file_path, convert_options=convert_options)
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"{file_path} 不符合数据类型约定: {e}") from e
+
+    # 一次计算需要保留的行：按日期稳定排序，同一日期保留第一行，再去掉日期为空或全部列为空的行
+    # （与原始实现的dropna(how='all')一致，code不为空、数值全为空的行保留；日期为空的行原始实现会保留一行，这里剔除）
+    dates = table.column(date_column).to_numpy().astype('datetime64[ns]')
+    columns = {}
+    for name in table.column_names:
+        if name == date_column:
+            continue
+        column = table.column(name)
+        # 推断为数值（或整列为空）的其他列与行情列一样转换为浮点数
+        if pa.types.is_integer(column.type) or pa.types.is_floating(column.type) or pa.types.is_null(column.type):
+            column = column.cast(float_type)
+        columns[schema['rename'].get(name, name)] = column
+    values = {name: column.to_numpy(zero_copy_only=False) for name, column in columns.items()
+              if not pa.types.is_dictionary(column.type)}
+
+    order = np.argsort(dates, kind='stable')
+    sorted_dates = dates[order]
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = sorted_dates[1:] != sorted_dates[:-1]
+    valid = ~np.isnat(dates)
+    empty = [np.isnan(values[name]) if pa.types.is_floating(column.type) else column.is_null().to_numpy(zero_copy_only=False)
+             for name, column in columns.items()]
+    if empty:
+        valid &= ~np.logical_and.reduce(empty)
+    rows = order[keep & valid[order]]
+    if len(rows) == len(dates) and np.array_equal(rows, np.arange(len(dates))):
+        rows = None
+
+    data = {}
+    for name, column in columns.items():
+        if pa.types.is_dictionary(column.type):
+            chunk = column.combine_chunks()
+            codes = chunk.indices.fill_null(0).to_numpy(zero_copy_only=False)
+            codes = np.where(chunk.is_null().to_numpy(zero_copy_only=False), -1, codes)
+            data[name] = pd.Categorical.from_codes(codes if rows is None else codes[rows],
+                                                   categories=chunk.dictionary.to_pylist())
+        else:
+            data[name] = values[name] if rows is None else values[name][rows]
+    index = pd.DatetimeIndex(dates if rows is None else dates[rows], name='date')
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def _legacy_read_stock_csv(file_path, date_column='trade_date', date_format=None):
+    """
+    原始的读取实现：由pandas推断类型，排序、去重、删除空行各复制一次数据，仅用于基准测试和结果校验
+    """
     df = pd.read_csv(file_path, parse_dates=[date_column], date_format=date_format)
-    
-    # 设置日期列为索引
     df.set_index(date_column, inplace=True)
-    
-    # 重命名列以确保与backtrader兼容
-    column_mapping = {
-        'open': 'open',
-        'high': 'high',
-        'low': 'low',
-        'close': 'close',
-        'vol': 'volume'
-    }
-    
-    # 只重命名存在的列
-    existing_columns = {k: v for k, v in column_mapping.items() if k in df.columns}
-    df.rename(columns=existing_columns, inplace=True)
-    
-    # 排序确保日期顺序正确
+    df.rename(columns={'vol': 'volume'}, inplace=True)
     df = df.sort_index()
-    
-    # 移除重复的行
     df = df[~df.index.duplicated(keep='first')]
-    
-    # 基本数据清洗：删除完全为空的行
     df.dropna(how='all', inplace=True)
-    
     return df
 
 
-def batch_read_stock_csv(file_paths, date_column='trade_date', date_format=None):
+def batch_read_stock_csv(file_paths, date_column=None, date_format=None, dtype=np.float64, max_workers=8):
     """
-    批量读取多个股票CSV文件
-    
+    批量读取多个股票CSV文件，多个文件在线程池中并行读取（pyarrow解析时释放GIL）
+
     参数:
         file_paths: 文件路径列表或字典{股票代码: 文件路径}
-        date_column: 日期列名称
+        date_column: 日期列名称，默认为None，按表头识别
         date_format: 日期格式
-        
+        dtype: 数值列的类型
+        max_workers: 并行读取的线程数
+
     返回:
         字典{股票代码或文件路径: 预处理后的DataFrame}
     """
-    results = {}
-    
     if isinstance(file_paths, dict):
-        for code, path in file_paths.items():
-            results[code] = read_stock_csv(path, date_column, date_format)
-    elif isinstance(file_paths, list):
+        items = list(file_paths.items())
+    else:
+        # 从文件路径提取股票代码作为键
+        items = [(os.path.basename(path).split('_')[0], path) for path in file_paths]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(executor.map(lambda item: read_stock_csv(item[1], date_column, date_format, dtype), items))
+
+    return {code: frame for (code, _), frame in zip(items, frames)}
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    data_dir = "data"
+    file_paths = sorted(os.path.join(data_dir, name) for name in os.listdir(data_dir) if name.endswith(".csv"))
+
+    # 1. 与原始实现的结果一致（数值列、日期索引和行数）
+    for path in file_paths:
+        df = read_stock_csv(path)
+        legacy = _legacy_read_stock_csv(path, date_column=SCHEMAS[detect_schema(_read_header(path))]['date_column'])
+        legacy = legacy.rename(columns={'ts_code': 'code'})
+        assert df.index.equals(pd.DatetimeIndex(legacy.index.astype('datetime64[ns]'), name='date')), path
+        for column in df.columns:
+            if column != 'code':
+                np.testing.assert_allclose(df[column].values, legacy[column].values, err_msg=f"{path} {column}")
+    print(f"{len(file_paths)} 个文件与原始实现结果一致")
+
+    # 带BOM、列名加引号、含字符串列（部分为空）的CSV：字符串列原样保留，与原始实现一致
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bom_stock.csv")
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            f.write('"date","code","open","close","high","low","volume","name","turn"\n'
+                    '2024-01-03,600519,2,2.5,3,1,200,贵州茅台,0.5\n'
+                    '2024-01-02,600519,1,1.5,2,0.5,100,,0.4\n')
+        df = read_stock_csv(path)
+        legacy = _legacy_read_stock_csv(path, date_column='date')
+        assert list(df.columns) == list(legacy.columns), df.columns
+        for frame in (df, legacy):
+            assert frame['name'].isna().tolist() == [True, False] and frame['name'].iloc[1] == '贵州茅台'
+        np.testing.assert_allclose(df[['open', 'close', 'volume', 'turn']].values,
+                                   legacy[['open', 'close', 'volume', 'turn']].values)
+    print("带BOM和字符串列的CSV读取正常")
+
+    # 2. 基准测试：原始实现逐个读取 vs 新实现并行批量读取
+    repeats = 20
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        for path in file_paths:
+            _legacy_read_stock_csv(path, date_column=SCHEMAS[detect_schema(_read_header(path))]['date_column'])
+    legacy_time = (time.perf_counter() - start_time) / repeats
+
+    start_time = time.perf_counter()
+    for _ in range(repeats):
         for path in file_paths:
-            # 从文件路径提取股票代码作为键
-            code = os.path.basename(path).split('_')[0]
-            results[code] = read_stock_csv(path, date_column, date_format)
-    
-    return results
\ No newline at end of file
+            read_stock_csv(path)
+    strict_time = (time.perf_counter() - start_time) / repeats
+
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        frames = batch_read_stock_csv(file_paths)
+    batch_time = (time.perf_counter() - start_time) / repeats
+
+    n_rows = sum(len(df) for df in frames.values())
+    mem64 = sum(df.memory_usage(deep=True).sum() for df in frames.values())
+    mem32 = sum(df.memory_usage(deep=True).sum() for df in batch_read_stock_csv(file_paths, dtype=np.float32).values())
+    print(f"{len(file_paths)} 个文件 {n_rows} 行: 原始实现 {legacy_time * 1000:.1f}ms, "
+          f"新实现逐个读取 {strict_time * 1000:.1f}ms, 并行批量读取 {batch_time * 1000:.1f}ms")
+    print(f"内存占用: float64 {mem64 / 2**20:.2f}MB, float32 {mem32 / 2**20:.2f}MB")
@@ -0,0 +1,229 @@
+import html
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib
+import numpy as np
+from matplotlib.figure import Figure
+
+
+def downsample(values, max_points=5000):
+    """
+    为绘图对序列降采样：分成max_points/2个桶，每个桶保留最小值和最大值所在的位置，
+    折线的形状和极值与原序列一致；长度不超过max_points时原样返回
+
+    参数:
+        values: 一维序列，或多个等长序列组成的列表（取各序列在每个桶中极值位置的并集）
+        max_points: 每个序列最多保留的点数，None表示不降采样
+
+    返回:
+        ndarray: 保留的位置（升序）
+    """
+    series = [np.asarray(v, dtype=np.float64) for v in (values if isinstance(values, (list, tuple)) else [values])]
+    n = len(series[0])
+    if max_points is None or n <= max_points:
+        return np.arange(n)
+    n_buckets = max(1, max_points // (2 * len(series)))
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    positions = [np.array([0, n - 1])]
+    for y in series:
+        filled_min = np.where(np.isnan(y), np.inf, y)
+        filled_max = np.where(np.isnan(y), -np.inf, y)
+        for start, end in zip(edges[:-1], edges[1:]):
+            if end > start:
+                positions.append(np.array([start + filled_min[start:end].argmin(),
+                                           start + filled_max[start:end].argmax()]))
+    return np.unique(np.concatenate(positions))
+
+
+class Reporter:
+    """
+    无界面的报告输出
+
+    每次运行创建一个报告目录，图表在后台线程中使用matplotlib的面向对象API（Figure，不经过pyplot）
+    渲染为PNG，plotly图表保存为HTML，调用方提交后立即返回，不会被show()阻塞；
+    close()等待全部渲染完成，并在报告目录中写入index.html和各图表的渲染耗时。
+    渲染出错的图表记录在errors中，close()时打印，strict=True时抛出异常。
+    只有backtest()（经过pyplot的backtrader绘图）会将整个进程的matplotlib后端切换为Agg
+    """
+
+    def __init__(self, root="reports", run_name=None, max_points=5000, background=True, strict=False):
+        """
+        参数:
+            root: 报告根目录
+            run_name: 本次运行的目录名，默认为当前时间
+            max_points: 折线图每个序列、散点图最多绘制的点数
+            background: 是否在后台线程中渲染，False时提交即渲染（用于对比耗时）
+            strict: close()时若有图表渲染失败则抛出RuntimeError，默认只打印错误
+        """
+        self.strict = strict
+        self.run_dir = os.path.join(root, run_name or time.strftime("%Y%m%d_%H%M%S"))
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.max_points = max_points
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reporter") if background else None
+        self.futures = []
+        self.files = []
+        self.timings = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def path(self, name, suffix):
+        return os.path.join(self.run_dir, f"{name}{suffix}")
+
+    def _run(self, name, render, args, kwargs):
+        start_time = time.perf_counter()
+        try:
+            files = render(*args, **kwargs)
+        except Exception as e:
+            files = []
+            with self._lock:
+                self.errors[name] = f"{type(e).__name__}: {e}"
+        with self._lock:
+            self.files.extend(files)
+            self.timings[name] = time.perf_counter() - start_time
+        return files
+
+    def submit(self, name, render, *args, **kwargs):
+        """
+        提交一个渲染任务，render返回写入的文件路径列表；渲染中的异常被记录到errors，不会中断调用方
+        """
+        if self.executor is None:
+            return self._run(name, render, args, kwargs)
+        future = self.executor.submit(self._run, name, render, args, kwargs)
+        self.futures.append(future)
+        return future
+
+    def figure(self, name, draw, *args, figsize=(10, 6), **kwargs):
+        """提交matplotlib图表：新建Figure后调用draw(fig, *args, **kwargs)，保存为PNG"""
+        def render():
+            fig = Figure(figsize=figsize)
+            draw(fig, *args, **kwargs)
+            fig.tight_layout()
+            path = self.path(name, ".png")
+            fig.savefig(path, dpi=100)
+            return [path]
+        return self.submit(name, render)
+
+    def plotly(self, name, build, *args, **kwargs):
+        """提交plotly图表：build(*args, **kwargs)返回go.Figure，保存为HTML（plotly.js从CDN加载）"""
+        def render():
+            path = self.path(name, ".html")
+            build(*args, **kwargs).write_html(path, include_plotlyjs="cdn")
+            return [path]
+        return self.submit(name, render)
+
+    def backtest(self, name, cerebro, **plot_kwargs):
+        """
+        提交backtrader回测图：cerebro.plot在Agg后端下只生成图表不弹窗，逐张保存为PNG
+
+        backtrader的绘图经过pyplot，同一时间只应有一个线程使用pyplot。
+        为了不弹出窗口，提交时将整个进程的matplotlib后端切换为非交互的Agg，之后调用方的plt.show()也不再显示窗口
+        """
+        matplotlib.use("Agg", force=True)
+
+        def render():
+            import matplotlib.pyplot as plt
+            files = []
+            for i, figs in enumerate(cerebro.plot(iplot=False, **plot_kwargs)):
+                for j, fig in enumerate(figs):
+                    path = self.path(f"{name}_{i}_{j}", ".png")
+                    fig.set_size_inches(16, 9)
+                    fig.savefig(path, dpi=100)
+                    plt.close(fig)
+                    files.append(path)
+            return files
+        return self.submit(name, render)
+
+    def wait(self):
+        """等待已提交的渲染完成"""
+        for future in self.futures:
+            future.result()
+        self.futures = []
+
+    def close(self):
+        """
+        等待全部渲染完成，写入index.html和timings.json，关闭后台线程
+
+        返回:
+            dict: run_dir、files、timings（各图表的渲染耗时）、errors
+        """
+        self.wait()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+        items = []
+        for path in sorted(self.files):
+            name = html.escape(os.path.basename(path))
+            if path.endswith(".png"):
+                items.append(f'<h3>{name}</h3><img src="{name}" style="max-width:100%">')
+            else:
+                items.append(f'<h3><a href="{name}">{name}</a></h3>')
+        for name, error in self.errors.items():
+            items.append(f"<h3>{html.escape(name)}</h3><pre>{html.escape(error)}</pre>")
+        with open(self.path("index", ".html"), "w", encoding="utf-8") as f:
+            f.write(f"<html><head><meta charset='utf-8'><title>{html.escape(self.run_dir)}</title></head>"
+                    f"<body>{''.join(items)}</body></html>")
+        with open(self.path("timings", ".json"), "w", encoding="utf-8") as f:
+            json.dump({'timings': self.timings, 'errors': self.errors}, f, ensure_ascii=False, indent=2)
+
+        summary = {'run_dir': self.run_dir, 'files': sorted(self.files), 'timings': dict(self.timings),
+                   'errors': dict(self.errors)}
+        print(f"报告已写入 {self.run_dir}: {len(self.files)} 个文件, 渲染耗时 {sum(self.timings.values()):.2f}s")
+        for name, error in self.errors.items():
+            print(f"  图表 {name} 渲染失败: {error}")
+        if self.errors and self.strict:
+            raise RuntimeError(f"{len(self.errors)} 个图表渲染失败: {sorted(self.errors)}")
+        return summary
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    import tempfile
+    import pandas as pd
+    from sklearn.linear_model import Ridge
+    from sklearn.metrics import mean_squared_error, r2_score
+    from Model.feature_importance import FeatureImportance
+    from Model.model_evaluator import ModelEvaluator
+    from Tool.feature_engineering import feature_engineering
+    from Tool.feature_selector import FeatureSelector
+    from Tool.visualizer import Visualizer
+
+    # 降采样保留每个桶的极值
+    y = np.random.default_rng(0).normal(size=100_000).cumsum()
+    kept = downsample(y, 2000)
+    assert y[kept].max() == y.max() and y[kept].min() == y.min() and len(kept) <= 2002
+    print(f"降采样: {len(y)} -> {len(kept)} 点")
+
+    data = pd.read_csv("data/399001_index_20000101_20250630.csv", index_col="date", parse_dates=True)
+
+    def pipeline(reporter):
+        """简化的main流程：特征、选择、训练、重要性和评估图表"""
+        start_time = time.perf_counter()
+        features = feature_engineering(data)
+        train = features[features.index.year <= 2021].iloc[:-1]
+        test = features[features.index.year > 2021]
+        X_train, y_train, X_test, y_test, names = FeatureSelector().select_features(train, test, k=43)
+        model = Ridge().fit(X_train, y_train)
+        y_pred = model.predict(X_test)
+        r2, rmse = r2_score(y_test, y_pred), mean_squared_error(y_test, y_pred)
+        if reporter is not None:
+            visualizer = Visualizer(reporter=reporter)
+            visualizer.plot_true_vs_predicted(y_test, y_pred, r2, rmse)
+            visualizer.plot_feature_importance(model, X_test, y_test, names,
+                                               service=FeatureImportance(n_repeats=5, n_jobs=1))
+            ModelEvaluator(reporter=reporter).evaluate_model(y_test, y_pred)
+        critical_path = time.perf_counter() - start_time
+        summary = reporter.close() if reporter is not None else None
+        return critical_path, time.perf_counter() - start_time, summary
+
+    report_root = tempfile.mkdtemp()
+    for name, reporter in (("不输出报告", None),
+                           ("同步渲染", Reporter(root=report_root, run_name="demo_sync", background=False)),
+                           ("后台渲染", Reporter(root=report_root, run_name="demo_background"))):
+        critical_path, total, summary = pipeline(reporter)
+        print(f"{name}: 主流程 {critical_path:.2f}s, 含等待渲染完成 {total:.2f}s")
+    print(summary['timings'])
@@ -0,0 +1,200 @@
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from Tool.feature_engineering import FEATURE_COLUMNS
+
+
+class RollingSum:
+    """固定窗口的滚动求和，先加新值再减去离开窗口的旧值，与TA-Lib SMA的累加顺序一致"""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+
+    def update(self, value):
+        """加入新值，返回当前窗口的和，窗口未满时返回NaN"""
+        self.total += value
+        self.values.append(value)
+        if len(self.values) < self.window:
+            return np.nan
+        result = self.total
+        self.total -= self.values.popleft()
+        return result
+
+
+class WilderRSI:
+    """Wilder平滑的RSI：前period个价格变动取简单平均作为种子，之后指数平滑"""
+
+    def __init__(self, period=14):
+        self.period = period
+        self.prev_close = None
+        self.count = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def update(self, close):
+        if self.prev_close is None:
+            self.prev_close = close
+            return np.nan
+        change = close - self.prev_close
+        self.prev_close = close
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+
+        self.count += 1
+        if self.count <= self.period:
+            self.avg_gain += gain
+            self.avg_loss += loss
+            if self.count < self.period:
+                return np.nan
+            self.avg_gain /= self.period
+            self.avg_loss /= self.period
+        else:
+            self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+
+        total = self.avg_gain + self.avg_loss
+        return 100 * self.avg_gain / total if total != 0 else 0.0
+
+
+class MeanDeviationCCI:
+    """CCI：维护典型价格窗口，按窗口均值计算平均绝对偏差"""
+
+    def __init__(self, period=20):
+        self.period = period
+        self.typical = deque(maxlen=period)
+
+    def update(self, high, low, close):
+        typical = (high + low + close) / 3
+        self.typical.append(typical)
+        if len(self.typical) < self.period:
+            return np.nan
+        mean = sum(self.typical) / self.period
+        deviation = sum(abs(value - mean) for value in self.typical) / self.period
+        return (typical - mean) / (0.015 * deviation) if deviation != 0 else 0.0
+
+
+class StreamingFeatureEngine:
+    """
+    逐根K线增量计算feature_engineering特征的引擎
+
+    每个指标只保存固定大小的状态（滚动和、Wilder平滑均值、CCI窗口、累计OBV），
+    新增一根K线的计算量与历史长度无关。目标变量依赖下一根K线，实时计算时为NaN
+    """
+
+    def __init__(self):
+        """初始化各指标状态"""
+        self.closes = deque(maxlen=6)
+        self.sma = {period: RollingSum(period) for period in (10, 20, 80, 100)}
+        self.rsi = WilderRSI(14)
+        self.cci = MeanDeviationCCI(20)
+        self.obv = None
+        self.obv_diff_sum = {window: RollingSum(window) for window in (10, 20)}
+        self.close_diff_sum = {window: RollingSum(window) for window in (10, 20)}
+
+    def update(self, bar):
+        """
+        输入一根K线，返回与批量计算相同的特征行
+
+        参数:
+            bar: 包含open/high/low/close/volume的dict或Series
+
+        返回:
+            dict: 原始字段加全部特征；预热期内（任一特征为空）返回None
+        """
+        open_ = float(bar['open'])
+        high = float(bar['high'])
+        low = float(bar['low'])
+        close = float(bar['close'])
+        volume = bar['volume']
+
+        prev_close = self.closes[-1] if self.closes else None
+        self.closes.append(close)
+
+        row = dict(bar)
+        row['high_low_ratio'] = high / low
+        row['open_close_ratio'] = open_ / close
+        wick = high - low
+        if wick != 0:
+            row['candle_to_wick_ratio'] = (close - open_) / wick
+        else:
+            row['candle_to_wick_ratio'] = np.nan if close == open_ else 0.0
+
+        for lag in (1, 2, 3, 5):
+            lagged = self.closes[-1 - lag] if len(self.closes) > lag else np.nan
+            row[f'close_lag{lag}'] = lagged
+            row[f'Close_lag{lag}_ratio'] = close / lagged
+
+        for period, rolling in self.sma.items():
+            row[f'sma{period}'] = rolling.update(close) / period
+        for period in (10, 20, 80, 100):
+            row[f'Close_sma{period}_ratio'] = close / row[f'sma{period}']
+        for short, long in ((10, 20), (20, 80), (80, 100), (10, 80), (20, 100)):
+            row[f'sma{short}_sma{long}_ratio'] = row[f'sma{short}'] / row[f'sma{long}']
+
+        rsi = self.rsi.update(close)
+        row['rsi'] = rsi
+        row['rsi_overbought'] = int(rsi >= 70)
+        row['rsi_oversold'] = int(rsi <= 30)
+        row['cci'] = self.cci.update(high, low, close)
+
+        # OBV及其背离
+        if self.obv is None:
+            self.obv = 0
+            obv_change = np.nan
+            close_change = np.nan
+        else:
+            obv_change = volume if close > prev_close else -volume if close < prev_close else 0
+            self.obv = self.obv + obv_change
+            close_change = close - prev_close
+        row['obv'] = self.obv
+        for window in (10, 20):
+            if np.isnan(close_change):
+                # 第一根K线没有变动，不进入滚动窗口
+                row[f'obv_divergence_{window}_days'] = np.nan
+                continue
+            row[f'obv_divergence_{window}_days'] = (self.obv_diff_sum[window].update(float(obv_change)) -
+                                                   self.close_diff_sum[window].update(close_change))
+
+        row['returns_in_%'] = np.round((close / prev_close - 1) * 100, 2) if prev_close is not None else np.nan
+        row['target'] = np.nan
+
+        if any(np.isnan(row[name]) for name in FEATURE_COLUMNS if name != 'target'):
+            return None
+        return row
+
+    def run(self, df):
+        """依次输入DataFrame中的每根K线，返回所有非预热期的特征行（以原索引为索引）"""
+        rows = {}
+        for index, bar in zip(df.index, df.to_dict('records')):
+            row = self.update(bar)
+            if row is not None:
+                rows[index] = row
+        return pd.DataFrame.from_dict(rows, orient='index')
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    from Tool.feature_engineering import feature_engineering
+
+    for csv_file in ["data/399001_index_20000101_20250630.csv", "data/600519_stock_20080101_20250630.csv"]:
+        data = pd.read_csv(csv_file, index_col="date")
+        expected = feature_engineering(data)
+
+        engine = StreamingFeatureEngine()
+        start_time = time.perf_counter()
+        streamed = engine.run(data)
+        elapsed = time.perf_counter() - start_time
+
+        # 批量结果剔除了最后一根K线（目标变量为空），流式结果包含它
+        streamed = streamed.loc[expected.index]
+        for name in FEATURE_COLUMNS:
+            if name == 'target':
+                continue
+            np.testing.assert_allclose(streamed[name].astype(float).values, expected[name].astype(float).values,
+                                       rtol=1e-9, atol=1e-6, err_msg=f"{csv_file} {name}")
+        print(f"{csv_file}: 流式特征与feature_engineering一致, 平均每根K线 {elapsed / len(data) * 1e6:.1f}us")
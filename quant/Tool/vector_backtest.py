@@ -0,0 +1,276 @@
+import math
+import time
+
+import numpy as np
+import pandas as pd
+import talib as ta
+
+# 年化因子，与backtrader分析器对日线数据使用的一致
+DAYS_PER_YEAR = 252
+
+
+def sma_cross_signals(data, short=10, long=30):
+    """
+    SmaCross策略的买卖信号：短期均线上穿长期均线买入，下穿卖出
+
+    与backtrader的CrossOver一致，交叉以上一个非零差值为准，均线相等的K线不视为穿越
+
+    返回:
+        (entries, exits): 两个布尔数组
+    """
+    close = data['close'].values.astype(np.float64)
+    diff = ta.SMA(close, timeperiod=short) - ta.SMA(close, timeperiod=long)
+    # 差值为0时沿用上一个非零差值
+    nonzero = pd.Series(np.where(diff == 0, np.nan, diff)).ffill().values
+    before = np.empty(len(diff))
+    before[0] = np.nan
+    before[1:] = nonzero[:-1]
+    with np.errstate(invalid='ignore'):
+        entries = (before < 0) & (diff > 0)
+        exits = (before > 0) & (diff < 0)
+    return entries, exits
+
+
+def volume_price_signals(data, window=20):
+    """
+    VolumePriceFactor策略的买卖信号：放量（成交量大于均量的两倍）时，
+    收盘价低于均线买入，高于均线卖出
+
+    返回:
+        (entries, exits): 两个布尔数组
+    """
+    close = data['close'].values.astype(np.float64)
+    volume = data['volume'].values.astype(np.float64)
+    ma = ta.SMA(close, timeperiod=window)
+    volume_ma = ta.SMA(volume, timeperiod=window)
+    with np.errstate(invalid='ignore'):
+        heavy = volume > 2 * volume_ma
+        entries = heavy & (close < ma)
+        exits = heavy & (close > ma)
+    return entries, exits
+
+
+def _next_signal(indices, start):
+    """indices中第一个不小于start的K线位置，不存在时返回None"""
+    i = np.searchsorted(indices, start)
+    return indices[i] if i < len(indices) else None
+
+
+class VectorBacktester:
+    """
+    向量化回测引擎，用于基于信号的单标的多头策略
+
+    撮合规则与backtrader默认broker一致：第t根K线产生的市价单在t+1根K线开盘成交；
+    下单时按收盘价、成交时按开盘价检查现金，不足则订单被拒绝，策略在下一根K线重新判断；
+    佣金按成交金额的比例收取（等同于broker.setcommission(commission=...)）。
+    只对有信号的K线逐笔处理，资产曲线和各项指标都由数组运算得到，
+    单次回测的耗时与交易次数而不是K线数量成正比
+    """
+
+    def __init__(self, cash=1000000.0, commission=0.0, stake=None, sharpe_timeframe='years', riskfreerate=0.01):
+        """
+        初始化回测引擎
+
+        参数:
+            cash: 初始资金
+            commission: 佣金比例
+            stake: 每次买入的股数；None表示按 int(总资产 / 收盘价) 满仓买入（VolumePriceFactor的做法），
+                   backtrader默认的FixedSize sizer对应 stake=1（SmaCross的做法）
+            sharpe_timeframe: 夏普比率的收益周期，'years'（SharpeRatio分析器的默认值）或 'days'
+            riskfreerate: 年化无风险利率
+        """
+        if sharpe_timeframe not in ('years', 'days'):
+            raise ValueError(f"不支持的sharpe_timeframe: {sharpe_timeframe}")
+        self.cash = cash
+        self.commission = commission
+        self.stake = stake
+        self.sharpe_timeframe = sharpe_timeframe
+        self.riskfreerate = riskfreerate
+
+    def _simulate(self, open_, close, entries, exits):
+        """按信号逐笔撮合，返回现金/持仓变化的K线位置及变化后的值，以及交易明细"""
+        n = len(close)
+        entry_index = np.flatnonzero(entries)
+        exit_index = np.flatnonzero(exits)
+        cash = self.cash
+        commission = self.commission
+        bars, cash_after, shares_after, trades = [], [], [], []
+
+        t = 0
+        while True:
+            t = _next_signal(entry_index, t)
+            # 最后一根K线上的订单没有机会成交
+            if t is None or t >= n - 1:
+                break
+            size = self.stake if self.stake is not None else int(cash / close[t])
+            # 下单时按收盘价预估，成交时按开盘价结算，现金不足则拒绝
+            if size <= 0 or cash - size * close[t] - size * commission * close[t] < 0:
+                t += 1
+                continue
+            entry_price = open_[t + 1]
+            remaining = cash - size * entry_price
+            remaining -= size * commission * entry_price
+            if remaining < 0:
+                t += 1
+                continue
+            cash = remaining
+            bars.append(t + 1)
+            cash_after.append(cash)
+            shares_after.append(size)
+
+            s = _next_signal(exit_index, t + 1)
+            if s is None or s >= n - 1:
+                trades.append({'entry_bar': t + 1, 'exit_bar': None, 'size': size,
+                               'entry_price': entry_price, 'exit_price': np.nan})
+                break
+            exit_price = open_[s + 1]
+            cash += size * entry_price + size * (exit_price - entry_price)
+            cash -= size * commission * exit_price
+            bars.append(s + 1)
+            cash_after.append(cash)
+            shares_after.append(0)
+            trades.append({'entry_bar': t + 1, 'exit_bar': s + 1, 'size': size,
+                           'entry_price': entry_price, 'exit_price': exit_price})
+            t = s + 1
+
+        return np.array(bars, dtype=np.int64), np.array(cash_after), np.array(shares_after), trades
+
+    def _sharpe(self, dates, value):
+        """与bt.analyzers.SharpeRatio（不年化、总体标准差）一致的夏普比率"""
+        if self.sharpe_timeframe == 'days':
+            previous = np.concatenate([[self.cash], value[:-1]])
+            returns = value / previous - 1.0
+            rate = pow(1.0 + self.riskfreerate, 1.0 / DAYS_PER_YEAR) - 1.0
+        else:
+            years = dates.year.values
+            last_of_year = np.flatnonzero(np.append(years[1:] != years[:-1], True))
+            year_end = value[last_of_year]
+            returns = year_end / np.concatenate([[self.cash], year_end[:-1]]) - 1.0
+            rate = self.riskfreerate
+        excess = returns - rate
+        deviation = excess.std()
+        return excess.mean() / deviation if len(excess) and deviation > 0 else None
+
+    def run(self, data, entries, exits):
+        """
+        运行一次回测
+
+        参数:
+            data: 包含open/close列、以日期为索引的日线数据
+            entries: 布尔数组，空仓时为True的K线发出买入
+            exits: 布尔数组，持仓时为True的K线发出卖出（全部平仓）
+
+        返回:
+            dict: 最终资金、夏普比率、回撤和收益率指标（与backtrader的SharpeRatio、
+                  DrawDown、Returns分析器口径一致），交易次数、交易明细和每日资产
+        """
+        dates = data.index if isinstance(data.index, pd.DatetimeIndex) else pd.DatetimeIndex(pd.to_datetime(data.index))
+        open_ = data['open'].values.astype(np.float64)
+        close = data['close'].values.astype(np.float64)
+        n = len(close)
+
+        bars, cash_after, shares_after, trades = self._simulate(
+            open_, close, np.asarray(entries, dtype=bool), np.asarray(exits, dtype=bool))
+
+        # 每根K线对应的最近一次成交后的现金和持仓
+        event = np.searchsorted(bars, np.arange(n), side='right') - 1
+        has_event = event >= 0
+        cash = np.where(has_event, cash_after[np.maximum(event, 0)] if len(bars) else 0.0, self.cash)
+        shares = np.where(has_event, shares_after[np.maximum(event, 0)] if len(bars) else 0, 0)
+        value = cash + shares * close
+
+        # 回撤
+        peak = np.maximum.accumulate(value)
+        moneydown = peak - value
+        drawdown = 100.0 * moneydown / peak
+        in_drawdown = drawdown != 0
+        # 连续处于回撤的K线数：当前位置减去最近一次不在回撤中的位置
+        last_peak = np.maximum.accumulate(np.where(in_drawdown, -1, np.arange(n)))
+        drawdown_len = np.arange(n) - last_peak
+
+        # 收益率
+        final_value = value[-1]
+        rtot = math.log(final_value / self.cash) if final_value > 0 else float('-inf')
+        ravg = rtot / n
+        rnorm = math.expm1(ravg * DAYS_PER_YEAR) if ravg > float('-inf') else ravg
+
+        for trade in trades:
+            trade['entry_date'] = dates[trade['entry_bar']]
+            trade['exit_date'] = dates[trade['exit_bar']] if trade['exit_bar'] is not None else None
+
+        return {
+            'final_value': final_value,
+            'sharpe': self._sharpe(dates, value),
+            'max_drawdown': drawdown.max(),
+            'max_moneydown': moneydown.max(),
+            'max_drawdown_len': int(drawdown_len.max()),
+            'rtot': rtot,
+            'ravg': ravg,
+            'rnorm': rnorm,
+            'rnorm100': rnorm * 100.0,
+            'n_trades': len(trades),
+            'trades': trades,
+            'value': pd.Series(value, index=dates),
+        }
+
+
+def run_backtrader(data, strategy, cash=1000000.0, commission=0.0, sharpe_timeframe='years', **params):
+    """用backtrader运行同一策略并返回与VectorBacktester.run相同口径的指标，用于校验"""
+    import backtrader as bt
+    from Tool.PandasData import PandasData
+
+    timeframe = bt.TimeFrame.Years if sharpe_timeframe == 'years' else bt.TimeFrame.Days
+    cerebro = bt.Cerebro()
+    cerebro.adddata(PandasData(dataname=data))
+    cerebro.addstrategy(strategy, **params)
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=commission)
+    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe', timeframe=timeframe)
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+    cerebro.addanalyzer(bt.analyzers.Returns, _name='returns')
+    strat = cerebro.run()[0]
+
+    drawdown = strat.analyzers.drawdown.get_analysis()
+    returns = strat.analyzers.returns.get_analysis()
+    return {
+        'final_value': cerebro.broker.getvalue(),
+        'sharpe': strat.analyzers.sharpe.get_analysis()['sharperatio'],
+        'max_drawdown': drawdown.max.drawdown,
+        'max_moneydown': drawdown.max.moneydown,
+        'max_drawdown_len': drawdown.max.len,
+        'rtot': returns['rtot'],
+        'ravg': returns['ravg'],
+        'rnorm': returns['rnorm'],
+        'rnorm100': returns['rnorm100'],
+    }
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    from Strategy.strategy_ma_cross import SmaCross
+    from Strategy.strategy_Value_Price_Factor import VolumePriceFactor
+
+    data = pd.read_csv("data/600519_stock_20080101_20250630.csv", index_col="date", parse_dates=True)
+    cases = [
+        ("SmaCross", SmaCross, sma_cross_signals(data, 10, 30), dict(stake=1), 'days'),
+        ("VolumePriceFactor", VolumePriceFactor, volume_price_signals(data, 20), dict(stake=None), 'years'),
+    ]
+    for name, strategy, (entries, exits), sizing, timeframe in cases:
+        backtester = VectorBacktester(cash=1000000.0, commission=0.0001, sharpe_timeframe=timeframe, **sizing)
+
+        start_time = time.perf_counter()
+        expected = run_backtrader(data, strategy, cash=1000000.0, commission=0.0001, sharpe_timeframe=timeframe)
+        bt_time = time.perf_counter() - start_time
+
+        n_runs = 200
+        start_time = time.perf_counter()
+        for _ in range(n_runs):
+            result = backtester.run(data, entries, exits)
+        vector_time = (time.perf_counter() - start_time) / n_runs
+
+        for key, value in expected.items():
+            assert np.isclose(result[key], value, rtol=1e-9, atol=1e-9), f"{name} {key}: {result[key]} != {value}"
+        print(f"{name}: 交易 {result['n_trades']} 次, 最终资金 {result['final_value']:.2f}, "
+              f"夏普 {result['sharpe']:.4f}, 最大回撤 {result['max_drawdown']:.2f}%, 年化 {result['rnorm100']:.2f}%")
+        print(f"  与backtrader一致; backtrader {bt_time * 1000:.1f}ms/次, 向量化 {vector_time * 1000:.3f}ms/次, "
+              f"加速 {bt_time / vector_time:.0f}x")
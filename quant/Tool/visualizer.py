@@ -1,51 +1,107 @@
+import numpy as np
 import matplotlib.pyplot as plt
 import plotly.graph_objects as go
-from sklearn.inspection import permutation_importance
+
+from Tool.report import downsample
+
+
+def draw_true_vs_predicted(fig, y_test, y_pred, r2, rmse, max_points=None):
+    """在fig上绘制真实值vs预测值散点图，点数超过max_points时均匀抽样"""
+    y_test = np.asarray(y_test)
+    y_pred = np.asarray(y_pred)
+    if max_points is not None and len(y_test) > max_points:
+        keep = np.random.default_rng(0).choice(len(y_test), max_points, replace=False)
+        y_test_points, y_pred_points = y_test[keep], y_pred[keep]
+    else:
+        y_test_points, y_pred_points = y_test, y_pred
+    ax = fig.add_subplot()
+    ax.scatter(y_test_points, y_pred_points, label='预测值 vs 真实值')
+    ax.set_xlabel('真实值')
+    ax.set_ylabel('预测值')
+    ax.set_title('True vs. Predicted Values')
+    ax.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], 'r--', label='理想拟合线')
+    box = dict(boxstyle="round,pad=0.3", fc="white", ec="gray", lw=1)
+    ax.text(ax.get_xlim()[1], ax.get_ylim()[0]+0.02, f'R^2: {r2:.2f}', ha="right", va="bottom", wrap=True, bbox=box)
+    ax.text(ax.get_xlim()[1], ax.get_ylim()[0]*0.85 + 0.02, f'RMSE: {rmse:.3f}', ha="right", va="bottom", wrap=True, bbox=box)
+    ax.legend()
+
+
+def true_vs_predicted_lines(y_test, y_pred, max_points=None):
+    """Plotly交互式折线图，两条序列按极值降采样到max_points以内"""
+    y_test = np.asarray(y_test)
+    y_pred = np.asarray(y_pred)
+    index = downsample([y_test, y_pred], max_points)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=index, y=y_test[index], mode='lines', name='真实值 (True Values)'))
+    fig.add_trace(go.Scatter(x=index, y=y_pred[index], mode='lines', name='预测值 (Predicted Values)'))
+    fig.update_layout(title='True vs. Predicted Values', xaxis_title='Index', yaxis_title='Values')
+    return fig
+
+
+def draw_importances(fig, importances):
+    """按重要性从高到低绘制条形图，importances为以特征名为索引、包含importance列的DataFrame"""
+    # 根据得分（重要性）排序
+    importances = importances.sort_values('importance', ascending=False)
+    sorted_features = list(importances.index)
+    sorted_importances = importances['importance'].values
+
+    # 绘制特征变量的重要性图
+    ax = fig.add_subplot()
+    ax.barh(sorted_features, sorted_importances)
+    ax.set_yticklabels(sorted_features)
+    ax.set_ylabel('特征')
+    ax.set_xlabel('重要性')
+    ax.set_title('特征重要性')
+
 
 class Visualizer:
-    def __init__(self):
-        """初始化可视化工具"""
-        pass
-        
+    def __init__(self, reporter=None):
+        """初始化可视化工具
+
+        参数:
+            reporter: Reporter实例，提供时图表在后台渲染到报告目录，不调用show()；默认弹出交互窗口
+        """
+        self.reporter = reporter
+
     def plot_true_vs_predicted(self, y_test, y_pred, r2, rmse):
         """绘制真实值vs预测值散点图"""
-        plt.figure(figsize=(10, 6))
-        plt.scatter(y_test, y_pred, label='预测值 vs 真实值')
-        plt.xlabel('真实值')
-        plt.ylabel('预测值')
-        plt.title('True vs. Predicted Values')
-        plt.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], 'r--', label='理想拟合线')
-        box = dict(boxstyle="round,pad=0.3", fc="white", ec="gray", lw=1)
-        plt.text(plt.xlim()[1], plt.ylim()[0]+0.02, f'R^2: {r2:.2f}', ha="right", va="bottom", wrap=True, bbox=box)
-        plt.text(plt.xlim()[1], plt.ylim()[0]*0.85 + 0.02, f'RMSE: {rmse:.3f}', ha="right", va="bottom", wrap=True, bbox=box)
-        plt.legend()
+        if self.reporter is not None:
+            max_points = self.reporter.max_points
+            self.reporter.figure('true_vs_predicted', draw_true_vs_predicted, y_test, y_pred, r2, rmse,
+                                 max_points=max_points, figsize=(10, 6))
+            self.reporter.plotly('true_vs_predicted_lines', true_vs_predicted_lines, y_test, y_pred, max_points=max_points)
+            return
+
+        draw_true_vs_predicted(plt.figure(figsize=(10, 6)), y_test, y_pred, r2, rmse)
         plt.tight_layout()
         plt.show()
-        
+
         # Plotly交互式图表
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=list(range(len(y_test))), y=y_test, mode='lines', name='真实值 (True Values)'))
-        fig.add_trace(go.Scatter(x=list(range(len(y_test))), y=y_pred, mode='lines', name='预测值 (Predicted Values)'))
-        fig.update_layout(title='True vs. Predicted Values', xaxis_title='Index', yaxis_title='Values')
-        fig.show()
-        
-    def plot_feature_importance(self, model, X_test, y_test, feature_names):
-        """绘制特征重要性图"""
-        # 获得输入特征变量的排列重要性
-        result = permutation_importance(model, X_test, y_test, n_repeats=10, random_state=42)
-        importances = result.importances_mean
-        
-        # 根据得分（重要性）排序
-        indices = importances.argsort()[::-1]
-        sorted_features = [feature_names[i] for i in indices]
-        sorted_importances = importances[indices]
-        
-        # 绘制特征变量的重要性图
-        fig, ax = plt.subplots(figsize=(8, 15))
-        ax.barh(sorted_features, sorted_importances)
-        ax.set_yticklabels(sorted_features)
-        ax.set_ylabel('特征')
-        ax.set_xlabel('重要性')
-        ax.set_title('特征重要性')
+        true_vs_predicted_lines(y_test, y_pred).show()
+
+    def plot_feature_importance(self, model, X_test, y_test, feature_names, importances=None, service=None):
+        """绘制特征重要性图
+
+        参数:
+            importances: 已计算好的重要性（FeatureImportance.compute的返回值），提供时不再计算
+            service: 计算重要性的FeatureImportance，默认为多进程并行的排列重要性；
+                     使用reporter时重要性的计算也在后台进行
+        """
+        def compute():
+            from Model.feature_importance import FeatureImportance
+            table = importances
+            if table is None:
+                importance_service = service if service is not None else FeatureImportance(n_repeats=10, n_jobs=-1, random_state=42)
+                table = importance_service.compute(model, X_test, y_test)
+            return table.loc[[name for name in feature_names if name in table.index]]
+
+        if self.reporter is not None:
+            self.reporter.figure('feature_importance', lambda fig: draw_importances(fig, compute()), figsize=(8, 15))
+            return
+        self.plot_importances(compute())
+
+    def plot_importances(self, importances):
+        """按重要性从高到低绘制条形图"""
+        draw_importances(plt.figure(figsize=(8, 15)), importances)
         plt.tight_layout()  # 自动调整布局，避免标签重叠
-        plt.show()
\ No newline at end of file
+        plt.show()
@@ -1,4 +1,8 @@
 import backtrader as bt
+import numpy as np
+
+from Tool.memory import peak_rss_mb
+from Tool.panel_feed import PanelFeed
 
 class cerebro:
     def __init__(self,strategy,data,cash,commission):
@@ -9,3 +13,99 @@ class cerebro:
         self.cerebro.broker.setcommission(commission)
         self.cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe', timeframe=bt.TimeFrame.Days, compression=1)
         self.cerebro.addanalyzer(bt.analyzers.DrawDown,_name='drawdown')
+
+
+class PortfolioCerebro:
+    """
+    多代码组合回测
+
+    在同一个Cerebro中为Panel里的每只代码添加一个PanelFeed（name为代码），所有代码共用一个broker，
+    策略通过self.datas访问全部代码，可做截面排名和组合调仓；各数据源直接读取Panel的共享数组，
+    不为每只代码复制一份DataFrame
+    """
+
+    def __init__(self, strategy, panel, cash=1000000.0, commission=0.0001, exactbars=False, **params):
+        """
+        参数:
+            strategy: backtrader策略类
+            panel (Panel): 行情面板
+            cash: 初始资金
+            commission: 佣金比例
+            exactbars: 传给Cerebro的exactbars，为1时只保留指标所需的最少K线，内存更低但不能使用runonce
+            **params: 策略参数
+        """
+        self.panel = panel
+        self.cerebro = bt.Cerebro(stdstats=False, exactbars=exactbars)
+        for symbol in panel.symbols:
+            self.cerebro.adddata(PanelFeed(panel=panel, symbol=symbol), name=symbol)
+        self.cerebro.addstrategy(strategy, **params)
+        self.cerebro.broker.set_cash(cash)
+        self.cerebro.broker.setcommission(commission)
+        self.cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe', timeframe=bt.TimeFrame.Days, compression=1)
+        self.cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+        self.cerebro.addanalyzer(bt.analyzers.Returns, _name='returns')
+        self.results = None
+
+    def run(self):
+        """运行回测，返回策略实例列表"""
+        self.results = self.cerebro.run()
+        return self.results
+
+    def memory_report(self):
+        """
+        内存占用报告（run之后调用）
+
+        返回:
+            dict: panel_mb（Panel数组）、lines_mb（数据源和指标的line缓冲区）、
+                  pandas_copies_mb（为每只代码各建一个OHLCV DataFrame的估计大小）、peak_rss_mb（进程峰值常驻内存）
+        """
+        strat = self.results[0]
+        lines_bytes = 0
+        for owner in list(strat.datas) + list(strat.getindicators()):
+            for line in owner.lines:
+                lines_bytes += len(line.array) * 8
+
+        # 每只代码一个DataFrame：日期索引和OHLCV共6列float64/datetime64
+        close = self.panel['close']
+        n_bars = int(np.count_nonzero(~np.isnan(close)))
+        report = {
+            'n_symbols': len(self.panel.symbols),
+            'n_bars': n_bars,
+            'panel_mb': self.panel.nbytes / 2**20,
+            'lines_mb': lines_bytes / 2**20,
+            'pandas_copies_mb': n_bars * 6 * 8 / 2**20,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        print(f"{report['n_symbols']} 只代码, {report['n_bars']} 根K线: Panel {report['panel_mb']:.1f}MB, "
+              f"line缓冲区 {report['lines_mb']:.1f}MB, 逐代码DataFrame估计 {report['pandas_copies_mb']:.1f}MB, "
+              f"峰值RSS {report['peak_rss_mb']:.0f}MB")
+        return report
+
+
+# 添加一个测试示例
+if __name__ == "__main__":
+    import sys
+    import time
+
+    import pandas as pd
+    from Strategy.strategy_top_k_momentum import TopKMomentumStrategy
+    from Tool.panel_features import Panel, synthetic_panel
+
+    # 1. 三只股票，每次调仓持有动量分最高的两只
+    csv_files = {"600519": "data/600519_stock_20080101_20250630.csv",
+                 "000333": "data/000333_stock_20080101_20250630.csv",
+                 "002230": "data/002230_stock_20080101_20250630.csv"}
+    frames = {code: pd.read_csv(path, index_col="date", parse_dates=True) for code, path in csv_files.items()}
+    runner = PortfolioCerebro(TopKMomentumStrategy, Panel.from_frames(frames), top_k=2)
+    strat = runner.run()[0]
+    print(f"夏普比率: {strat.analyzers.sharpe.get_analysis()['sharperatio']}, "
+          f"最大回撤: {strat.analyzers.drawdown.get_analysis().max.drawdown:.2f}%")
+
+    # 2. 合成面板：默认300只代码 x 1000天，可通过命令行参数调整代码数
+    n_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    panel = synthetic_panel(1000, n_symbols)
+    runner = PortfolioCerebro(TopKMomentumStrategy, panel, top_k=20)
+    start_time = time.perf_counter()
+    runner.run()
+    print(f"{n_symbols} 只代码组合回测耗时 {time.perf_counter() - start_time:.1f}s")
+    runner.memory_report()
@@ -1,46 +1,133 @@
+import os
+import time
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 from Tool.data_loader import DataLoader
 from Tool.feature_selector import FeatureSelector
-from Model.model_trainer import ModelTrainer
+from Model.model_trainer import ModelTrainer, build_model
 from Tool.visualizer import Visualizer
 from Model.model_evaluator import ModelEvaluator
+from Tool.report import Reporter
+from Tool.pipeline import Pipeline
+from Model.batch_scorer import save_model
+from sklearn.metrics import mean_squared_error, r2_score
+import Tool.data_loader
+import Tool.feature_engineering
+import Tool.feature_selector
+import Model.model_trainer
 
 # 设置中文字体显示
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 
-def main():
+# 模型评估与超参数优化并发执行，各使用一半的CPU核心
+SHARED_THREADS = max(1, (os.cpu_count() or 1) // 2)
+
+# 超参数优化并行运行的试验数，平分优化阶段的核心
+OPTIMIZE_JOBS = 2
+
+# 流水线各阶段，参数和上游输出的内容哈希决定是否需要重新执行
+def load_stock_data(stock_codes):
+    return DataLoader(use_local_data=True).load_stock_data(stock_codes)
+
+def load_index_data(indices_codes):
+    return DataLoader(use_local_data=True).load_index_data(indices_codes)
+
+def split(index_datas, position):
+    return DataLoader(use_local_data=True).split_train_test(index_datas[position])
+
+def select(split_result, k):
+    train, test = split_result
+    return FeatureSelector().select_features(train, test, k=k)
+
+def evaluate_models(selected):
+    X_train, y_train, X_test, y_test, _ = selected
+    return ModelTrainer().evaluate_all_models(X_train, y_train, X_test, y_test, threads=SHARED_THREADS)
+
+def optimize(selected, model_name, n_trials, storage_dir, cv_splits):
+    X_train, y_train, X_test, y_test, _ = selected
+    # 在训练集内按时间顺序交叉验证并剪枝，测试集只在fit_best中评估一次；
+    # study保存在storage_dir，中断后重新运行时续跑
+    study = ModelTrainer().optimize(X_train, y_train, X_test, y_test, model_name=model_name, n_trials=n_trials,
+                                    n_jobs=OPTIMIZE_JOBS, storage_dir=storage_dir, cv_splits=cv_splits,
+                                    threads=max(1, SHARED_THREADS // OPTIMIZE_JOBS))
+    return study.best_params
+
+def fit_best(selected, best_params, model_name):
+    X_train, y_train, X_test, y_test, _ = selected
+    best_model = build_model(model_name, best_params)
+    best_model.fit(X_train, y_train)
+    y_pred = best_model.predict(X_test)
+    r2 = r2_score(y_test, y_pred)
+    rmse = mean_squared_error(y_test, y_pred)
+    print(f"优化后的{model_name}模型: R² = {r2:.2f}, RMSE = {rmse:.3f}")
+    print(f"最佳参数: {best_params}")
+    return best_model, y_pred, r2, rmse
+
+def export_model(selected, fitted, path, model_name):
+    best_model = fitted[0]
+    save_model(path, best_model, selected[4], model_name=model_name)
+    return path
+
+def render_report(selected, fitted, reporter):
+    _, _, X_test, y_test, features = selected
+    best_model, y_pred, r2, rmse = fitted
+    visualizer = Visualizer(reporter=reporter)
+    visualizer.plot_true_vs_predicted(y_test, y_pred, r2, rmse)
+    visualizer.plot_feature_importance(best_model, X_test, y_test, features)
+    evaluator = ModelEvaluator(reporter=reporter)
+    evaluator.evaluate_model(y_test, y_pred)
+
+def build_pipeline(reporter=None, cache_dir="../data/pipeline_cache", model_name='Ridge', n_trials=100, k=43,
+                   model_path="../data/models/model.joblib", optuna_dir="../data/optuna", cv_splits=3):
+    """
+    main流程的阶段图：读取数据不缓存（CSV变化时下游自动失效），
+    模型评估与超参数优化互不依赖，并发执行；各阶段调用的库模块通过depends参与缓存键，库的实现改变时相应阶段失效；最优模型及其特征列表保存到model_path，供BatchScorer批量打分。
+    超参数优化在训练集内做cv_splits折滚动交叉验证，study保存在optuna_dir下的SQLite中
+    """
+    pipeline = Pipeline(cache_dir=cache_dir)
     # 1. 加载数据
-    data_loader = DataLoader(use_local_data=True)
-    stock_codes = ["600519", "002230", "000333"]
-    indices_codes = ["000001", "399001", "000300"]
-    
-    stock_datas = data_loader.load_stock_data(stock_codes)
-    index_datas = data_loader.load_index_data(indices_codes)
-    
-    Sz_Index = index_datas[1]  # 使用深圳成分指数
-    
-    # 2. 分割训练测试集
-    train, test = data_loader.split_train_test(Sz_Index)
-    
+    pipeline.add('load_stock_data', load_stock_data, cache=False, stock_codes=["600519", "002230", "000333"])
+    pipeline.add('load_index_data', load_index_data, cache=False, indices_codes=["000001", "399001", "000300"])
+    # 2. 分割训练测试集（使用深圳成分指数）
+    pipeline.add('split', split, inputs=['load_index_data'], position=1,
+                 depends=[Tool.data_loader, Tool.feature_engineering])
     # 3. 特征选择
-    feature_selector = FeatureSelector()
-    X_train, y_train, X_test, y_test, features = feature_selector.select_features(train, test, k=43)
-    
+    pipeline.add('select', select, inputs=['split'], k=k, depends=[Tool.feature_selector])
     # 4. 模型训练
-    model_trainer = ModelTrainer()
-    best_model, y_pred, r2, rmse = model_trainer.train_and_optimize(X_train, y_train, X_test, y_test)
+    pipeline.add('evaluate_models', evaluate_models, inputs=['select'], depends=[Model.model_trainer])
+    pipeline.add('optimize', optimize, inputs=['select'], model_name=model_name, n_trials=n_trials,
+                 storage_dir=optuna_dir, cv_splits=cv_splits, depends=[Model.model_trainer])
+    pipeline.add('fit_best', fit_best, inputs=['select', 'optimize'], model_name=model_name,
+                 depends=[Model.model_trainer])
+    pipeline.add('export_model', export_model, inputs=['select', 'fit_best'], cache=False, path=model_path,
+                 model_name=model_name)
+    # 5. 可视化和模型评估
+    pipeline.add('report', render_report, inputs=['select', 'fit_best'], cache=False, reporter=reporter)
+    return pipeline
+
+def main(report=True, report_root="reports", cache_dir="../data/pipeline_cache", force=()):
+    """
+    参数:
+        report: 为True时图表在后台渲染到报告目录（report_root下每次运行一个目录），
+                主流程不会被show()阻塞；为False时弹出交互窗口
+        cache_dir: 流水线产物缓存目录，参数和输入未变的阶段直接读取缓存
+        force: 强制重新执行的阶段名
+
+    返回:
+        dict: 报告摘要（Reporter.close的返回值，errors中为渲染失败的图表），report为False时为None
+    """
+    start_time = time.perf_counter()
+    reporter = Reporter(root=report_root) if report else None
     
-    # 5. 可视化
-    visualizer = Visualizer()
-    visualizer.plot_true_vs_predicted(y_test, y_pred, r2, rmse)
-    visualizer.plot_feature_importance(best_model, X_test, y_test, features)
+    pipeline = build_pipeline(reporter=reporter, cache_dir=cache_dir)
+    pipeline.run(targets=['load_stock_data', 'evaluate_models', 'export_model', 'report'], force=force)
     
-    # 6. 模型评估
-    evaluator = ModelEvaluator()
-    evaluator.evaluate_model(y_test, y_pred)
+    pipeline_time = time.perf_counter() - start_time
+    summary = reporter.close() if reporter is not None else None
+    print(f"主流程耗时 {pipeline_time:.1f}s, 含报告输出 {time.perf_counter() - start_time:.1f}s")
+    return summary
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,6 +4,7 @@ import backtrader as bt
 from Tool.PandasData import PandasData
 from Strategy.strategy_ma_cross import SmaCross
 from Strategy.strategy_Value_Price_Factor import VolumePriceFactor
+from Tool.report import Reporter
 # 加载数据
 def load_data(file_path):
     df = pd.read_csv(file_path, index_col='date', parse_dates=True)
@@ -11,7 +12,7 @@ def load_data(file_path):
     return data_feed
 
 # 测试量化因子
-def run_backtest(data_feed):
+def run_backtest(data_feed, reporter=None):
     cerebro = bt.Cerebro()
     cerebro.adddata(data_feed)
     # 添加因子策略
@@ -35,11 +36,16 @@ def run_backtest(data_feed):
     print('最大回撤:', strat.analyzers.drawdown.get_analysis())
     print('收益率:', strat.analyzers.returns.get_analysis())
     
-    # 绘制结果
-    cerebro.plot(style='candlestick')
+    # 绘制结果：提供reporter时在后台保存为PNG，不弹出窗口
+    if reporter is not None:
+        reporter.backtest('backtest', cerebro, style='candlestick')
+    else:
+        cerebro.plot(style='candlestick')
 
 if __name__ == '__main__':
     # 替换为您的数据文件路径
     data_file = 'data/600519_stock_20080101_20250630.csv'
     data_feed = load_data(data_file)
-    run_backtest(data_feed)
\ No newline at end of file
+    reporter = Reporter()
+    run_backtest(data_feed, reporter)
+    reporter.close()
\ No newline at end of file